@@ -0,0 +1,308 @@
+"""
+Benchmark del emparejador y del procesamiento de pedidos con catálogos y correos sintéticos.
+
+    python benchmark.py --filas 10000 100000 500000 --salida benchmark.json
+    python benchmark.py --filas 10000 --comparar benchmark_anterior.json
+
+Para cada tamaño genera un catálogo con la forma de STKArticle (consulta_resultado.csv), lo pasa por
+csv_clean.clean_dataset para obtener las variaciones (consulta_resultado_clean.csv) y mide, cada vez en
+un proceso nuevo con DIRECTORIO_DATOS apuntando a esos archivos:
+
+- el arranque de inicializar_modelo sin snapshot (construcción) y con él (carga),
+- la latencia p50/p99 de modelo_predecir y procesar_producto,
+- el rendimiento por sondeo: extract_body_message + predecir_lote sobre correos sintéticos,
+- el pico de memoria (RSS) de cada proceso.
+
+Los resultados se guardan en JSON para comparar versiones.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Vocabulario del catálogo sintético (familias, materiales, medidas y acabados de riego y fontanería)
+FAMILIAS = [
+    "TUBO", "CODO", "TE", "MANGUITO", "REDUCCION", "VALVULA", "GRIFO", "ENLACE", "BRIDA", "FILTRO",
+    "ASPERSOR", "GOTERO", "COLLARIN", "TAPON", "ADAPTADOR", "RACOR", "LLAVE", "PROGRAMADOR",
+]
+MATERIALES = ["PE", "POLIETILENO", "PVC", "LATON", "INOX", "PP", "FUNDICION", "ALUMINIO"]
+DETALLES = [
+    "BOLA", "HEMBRA", "MACHO", "ROSCA", "PRESION", "ENCOLAR", "ELECTROSOLDABLE", "MALLA", "ANILLA",
+    "COMPENSANTE", "ANTIDRENANTE", "REGULABLE", "DOBLE", "SIMPLE", "CORTO", "LARGO", "90", "45",
+]
+MEDIDAS = ["16MM", "20MM", "25MM", "32MM", "40MM", "50MM", "63MM", "75MM", "90MM", "110MM",
+           "1/2", "3/4", "1", "1 1/4", "16-20", "20-25", "25-32", "32-40"]
+PRESIONES = ["PN6", "PN10", "PN16", "6 ATM", "10 ATM", ""]
+
+
+def generar_catalogo(filas: int, semilla: int = 1) -> pd.DataFrame:
+    """Catálogo sintético con las columnas de STKArticle (CodArticle, Description, IDArticle, Image)."""
+    rng = random.Random(semilla)
+    codigos, descripciones, imagenes = [], [], []
+    for i in range(filas):
+        familia = rng.choice(FAMILIAS)
+        partes = [familia, rng.choice(MATERIALES)]
+        partes += rng.sample(DETALLES, rng.randint(0, 2))
+        partes.append(rng.choice(MEDIDAS))
+        partes.append(rng.choice(PRESIONES))
+        descripciones.append(" ".join(parte for parte in partes if parte))
+        codigos.append(f"{familia[:3]}{i:07d}")
+        # Como en la extracción original, la imagen es el literal de los bytes (solo en parte de los artículos)
+        imagenes.append(repr(b"\x89PNG\r\n\x1a\n" + i.to_bytes(4, "little") * 4) if i % 3 == 0 else None)
+    return pd.DataFrame({
+        "CodArticle": codigos,
+        "Description": descripciones,
+        "IDArticle": range(100000, 100000 + filas),
+        "Image": imagenes,
+    })
+
+
+def variar_descripcion(descripcion: str, rng: random.Random) -> tuple:
+    """Convierte una descripción del catálogo en lo que escribiría un operario: (producto, medida)."""
+    palabras = descripcion.lower().split()
+    medida = next((palabra for palabra in palabras if palabra[0].isdigit()), "N/A")
+    palabras = [palabra for palabra in palabras if palabra != medida]
+    if len(palabras) > 2 and rng.random() < 0.4:
+        palabras.pop(rng.randrange(1, len(palabras)))
+    if len(palabras) > 1 and rng.random() < 0.2:
+        palabras[0], palabras[1] = palabras[1], palabras[0]
+    if rng.random() < 0.3:
+        palabras = ["pe" if palabra == "polietileno" else palabra for palabra in palabras]
+    if rng.random() < 0.1:
+        # Errata: se pierde una letra de la palabra más larga
+        i = max(range(len(palabras)), key=lambda j: len(palabras[j]))
+        if len(palabras[i]) > 4:
+            k = rng.randrange(len(palabras[i]))
+            palabras[i] = palabras[i][:k] + palabras[i][k + 1:]
+    return " ".join(palabras), medida
+
+
+def generar_cuerpo_correo(descripciones: list, items: int, rng: random.Random) -> str:
+    """Cuerpo de un correo de pedido en el formato {"items": [{"product", "size", "quantity"}]}."""
+    pedido = {"items": []}
+    for _ in range(items):
+        producto, medida = variar_descripcion(rng.choice(descripciones), rng)
+        pedido["items"].append({"product": producto, "size": medida, "quantity": str(rng.randint(1, 50))})
+    cuerpo = json.dumps(pedido, ensure_ascii=False)
+    # Algunos correos traen texto alrededor del JSON (se extrae con la expresión regular)
+    return f"Pedido de obra:\n{cuerpo}\nEnviado desde la app" if rng.random() < 0.2 else cuerpo
+
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def resumen_latencias(segundos: list) -> dict:
+    return {
+        "p50_ms": round(statistics.median(segundos) * 1000, 3),
+        "p99_ms": round(percentil(segundos, 0.99) * 1000, 3),
+        "media_ms": round(statistics.fmean(segundos) * 1000, 3),
+    }
+
+
+def rss_pico_mb() -> float:
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def medir_proceso(directorio: str, solo_arranque: bool, consultas: int, correos: int, items: int,
+                  sondeos: int, semilla: int) -> dict:
+    """Se ejecuta en un proceso aparte (con DIRECTORIO_DATOS ya apuntando a `directorio`)."""
+    import modelo_prediccion as m
+    logging.getLogger().setLevel(logging.WARNING)
+
+    inicio = time.perf_counter()
+    m.inicializar_modelo()
+    resultado = {"arranque_s": round(time.perf_counter() - inicio, 3)}
+    if solo_arranque:
+        resultado["rss_pico_mb"] = rss_pico_mb()
+        return resultado
+
+    rng = random.Random(semilla)
+    descripciones = pd.read_csv(os.path.join(directorio, "consulta_resultado.csv"), usecols=["Description"])
+    descripciones = descripciones["Description"].dropna().tolist()
+    productos = []
+    for _ in range(consultas):
+        producto, medida = variar_descripcion(rng.choice(descripciones), rng)
+        productos.append({
+            "descripcion": f"{producto} {medida if medida != 'N/A' else ''}".strip(),
+            "cantidad": "1", "correo_id": "benchmark", "audio": {},
+        })
+
+    latencias_modelo = []
+    for producto in productos:
+        inicio = time.perf_counter()
+        m.modelo_predecir(producto["descripcion"])
+        latencias_modelo.append(time.perf_counter() - inicio)
+    latencias_producto = []
+    for producto in productos:
+        inicio = time.perf_counter()
+        m.procesar_producto(producto)
+        latencias_producto.append(time.perf_counter() - inicio)
+
+    tiempos_sondeo, productos_sondeo = [], 0
+    for numero in range(sondeos):
+        cuerpos = [generar_cuerpo_correo(descripciones, items, rng) for _ in range(correos)]
+        inicio = time.perf_counter()
+        lote = []
+        for i, cuerpo in enumerate(cuerpos):
+            for descripcion, cantidad, correo_id in m.extract_body_message(cuerpo, f"s{numero}c{i}"):
+                lote.append({"descripcion": descripcion, "cantidad": cantidad, "correo_id": correo_id, "audio": {}})
+        m.predecir_lote(lote)
+        tiempos_sondeo.append(time.perf_counter() - inicio)
+        productos_sondeo += len(lote)
+
+    resultado.update({
+        "modelo_predecir": resumen_latencias(latencias_modelo),
+        "procesar_producto": resumen_latencias(latencias_producto),
+        "sondeo": {
+            "correos": correos,
+            "productos_por_correo": items,
+            "p50_s": round(statistics.median(tiempos_sondeo), 3),
+            "productos_s": round(productos_sondeo / sum(tiempos_sondeo), 1),
+            "correos_s": round(correos * sondeos / sum(tiempos_sondeo), 1),
+        },
+        "rss_pico_mb": rss_pico_mb(),
+    })
+    return resultado
+
+
+def ejecutar_hijo(directorio: str, args, solo_arranque: bool) -> dict:
+    comando = [
+        sys.executable, os.path.abspath(__file__), "--medir", directorio,
+        "--consultas", str(args.consultas), "--correos", str(args.correos), "--items", str(args.items),
+        "--sondeos", str(args.sondeos), "--semilla", str(args.semilla),
+    ]
+    if solo_arranque:
+        comando.append("--solo-arranque")
+    salida = subprocess.run(
+        comando, cwd=BASE_DIR, env={**os.environ, "DIRECTORIO_DATOS": directorio},
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def preparar_catalogo(directorio: str, filas: int, semilla: int) -> dict:
+    import csv_clean
+
+    os.makedirs(directorio, exist_ok=True)
+    inicio = time.perf_counter()
+    catalogo = generar_catalogo(filas, semilla)
+    catalogo.to_csv(os.path.join(directorio, "consulta_resultado.csv"), index=False)
+    ruta_articulos = os.path.join(directorio, "articulos.csv")
+    catalogo[["CodArticle", "Description", "IDArticle"]].to_csv(ruta_articulos, index=False)
+    generacion = time.perf_counter() - inicio
+    tiempos = csv_clean.clean_dataset(ruta_articulos, os.path.join(directorio, "consulta_resultado_clean.csv"))
+    variaciones = sum(1 for _ in open(os.path.join(directorio, "consulta_resultado_clean.csv"), encoding="utf-8")) - 1
+    return {"generacion_s": round(generacion, 3), "limpieza_s": round(tiempos["total"], 3), "variaciones": variaciones}
+
+
+def version_codigo() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocida"
+
+
+def aplanar(datos: dict, prefijo: str = "") -> dict:
+    planos = {}
+    for clave, valor in datos.items():
+        if isinstance(valor, dict):
+            planos.update(aplanar(valor, f"{prefijo}{clave}."))
+        elif isinstance(valor, (int, float)):
+            planos[f"{prefijo}{clave}"] = valor
+    return planos
+
+
+def comparar(actual: dict, anterior: dict) -> None:
+    """Muestra la variación de cada métrica respecto a un resultado anterior del mismo tamaño."""
+    anteriores = {resultado["filas"]: aplanar(resultado) for resultado in anterior["resultados"]}
+    print(f"\nComparación con {anterior.get('version')} ({anterior.get('fecha')}):")
+    for resultado in actual["resultados"]:
+        previo = anteriores.get(resultado["filas"])
+        if previo is None:
+            continue
+        for metrica, valor in aplanar(resultado).items():
+            if metrica == "filas" or not previo.get(metrica):
+                continue
+            cambio = (valor - previo[metrica]) / previo[metrica] * 100
+            print(f"  filas={resultado['filas']:>7}  {metrica:<32} {previo[metrica]:>10} -> {valor:<10} ({cambio:+.1f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del emparejador con catálogos y correos sintéticos.")
+    parser.add_argument("--filas", type=int, nargs="+", default=[10000, 100000, 500000], help="Tamaños del catálogo")
+    parser.add_argument("--consultas", type=int, default=500, help="Descripciones para medir la latencia")
+    parser.add_argument("--correos", type=int, default=50, help="Correos por sondeo")
+    parser.add_argument("--items", type=int, default=5, help="Productos por correo")
+    parser.add_argument("--sondeos", type=int, default=5, help="Sondeos medidos")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--directorio", help="Donde generar los catálogos (por defecto, un temporal)")
+    parser.add_argument("--salida", default="benchmark_resultados.json", help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", help="Resultados anteriores (JSON) con los que comparar")
+    parser.add_argument("--medir", help=argparse.SUPPRESS)
+    parser.add_argument("--solo-arranque", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        # Proceso hijo: una sola medida, resultado en la última línea de la salida
+        resultado = medir_proceso(
+            args.medir, args.solo_arranque, args.consultas, args.correos, args.items, args.sondeos, args.semilla
+        )
+        print(json.dumps(resultado))
+        sys.exit(0)
+
+    logging.basicConfig(level=logging.WARNING)
+    directorio_base = args.directorio or tempfile.mkdtemp(prefix="benchmark_")
+    informe = {
+        "version": version_codigo(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "cpus": os.cpu_count(),
+        "parametros": {clave: getattr(args, clave) for clave in ("consultas", "correos", "items", "sondeos", "semilla")},
+        "resultados": [],
+    }
+    for filas in args.filas:
+        directorio = os.path.join(directorio_base, f"catalogo_{filas}")
+        resultado = {"filas": filas, "preparacion": preparar_catalogo(directorio, filas, args.semilla)}
+        # Primer arranque: construye el snapshot; el segundo lo carga y hace el resto de medidas
+        construccion = ejecutar_hijo(directorio, args, solo_arranque=True)
+        resultado["arranque_construccion_s"] = construccion["arranque_s"]
+        resultado["rss_pico_construccion_mb"] = construccion["rss_pico_mb"]
+        medida = ejecutar_hijo(directorio, args, solo_arranque=False)
+        resultado["arranque_snapshot_s"] = medida.pop("arranque_s")
+        resultado.update(medida)
+        informe["resultados"].append(resultado)
+        print(
+            f"filas={filas:>7}  arranque={resultado['arranque_construccion_s']}s/{resultado['arranque_snapshot_s']}s  "
+            f"modelo_predecir p50={resultado['modelo_predecir']['p50_ms']}ms p99={resultado['modelo_predecir']['p99_ms']}ms  "
+            f"procesar_producto p50={resultado['procesar_producto']['p50_ms']}ms p99={resultado['procesar_producto']['p99_ms']}ms  "
+            f"sondeo={resultado['sondeo']['productos_s']} productos/s  RSS={resultado['rss_pico_mb']}MB"
+        )
+
+    if not args.directorio:
+        shutil.rmtree(directorio_base, ignore_errors=True)
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=4)
+    print(f"Resultados guardados en {args.salida}")
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            comparar(informe, json.load(f))
@@ -0,0 +1,173 @@
+import copy
+import difflib
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from registro import registro_items
+
+
+# Modos de funcionamiento del motor de búsqueda
+MODO_INDICE = "indice"        # Preselección por índice de n-gramas + reordenación con difflib
+MODO_DIFFLIB = "difflib"      # Comportamiento original: difflib sobre todo el catálogo
+MODO_VERIFICAR = "verificar"  # Ejecuta ambos, compara y devuelve el resultado de difflib
+MODOS_BUSQUEDA = (MODO_INDICE, MODO_DIFFLIB, MODO_VERIFICAR)
+
+
+class MotorBusqueda:
+    """
+    Motor de búsqueda de descripciones del catálogo.
+
+    Se construye una sola vez a partir de las descripciones procesadas del catálogo. Cada
+    descripción se representa con n-gramas de caracteres ponderados con TF-IDF, y la matriz
+    traspuesta (n-grama -> descripciones) actúa como índice invertido: el producto de la
+    consulta por esa matriz solo recorre las listas de los n-gramas presentes en la consulta.
+    De ahí se preseleccionan los `max_candidatos` más parecidos y se reordenan con difflib,
+    de modo que el coste por consulta depende del número de candidatos y no del tamaño
+    del catálogo.
+    """
+
+    def __init__(self, descripciones, modo: str = MODO_INDICE, max_candidatos: int = 300,
+                 ngram_range: tuple = (2, 3)):
+        if modo not in MODOS_BUSQUEDA:
+            raise ValueError(f"Modo de búsqueda no válido: {modo}. Opciones: {MODOS_BUSQUEDA}")
+        self.modo = modo
+        self.max_candidatos = max_candidatos
+
+        # Descripciones únicas, conservando la posición de la primera aparición en el catálogo
+        self.posiciones = {}
+        for posicion, descripcion in enumerate(descripciones):
+            if isinstance(descripcion, str) and descripcion not in self.posiciones:
+                self.posiciones[descripcion] = posicion
+        self.descripciones = list(self.posiciones)
+        # Segmento delta: descripciones añadidas después de construir el índice. No están en la
+        # matriz, así que se añaden siempre a la lista de candidatos hasta que se fusionen.
+        self.delta = []
+        self.posiciones_delta = {}
+
+        self.vectorizador = TfidfVectorizer(
+            analyzer="char_wb", ngram_range=ngram_range, lowercase=False, dtype=np.float32
+        )
+        if self.descripciones:
+            matriz = self.vectorizador.fit_transform(self.descripciones)
+            self.indice_invertido = matriz.T.tocsr()
+        else:
+            self.indice_invertido = None
+
+        # Contadores del modo verificar
+        self.verificaciones = 0
+        self.discrepancias = 0
+
+    def __len__(self):
+        return len(self.descripciones) + len(self.delta)
+
+    def con_delta(self, descripciones_posiciones: list) -> "MotorBusqueda":
+        """
+        Devuelve un motor nuevo con descripciones añadidas al segmento delta, sin reconstruir el índice.
+
+        El índice y las descripciones base se comparten (solo se copia el delta), y el motor actual no
+        cambia. Si una descripción ya existía, se conserva la posición de su primera aparición.
+
+        Args:
+            descripciones_posiciones (list): Pares (descripción procesada, posición en el catálogo).
+        """
+        motor = copy.copy(self)
+        motor.delta = list(self.delta)
+        motor.posiciones_delta = dict(self.posiciones_delta)
+        for descripcion, posicion in descripciones_posiciones:
+            if not isinstance(descripcion, str) or motor.posicion(descripcion) is not None:
+                continue
+            motor.posiciones_delta[descripcion] = posicion
+            motor.delta.append(descripcion)
+        return motor
+
+    def posicion(self, descripcion: str):
+        """Devuelve la posición (iloc) en el catálogo de la primera fila con esa descripción."""
+        posicion = self.posiciones.get(descripcion)
+        return posicion if posicion is not None else self.posiciones_delta.get(descripcion)
+
+    def candidatos(self, consulta: str) -> list:
+        """
+        Preselecciona las descripciones del catálogo que comparten más n-gramas con la consulta.
+
+        Args:
+            consulta (str): Descripción ya procesada.
+
+        Returns:
+            list: Hasta `max_candidatos` descripciones, de mayor a menor similitud TF-IDF,
+                seguidas de las del segmento delta.
+        """
+        return self.candidatos_lote([consulta])[0]
+
+    def candidatos_lote(self, consultas: list) -> list:
+        """
+        Preselección de candidatos para varias consultas con un único producto disperso.
+
+        Args:
+            consultas (list): Descripciones ya procesadas.
+
+        Returns:
+            list: Una lista de candidatos por consulta, en el mismo orden.
+        """
+        delta = list(self.delta)
+        if self.indice_invertido is None or not consultas:
+            return [list(delta) for _ in consultas]
+        puntuaciones = (self.vectorizador.transform(consultas) @ self.indice_invertido).tocsr()
+        resultado = []
+        for fila in range(len(consultas)):
+            inicio, fin = puntuaciones.indptr[fila], puntuaciones.indptr[fila + 1]
+            candidatos = self._seleccionar(puntuaciones.indices[inicio:fin], puntuaciones.data[inicio:fin])
+            resultado.append(candidatos + delta)
+        return resultado
+
+    def _seleccionar(self, indices, valores) -> list:
+        """Se queda con los `max_candidatos` de mayor puntuación, ordenados de mayor a menor."""
+        if len(valores) > self.max_candidatos:
+            seleccion = np.argpartition(-valores, self.max_candidatos - 1)[:self.max_candidatos]
+            indices, valores = indices[seleccion], valores[seleccion]
+        orden = np.argsort(-valores, kind="stable")
+        return [self.descripciones[i] for i in indices[orden]]
+
+    def buscar(self, consulta: str, n: int = 1, cutoff: float = 0.5) -> list:
+        """
+        Equivalente a difflib.get_close_matches(consulta, catálogo, n, cutoff) según el modo.
+
+        Args:
+            consulta (str): Descripción ya procesada.
+            n (int): Número máximo de coincidencias.
+            cutoff (float): Similitud mínima de difflib.
+
+        Returns:
+            list: Descripciones del catálogo ordenadas de mayor a menor similitud.
+        """
+        return self.buscar_lote([consulta], n=n, cutoff=cutoff)[0]
+
+    def buscar_lote(self, consultas: list, n: int = 1, cutoff: float = 0.5) -> list:
+        """
+        Versión por lotes de `buscar`: la preselección de todas las consultas se hace de una vez.
+
+        Returns:
+            list: Una lista de coincidencias por consulta, en el mismo orden.
+        """
+        if self.modo == MODO_DIFFLIB:
+            todas = self.descripciones + self.delta
+            return [difflib.get_close_matches(c, todas, n=n, cutoff=cutoff) for c in consultas]
+        return [
+            self._reordenar(consulta, candidatos, n, cutoff)
+            for consulta, candidatos in zip(consultas, self.candidatos_lote(consultas))
+        ]
+
+    def _reordenar(self, consulta: str, candidatos: list, n: int, cutoff: float) -> list:
+        """Reordena los candidatos con difflib y, en modo verificar, los compara con la búsqueda completa."""
+        matches = difflib.get_close_matches(consulta, candidatos, n=n, cutoff=cutoff)
+        if self.modo == MODO_VERIFICAR:
+            referencia = difflib.get_close_matches(consulta, self.descripciones + self.delta, n=n, cutoff=cutoff)
+            self.verificaciones += 1
+            if matches != referencia:
+                self.discrepancias += 1
+                registro_items.warning(
+                    "[MotorBusqueda] Discrepancia para '%s': índice=%s, difflib=%s (%d/%d)",
+                    consulta, matches, referencia, self.discrepancias, self.verificaciones,
+                )
+            return referencia
+        return matches
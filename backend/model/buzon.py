@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+
+from graph_cliente import ClienteGraph
+
+
+# Campos del mensaje que se piden a Graph (sin adjuntos: su contenido se descarga aparte)
+CAMPOS_MENSAJE = "id,subject,body,isRead,hasAttachments,receivedDateTime"
+CAMPOS_ADJUNTO = "id,name,contentType,size"
+
+
+class SincronizadorBuzon:
+    """
+    Sincronización incremental de una carpeta del buzón con consultas delta de Microsoft Graph.
+
+    La primera vez se recorre la carpeta completa (todas las páginas) y Graph devuelve un
+    deltaLink; los sondeos siguientes solo reciben los mensajes nuevos o modificados desde entonces,
+    por lo que un sondeo sin correos nuevos cuesta una única petición casi vacía. El deltaLink se
+    guarda en disco para continuar tras un reinicio.
+
+    De cada mensaje solo se piden los campos necesarios; los metadatos de los adjuntos (sin el
+    contenido) se piden agrupados en $batch y el audio se descarga después, solo cuando hace falta.
+
+    El deltaLink nuevo no se guarda hasta que se llama a `confirmar`, de modo que si el sondeo falla
+    a mitad los mensajes se vuelven a recibir. Los correos que no se pudieron marcar como leídos se
+    guardan como pendientes y se vuelven a pedir en el siguiente sondeo.
+    """
+
+    def __init__(self, cliente: ClienteGraph, usuario: str, ruta_estado: str, carpeta: str = "Inbox",
+                 tam_pagina: int = 50):
+        self.cliente = cliente
+        self.usuario = usuario
+        self.ruta_estado = ruta_estado
+        self.carpeta = carpeta
+        self.tam_pagina = tam_pagina
+        self.delta_link = None
+        self.pendientes = []
+        self._delta_link_nuevo = None
+        # Correos cuyos adjuntos no se pudieron consultar en este sondeo
+        self._sin_adjuntos = []
+        self.cargar()
+
+    def cargar(self) -> None:
+        """Lee el deltaLink y los correos pendientes guardados en el sondeo anterior."""
+        if not os.path.exists(self.ruta_estado):
+            logging.info(f"[buzon] No hay estado de sincronización en {self.ruta_estado}, se hará una sincronización completa")
+            return
+        try:
+            with open(self.ruta_estado, "r", encoding="utf-8") as f:
+                estado = json.load(f)
+            self.delta_link = estado.get("delta_link")
+            self.pendientes = list(estado.get("pendientes", []))
+        except (OSError, ValueError) as e:
+            logging.error(f"[buzon] Error al leer {self.ruta_estado}: {e}. Se hará una sincronización completa.")
+
+    def reiniciar(self) -> None:
+        """Olvida el deltaLink para que el siguiente sondeo recorra la carpeta completa."""
+        self.delta_link = None
+        self._delta_link_nuevo = None
+
+    def mensajes_nuevos(self) -> list:
+        """
+        Devuelve los mensajes no leídos con adjuntos que han llegado o cambiado desde el último sondeo
+        confirmado, con los metadatos de sus adjuntos en la clave "attachments".
+        """
+        candidatos = self._recorrer_delta()
+        # Los pendientes del sondeo anterior se vuelven a pedir si el delta no los ha traído
+        faltan = [correo_id for correo_id in self.pendientes if correo_id not in candidatos]
+        for mensaje in self._pedir_mensajes(faltan):
+            candidatos[mensaje["id"]] = mensaje
+
+        mensajes = [
+            mensaje for mensaje in candidatos.values()
+            if not mensaje.get("isRead") and mensaje.get("hasAttachments")
+        ]
+        self._sin_adjuntos = []
+        self._agregar_adjuntos(mensajes)
+        return [mensaje for mensaje in mensajes if mensaje["id"] not in self._sin_adjuntos]
+
+    def confirmar(self, no_procesados=()) -> None:
+        """
+        Guarda el deltaLink del último sondeo y los correos que hay que volver a intentar.
+
+        Args:
+            no_procesados (iterable): IDs de correos que no se pudieron marcar como leídos.
+        """
+        if self._delta_link_nuevo:
+            self.delta_link = self._delta_link_nuevo
+        self.pendientes = list(dict.fromkeys(list(no_procesados) + self._sin_adjuntos))
+        ruta_tmp = f"{self.ruta_estado}.tmp"
+        with open(ruta_tmp, "w", encoding="utf-8") as f:
+            json.dump({"delta_link": self.delta_link, "pendientes": self.pendientes}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta_tmp, self.ruta_estado)
+
+    def _recorrer_delta(self) -> dict:
+        """Sigue todas las páginas (@odata.nextLink) hasta el @odata.deltaLink y devuelve {id: mensaje}."""
+        candidatos = {}
+        if self.delta_link:
+            ruta, params = self.delta_link, None
+        else:
+            ruta = f"users/{self.usuario}/mailFolders/{self.carpeta}/messages/delta"
+            params = {"$select": CAMPOS_MENSAJE}
+        cabeceras = {"Prefer": f"odata.maxpagesize={self.tam_pagina}"}
+        paginas = 0
+        while True:
+            response = self.cliente.get(ruta, params=params, headers=cabeceras)
+            if response.status_code == 410 and self.delta_link:
+                # El token ha caducado en Graph: hay que volver a sincronizar desde cero
+                logging.warning("[buzon] El deltaLink ha caducado, se hace una sincronización completa")
+                self.reiniciar()
+                return self._recorrer_delta()
+            if response.status_code != 200:
+                raise Exception(f"Error al obtener los correos: {response.status_code} - {response.text}")
+            datos = response.json()
+            paginas += 1
+            for mensaje in datos.get("value", []):
+                if "@removed" in mensaje:
+                    candidatos.pop(mensaje.get("id"), None)
+                else:
+                    candidatos[mensaje["id"]] = mensaje
+            if "@odata.nextLink" in datos:
+                ruta, params = datos["@odata.nextLink"], None
+                continue
+            self._delta_link_nuevo = datos.get("@odata.deltaLink")
+            break
+        logging.info(f"[buzon] Delta recorrido: {paginas} páginas, {len(candidatos)} mensajes nuevos o modificados")
+        return candidatos
+
+    def _pedir_mensajes(self, ids: list) -> list:
+        """Pide varios mensajes por ID en $batch (los que ya no existen se descartan)."""
+        if not ids:
+            return []
+        respuestas = self.cliente.lote([
+            {"id": str(i), "method": "GET",
+             "url": f"/users/{self.usuario}/messages/{correo_id}?$select={CAMPOS_MENSAJE}"}
+            for i, correo_id in enumerate(ids)
+        ])
+        mensajes = []
+        for i, correo_id in enumerate(ids):
+            respuesta = respuestas.get(str(i), {})
+            if respuesta.get("status") == 200 and respuesta.get("body"):
+                mensajes.append(respuesta["body"])
+            else:
+                logging.warning(f"[buzon] No se pudo recuperar el correo pendiente {correo_id}: {respuesta.get('status')}")
+        return mensajes
+
+    def _agregar_adjuntos(self, mensajes: list) -> None:
+        """Pide en $batch los metadatos (sin contenido) de los adjuntos de cada mensaje."""
+        if not mensajes:
+            return
+        respuestas = self.cliente.lote([
+            {"id": str(i), "method": "GET",
+             "url": f"/users/{self.usuario}/messages/{mensaje['id']}/attachments?$select={CAMPOS_ADJUNTO}"}
+            for i, mensaje in enumerate(mensajes)
+        ])
+        for i, mensaje in enumerate(mensajes):
+            respuesta = respuestas.get(str(i), {})
+            if respuesta.get("status") != 200:
+                logging.error(f"[buzon] Error al obtener los adjuntos del correo {mensaje['id']}: {respuesta.get('status')}")
+                self._sin_adjuntos.append(mensaje["id"])
+                continue
+            cuerpo = respuesta.get("body") or {}
+            adjuntos = list(cuerpo.get("value", []))
+            siguiente = cuerpo.get("@odata.nextLink")
+            while siguiente:
+                pagina = self.cliente.get(siguiente)
+                if pagina.status_code != 200:
+                    break
+                datos = pagina.json()
+                adjuntos.extend(datos.get("value", []))
+                siguiente = datos.get("@odata.nextLink")
+            mensaje["attachments"] = adjuntos
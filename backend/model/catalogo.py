@@ -0,0 +1,156 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def indexar_por_codigo(df_catalogo: pd.DataFrame, columnas: list, con_posicion: bool = False) -> dict:
+    """
+    Construye un índice hash CodArticle -> registro a partir de un DataFrame.
+
+    Igual que `df.loc[df["CodArticle"] == codigo].iloc[0]`, el registro indexado es el de la
+    primera fila de cada código, pero la consulta pasa a ser O(1) en lugar de recorrer la columna.
+
+    Args:
+        df_catalogo (pd.DataFrame): Catálogo con la columna "CodArticle".
+        columnas (list): Columnas que se guardan en cada registro.
+        con_posicion (bool): Si es True, cada registro incluye su posición (iloc) en "posicion".
+
+    Returns:
+        dict: {CodArticle: {columna: valor}} con la primera aparición de cada código.
+    """
+    if df_catalogo.empty or "CodArticle" not in df_catalogo:
+        return {}
+    columnas = [columna for columna in columnas if columna in df_catalogo]
+    primeras = df_catalogo.drop_duplicates(subset="CodArticle", keep="first")
+    registros = primeras[columnas].to_dict(orient="records")
+    if con_posicion:
+        posiciones = df_catalogo.index.get_indexer(primeras.index)
+        for registro, posicion in zip(registros, posiciones.tolist()):
+            registro["posicion"] = posicion
+    return dict(zip(primeras["CodArticle"].tolist(), registros))
+
+
+def agregar_al_indice(indice: dict, codigo, registro: dict) -> None:
+    """Añade un registro nuevo sin sobrescribir la primera aparición de un código existente."""
+    indice.setdefault(codigo, registro)
+
+
+def buscar_codigo(indice: dict, codigo: str):
+    """
+    Busca un CodArticle recibido como texto (p. ej. en una URL) en un índice.
+
+    Si pandas leyó la columna como numérica, las claves del índice son enteros, así que también
+    se prueba con la conversión a int.
+    """
+    registro = indice.get(codigo)
+    if registro is None and codigo.isdigit():
+        registro = indice.get(int(codigo))
+    return registro
+
+
+class CatalogoIncremental:
+    """
+    Catálogo de entrenamiento formado por un DataFrame base y un segmento delta de solo anexado.
+
+    No se modifica nunca: las correcciones del usuario dan lugar a un catálogo nuevo que comparte
+    el DataFrame base y copia solo el delta (filas como diccionarios), de modo que quien esté leyendo
+    la versión anterior no ve cambios a mitad. Las posiciones son estables: la fila i del delta ocupa
+    la posición len(base) + i, y la conservan cuando el delta se fusiona en un DataFrame base nuevo.
+    """
+
+    def __init__(self, base: pd.DataFrame, delta=None):
+        self.base = base
+        self.delta = list(delta) if delta else []
+
+    def __len__(self):
+        return len(self.base) + len(self.delta)
+
+    def con_filas(self, filas: list) -> "CatalogoIncremental":
+        """Devuelve un catálogo nuevo con las filas añadidas al delta (ocupan las posiciones desde len(self))."""
+        return CatalogoIncremental(self.base, self.delta + list(filas))
+
+    def fila(self, posicion: int):
+        """Devuelve la fila en esa posición (Series del DataFrame base o dict del delta)."""
+        if posicion < len(self.base):
+            return self.base.iloc[posicion]
+        return self.delta[posicion - len(self.base)]
+
+    def fusionado(self, n: int) -> "CatalogoIncremental":
+        """Devuelve un catálogo nuevo con las `n` primeras filas del delta incorporadas a la base."""
+        if n <= 0:
+            return CatalogoIncremental(self.base, self.delta)
+        base = pd.concat([self.base, pd.DataFrame(self.delta[:n])], ignore_index=True)
+        return CatalogoIncremental(base, self.delta[n:])
+
+
+class CatalogoPaginado:
+    """
+    Respuestas de /api/cargar_csv servidas desde el catálogo ya cargado en memoria.
+
+    Cada combinación (offset, limit, filtro) se codifica a JSON y se comprime con gzip una sola vez
+    por versión del catálogo; las peticiones repetidas solo copian los bytes ya preparados. Al
+    recargar el catálogo se crea una instancia nueva, con lo que la caché anterior se descarta.
+    """
+
+    COLUMNAS = ["CodArticle", "Description", "IDArticle"]
+
+    def __init__(self, df_catalogo: pd.DataFrame, version: str, max_respuestas: int = 64):
+        self.version = version
+        self.max_respuestas = max_respuestas
+        columnas = [columna for columna in self.COLUMNAS if columna in df_catalogo]
+        # NaN no es JSON válido: se sustituye por None (null)
+        self.df = df_catalogo[columnas].astype(object).where(df_catalogo[columnas].notna(), None)
+        self.df = self.df.reset_index(drop=True)
+        self.texto_busqueda = (
+            self.df.get("CodArticle", pd.Series("", index=self.df.index)).astype(str) + " "
+            + self.df.get("Description", pd.Series("", index=self.df.index)).astype(str)
+        ).str.lower()
+        self._respuestas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def respuesta(self, offset: int = 0, limit: int = None, filtro: str = "") -> dict:
+        """
+        Devuelve la página pedida ya codificada.
+
+        Args:
+            offset (int): Primera fila (tras aplicar el filtro).
+            limit (int): Número máximo de filas; None para devolver todas.
+            filtro (str): Texto a buscar (sin distinguir mayúsculas) en el código y la descripción.
+
+        Returns:
+            dict: {"cuerpo": bytes JSON, "cuerpo_gzip": bytes comprimidos, "etag": str}.
+        """
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("offset y limit no pueden ser negativos")
+        filtro = filtro.strip().lower()
+        clave = (offset, limit, filtro)
+        with self._lock:
+            respuesta = self._respuestas.get(clave)
+            if respuesta is not None:
+                self._respuestas.move_to_end(clave)
+                return respuesta
+
+        filas = self.df
+        if filtro:
+            filas = filas[self.texto_busqueda.str.contains(filtro, regex=False).to_numpy()]
+        total = len(filas)
+        fin = None if limit is None else offset + limit
+        datos = filas.iloc[offset:fin].to_dict(orient="records")
+        cuerpo = json.dumps(
+            {"data": datos, "total": total, "offset": offset, "limit": limit, "version": self.version}
+        ).encode("utf-8")
+        respuesta = {
+            "cuerpo": cuerpo,
+            "cuerpo_gzip": gzip.compress(cuerpo, compresslevel=6),
+            "etag": hashlib.sha1(cuerpo).hexdigest(),
+        }
+
+        with self._lock:
+            self._respuestas[clave] = respuesta
+            while len(self._respuestas) > self.max_respuestas:
+                self._respuestas.popitem(last=False)
+        return respuesta
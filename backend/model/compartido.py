@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+import threading
+
+from snapshot import escribir_snapshot, leer_snapshot
+
+
+class PrediccionesPublicadas:
+    """
+    Últimas predicciones que el proceso de ingesta publica en disco para los workers de API.
+
+    El proceso de ingesta reescribe el archivo completo tras cada sondeo (temporal + renombrado,
+    así que nunca se lee a medias); cada worker solo lo vuelve a leer cuando cambia su tamaño o fecha.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._estado = None
+
+    def publicar(self, predicciones: list) -> None:
+        ruta_tmp = f"{self.ruta}.{os.getpid()}.tmp"
+        with open(ruta_tmp, "w", encoding="utf-8") as f:
+            json.dump(predicciones, f, ensure_ascii=False, default=str)
+        os.replace(ruta_tmp, self.ruta)
+
+    def actualizadas(self):
+        """
+        Devuelve las predicciones publicadas si han cambiado desde la última llamada, o None si no.
+        """
+        try:
+            stat = os.stat(self.ruta)
+        except FileNotFoundError:
+            return None
+        estado = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if estado == self._estado:
+                return None
+            try:
+                with open(self.ruta, "r", encoding="utf-8") as f:
+                    predicciones = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.error(f"[compartido] Error al leer {self.ruta}: {e}")
+                return None
+            self._estado = estado
+        return predicciones
+
+
+class BasePublicada:
+    """
+    Base del modelo ya fusionada (catálogo, índice de búsqueda, similitud y confirmaciones) que el
+    proceso de ingesta publica tras cada fusión del segmento delta.
+
+    Así la fusión se hace una sola vez: los workers de API no fusionan, sino que mapean en memoria
+    el snapshot publicado cuando cambia (se escribe con temporal + renombrado, nunca a medias).
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._estado = None
+
+    def publicar(self, contenido: dict) -> None:
+        escribir_snapshot(self.ruta, contenido)
+
+    def eliminar(self) -> None:
+        """Retira la base publicada (el proceso de ingesta al arrancar, que parte del catálogo sin fusionar)."""
+        try:
+            os.remove(self.ruta)
+        except FileNotFoundError:
+            pass
+
+    def _estado_archivo(self):
+        try:
+            stat = os.stat(self.ruta)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def cambiada(self) -> bool:
+        """Indica si hay una base publicada distinta de la última leída (solo consulta la fecha y el tamaño)."""
+        estado = self._estado_archivo()
+        return estado is not None and estado != self._estado
+
+    def actualizada(self):
+        """Devuelve el contenido de la base publicada si ha cambiado desde la última llamada, o None si no."""
+        with self._lock:
+            estado = self._estado_archivo()
+            if estado is None or estado == self._estado:
+                return None
+            try:
+                contenido = leer_snapshot(self.ruta)
+            except Exception as e:
+                logging.error(f"[compartido] Error al leer {self.ruta}: {e}")
+                return None
+            self._estado = estado
+        return contenido
@@ -1,13 +1,34 @@
-import pyodbc
+import argparse
+import json
+import logging
+import os
+from datetime import datetime
+from decimal import Decimal
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 HOST = "10.83.0.14"  # El nombre del servidor
 USER = "rpsuser"  # El usuario de la base de datos
 PASSWORD = "rpsuser"  # La contraseña del usuario
 DATABASE = "RPSNextPersistence"  # Aquí va el nombre de la base de datos
 
+# Tabla de artículos y columna con la fecha de última modificación (marca de agua del modo incremental)
+TABLA_ARTICULOS = os.getenv("TABLA_ARTICULOS", "[RPSNovedades2015].[dbo].[STKArticle]")
+COLUMNA_MARCA_AGUA = os.getenv("COLUMNA_MARCA_AGUA", "ModificationDate")
+COLUMNAS_ARTICULO = ["CodArticle", "Description", "IDArticle", "Image"]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Mismo directorio de datos que modelo_prediccion.py, que lee este Parquet
+DIRECTORIO_DATOS = os.getenv("DIRECTORIO_DATOS", BASE_DIR)
+RUTA_PARQUET = os.path.join(DIRECTORIO_DATOS, "consulta_resultado.parquet")
+
 
 def connectionBD():
+    # Solo hace falta para conectar con SQL Server; extraer_articulos acepta cualquier conexión DB-API
+    import pyodbc
+
     connection_string = f"DRIVER={{ODBC Driver 18 for SQL Server}};SERVER={HOST};DATABASE={DATABASE};UID={USER};PWD={PASSWORD};TrustServerCertificate=yes"
     try:
         connection = pyodbc.connect(connection_string)  # Establecer la conexión
@@ -22,13 +43,13 @@ def Query():
     conn = connectionBD()
     if conn is not None:
         cur = conn.cursor()
-        sql = """
+        sql = f"""
         select  CodArticle, Description, IDArticle, Image
-        FROM [RPSNovedades2015].[dbo].[STKArticle]
+        FROM {TABLA_ARTICULOS}
         WHERE InactiveDate is null  AND CodCompany = '1'
         ORDER BY CodArticle;
         """
-        
+
         cur.execute(sql)
 
         filas = cur.fetchall()
@@ -37,18 +58,218 @@ def Query():
         cur.close()
         conn.close()
 
-        
+
         df = pd.DataFrame.from_records(filas, columns=column_names)
         df.to_csv("backend/model/consulta_resultado_clean.csv", index=False)
         print("Data saved to consulta_resultado.csv")
-        
+
         return df
     else:
         return None
 
 
-result = Query()
-if result is not None:
-    print("Data returned successfully.")
-else:
-    print("No data returned or connection failed.")
+def _esquema(columnas: list, descripcion: list, muestra: list):
+    """
+    Esquema Arrow del Parquet: Image como binario y el resto según el tipo de cada columna en
+    `cursor.description` (pyodbc da el tipo de Python: int, float, Decimal, str...), para que
+    IDArticle conserve el tipo que tenía en el CSV.
+
+    Si el driver no da el tipo (sqlite3, por ejemplo) se deduce de los valores del primer bloque,
+    pero una columna numérica se guarda siempre como decimal: un bloque posterior puede traer
+    decimales y el esquema del ParquetWriter ya no se puede cambiar.
+    """
+    campos = []
+    for i, columna in enumerate(columnas):
+        tipo_columna = descripcion[i][1] if i < len(descripcion) else None
+        valores = [fila[i] for fila in muestra if fila[i] is not None]
+        if columna == "Image":
+            tipo = pa.binary()
+        elif isinstance(tipo_columna, type):
+            if issubclass(tipo_columna, bool):
+                tipo = pa.string()
+            elif issubclass(tipo_columna, int):
+                tipo = pa.int64()
+            elif issubclass(tipo_columna, (float, Decimal)):
+                tipo = pa.float64()
+            elif issubclass(tipo_columna, (bytes, bytearray)):
+                tipo = pa.binary()
+            else:
+                tipo = pa.string()
+        elif valores and all(isinstance(v, (int, float, Decimal)) and not isinstance(v, bool) for v in valores):
+            tipo = pa.float64()
+        else:
+            tipo = pa.string()
+        campos.append((columna, tipo))
+    return pa.schema(campos)
+
+
+def _tabla(filas: list, esquema):
+    """Convierte un bloque de filas del cursor en una tabla Arrow (imágenes como binario real)."""
+    columnas = list(zip(*filas)) if filas else [[] for _ in esquema.names]
+    arrays = []
+    for campo, valores in zip(esquema, columnas):
+        if pa.types.is_binary(campo.type):
+            valores = [bytes(v) if v is not None else None for v in valores]
+        elif pa.types.is_string(campo.type):
+            valores = [str(v) if v is not None else None for v in valores]
+        elif pa.types.is_floating(campo.type):
+            # Los NUMERIC/DECIMAL llegan como Decimal, que Arrow no convierte solo a double
+            valores = [float(v) if v is not None else None for v in valores]
+        arrays.append(pa.array(valores, type=campo.type))
+    return pa.Table.from_arrays(arrays, schema=esquema)
+
+
+def _leer_marca_agua(ruta_estado: str):
+    if not os.path.exists(ruta_estado):
+        return None
+    with open(ruta_estado, "r", encoding="utf-8") as f:
+        estado = json.load(f)
+    valor = estado.get("marca_agua")
+    if valor is not None and estado.get("tipo") == "datetime":
+        return datetime.fromisoformat(valor)
+    return valor
+
+
+def _guardar_marca_agua(ruta_estado: str, marca_agua) -> None:
+    if isinstance(marca_agua, datetime):
+        estado = {"marca_agua": marca_agua.isoformat(), "tipo": "datetime"}
+    else:
+        estado = {"marca_agua": marca_agua, "tipo": type(marca_agua).__name__}
+    ruta_tmp = f"{ruta_estado}.tmp"
+    with open(ruta_tmp, "w", encoding="utf-8") as f:
+        json.dump(estado, f)
+    os.replace(ruta_tmp, ruta_estado)
+
+
+def extraer_articulos(conn, ruta_parquet: str = RUTA_PARQUET, tam_bloque: int = 5000, incremental: bool = False,
+                      tabla: str = TABLA_ARTICULOS, columna_marca_agua: str = COLUMNA_MARCA_AGUA,
+                      ruta_estado: str = None) -> dict:
+    """
+    Extrae los artículos activos a Parquet por bloques (`fetchmany`), sin cargar la tabla entera en memoria.
+
+    Las imágenes se guardan como binario (no como literales "b'...'"). En modo incremental solo se
+    piden los artículos modificados desde la marca de agua guardada en la extracción anterior;
+    el Parquet existente se reescribe grupo a grupo sustituyendo esos artículos (y quitando los que
+    han pasado a estar inactivos), de modo que la memoria solo depende del tamaño del bloque y del
+    número de artículos modificados.
+
+    La marca de agua se compara con `>=`: un artículo confirmado después de la extracción anterior
+    pero con la misma fecha de modificación que la marca no se pierde. Los artículos que tienen
+    justo esa fecha se vuelven a pedir y sustituyen a su versión anterior (uno por CodArticle).
+    La columna de la marca de agua solo se consulta si se pide el modo incremental (la primera vez,
+    con una extracción completa, para guardar la marca inicial).
+
+    Args:
+        conn: Conexión DB-API (pyodbc en producción; cualquier conexión con parámetros "?" sirve).
+        ruta_parquet (str): Archivo Parquet de salida.
+        tam_bloque (int): Filas por llamada a fetchmany (y por grupo de filas del Parquet).
+        incremental (bool): Si es True y hay Parquet y marca de agua previos, solo se piden los cambios;
+            si no los hay, se hace una extracción completa y se guarda la marca de agua.
+        tabla (str): Tabla de artículos.
+        columna_marca_agua (str): Columna con la fecha de última modificación del artículo.
+        ruta_estado (str): JSON donde se guarda la marca de agua (por defecto, junto al Parquet).
+
+    Returns:
+        dict: {"modo", "filas", "modificados", "marca_agua"}.
+    """
+    ruta_estado = ruta_estado or f"{ruta_parquet}.estado.json"
+    # Sin columna de modificación no hay marca de agua y solo es posible la extracción completa
+    con_marca_agua = incremental and bool(columna_marca_agua)
+    marca_agua = _leer_marca_agua(ruta_estado) if con_marca_agua else None
+    incremental = incremental and marca_agua is not None and os.path.exists(ruta_parquet)
+    columnas = ", ".join(COLUMNAS_ARTICULO)
+    marca = columna_marca_agua if con_marca_agua else "NULL"
+    cur = conn.cursor()
+    if incremental:
+        # También se piden los inactivos para poder quitarlos del Parquet
+        cur.execute(
+            f"SELECT {columnas}, InactiveDate, {marca} FROM {tabla} "
+            f"WHERE CodCompany = '1' AND {marca} >= ? ORDER BY CodArticle",
+            (marca_agua,),
+        )
+    else:
+        cur.execute(
+            f"SELECT {columnas}, NULL, {marca} FROM {tabla} "
+            f"WHERE InactiveDate is null AND CodCompany = '1' ORDER BY CodArticle"
+        )
+
+    bloque = cur.fetchmany(tam_bloque)
+    if incremental:
+        esquema = pq.read_schema(ruta_parquet)
+    else:
+        esquema = _esquema(
+            COLUMNAS_ARTICULO, cur.description or [], [fila[:len(COLUMNAS_ARTICULO)] for fila in bloque]
+        )
+    ruta_tmp = f"{ruta_parquet}.tmp"
+    nueva_marca_agua = marca_agua
+    # {CodArticle: fila}: si un artículo llega repetido se queda su última versión
+    activos, codigos_modificados = {}, set()
+    filas_escritas = 0
+    with pq.ParquetWriter(ruta_tmp, esquema, compression="zstd") as writer:
+        while bloque:
+            for fila in bloque:
+                modificado = fila[-1]
+                if modificado is not None and (nueva_marca_agua is None or modificado > nueva_marca_agua):
+                    nueva_marca_agua = modificado
+            if incremental:
+                # Los cambios se guardan hasta haber copiado los artículos que no han cambiado
+                for fila in bloque:
+                    codigo = str(fila[0])
+                    codigos_modificados.add(codigo)
+                    activos.pop(codigo, None)
+                    if fila[-2] is None:
+                        activos[codigo] = fila[:len(COLUMNAS_ARTICULO)]
+            else:
+                writer.write_table(_tabla([fila[:len(COLUMNAS_ARTICULO)] for fila in bloque], esquema))
+                filas_escritas += len(bloque)
+            bloque = cur.fetchmany(tam_bloque)
+
+        if incremental:
+            anterior = pq.ParquetFile(ruta_parquet)
+            for grupo in range(anterior.num_row_groups):
+                tabla_grupo = anterior.read_row_group(grupo)
+                codigos = tabla_grupo.column("CodArticle").to_pylist()
+                conservar = pa.array([str(codigo) not in codigos_modificados for codigo in codigos], type=pa.bool_())
+                tabla_grupo = tabla_grupo.filter(conservar)
+                writer.write_table(tabla_grupo)
+                filas_escritas += tabla_grupo.num_rows
+            activos = list(activos.values())
+            for inicio in range(0, len(activos), tam_bloque):
+                writer.write_table(_tabla(activos[inicio:inicio + tam_bloque], esquema))
+            filas_escritas += len(activos)
+    cur.close()
+
+    os.replace(ruta_tmp, ruta_parquet)
+    if nueva_marca_agua is not None:
+        _guardar_marca_agua(ruta_estado, nueva_marca_agua)
+    resultado = {
+        "modo": "incremental" if incremental else "completo",
+        "filas": filas_escritas,
+        "modificados": len(codigos_modificados),
+        "marca_agua": str(nueva_marca_agua),
+    }
+    logging.info(f"Artículos extraídos a {ruta_parquet}: {resultado}")
+    return resultado
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Extrae los artículos de la base de datos.")
+    parser.add_argument("--parquet", action="store_true", help="Extraer por bloques a Parquet (imágenes en binario)")
+    parser.add_argument("--incremental", action="store_true", help="Solo los artículos modificados desde la última extracción")
+    parser.add_argument("--bloque", type=int, default=5000, help="Filas por bloque de fetchmany")
+    args = parser.parse_args()
+
+    if args.parquet or args.incremental:
+        conn = connectionBD()
+        if conn is not None:
+            try:
+                extraer_articulos(conn, tam_bloque=args.bloque, incremental=args.incremental)
+            finally:
+                conn.close()
+    else:
+        result = Query()
+        if result is not None:
+            print("Data returned successfully.")
+        else:
+            print("No data returned or connection failed.")
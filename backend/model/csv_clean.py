@@ -81,111 +81,160 @@
 # clean_dataset("backend/model/consulta_resultado.parquet", 
 #              "backend/model/consulta_resultado_clean.parquet")
 
-import pandas as pd
+import argparse
+import logging
+import os
 import re
+import time
+from contextlib import contextmanager
 
-def clean_dataset(input_path: str, output_path: str):
-    # Cargar el CSV de entrada
-    df = pd.read_csv(input_path)
-    # Guardar la descripción original proveniente de la base de datos
-    df["Original"] = df["Description"].copy()
-    
-    # Aplicar limpieza sobre la columna Description
-    df['Description'] = df['Description'].str.lower()
-    df['Description'] = df['Description'].apply(
-    lambda x: re.sub(r'[^a-zA-Z0-9áéíóúñÁÉÍÓÚÑ\s-]', '', x) if isinstance(x, str) else x
-)
-    df['Description'] = df['Description'].apply(
-    lambda x: ' '.join([word for word in x.split() if word not in [
-        "a", "acá", "ahí", "ajena", "ajenas", "ajeno", "ajenos", "al", "algo", "algún",
-        "alguna", "algunas", "alguno", "algunos", "allá", "alli", "allí", "ambos", "ampleamos",
-        "ante", "antes", "aquel", "aquella", "aquellas", "aquello", "aquellos", "aqui", "aquí",
-        "arriba", "asi", "atras", "aun", "aunque", "bajo", "bastante", "bien", "cabe", "cada",
-        "casi", "cierta", "ciertas", "cierto", "ciertos", "como", "cómo", "con", "conmigo",
-        "conseguimos", "conseguir", "consigo", "consigue", "consiguen", "consigues", "contigo",
-        "contra", "cual", "cuales", "cualquier", "cualquiera", "cualquieras", "cuan", "cuando",
-        "cuanta", "cuantas", "cuanto", "cuantos", "de", "dejar", "del", "demas", "demasiada",
-        "demasiadas", "demasiado", "demasiados", "dentro", "desde", "donde", "dos", "el", "él",
-        "ella", "ellas", "ello", "ellos", "empleais", "emplean", "emplear", "empleas", "empleo",
-        "en", "encima", "entonces", "entre", "era", "eramos", "eran", "eras", "eres", "es",
-        "esa", "esas", "ese", "eso", "esos", "esta", "estaba", "estado", "estais", "estamos",
-        "estan", "estoy", "fin", "fue", "fueron", "fui", "fuimos", "gueno", "ha", "hace",
-        "haceis", "hacemos", "hacen", "hacer", "haces", "hago", "incluso", "intenta", "intentais",
-        "intentamos", "intentan", "intentar", "intentas", "intento", "ir", "jamás", "junto",
-        "juntos", "la", "largo", "las", "lo", "los", "mientras", "mio", "misma", "mismas",
-        "mismo", "mismos", "modo", "mucha", "muchas", "muchísima", "muchísimas", "muchísimo",
-        "muchísimos", "mucho", "muchos", "muy", "nada", "ni", "ninguna", "ningunas", "ninguno",
-        "ningunos", "no", "nos", "nosotras", "nosotros", "nuestra", "nuestras", "nuestro",
-        "nuestros", "nunca", "os", "otra", "otras", "otro", "otros", "para", "parecer", "pero",
-        "poca", "pocas", "poco", "pocos", "podeis", "podemos", "poder", "podria", "podriais",
-        "podriamos", "podrian", "podrias", "por", "por qué", "porque", "primero", "puede",
-        "pueden", "puedo", "pues", "que", "qué", "querer", "quien", "quién", "quienes", "quienesquiera",
-        "quienquiera", "quiza", "quizas", "sabe", "sabeis", "sabemos", "saben", "saber", "sabes",
-        "se", "segun", "ser", "si", "sí", "siempre", "siendo", "sin", "sino", "so", "sobre",
-        "sois", "solamente", "solo", "somos", "soy", "su", "sus", "suya", "suyas", "suyo",
-        "suyos", "tal", "tales", "también", "tampoco", "tan", "tanta", "tantas", "tanto",
-        "tantos", "te", "teneis", "tenemos", "tener", "tengo", "ti", "tiempo", "tiene", "tienen",
-        "toda", "todas", "todo", "todos", "tomar", "trabaja", "trabajais", "trabajamos", "trabajan",
-        "trabajar", "trabajas", "trabajo", "tras", "tú", "último", "un", "una", "unas", "uno",
-        "unos", "usa", "usais", "usamos", "usan", "usar", "usas", "uso", "usted", "ustedes",
-        "va", "vais", "valor", "vamos", "van", "varias", "varios", "vaya", "verdad", "verdadera",
-        "vosotras", "vosotros", "voy", "vuestra", "vuestras", "vuestro", "vuestros", "y", "ya",
-        "yo"
-    ]] ) if isinstance(x, str) else x
-)
-    df['Description'] = df['Description'].str.replace(r'\bpe\b', 'polietileno', regex=True)
-    df['Description'] = df['Description'].str.replace(r'\bpolie\b', 'polietileno', regex=True)
-    df['Description'] = df['Description'].str.replace(r'\b(\d+)\s*mm\b', r'\1mm', regex=True)
-    df['Description'] = df['Description'].str.replace(r'\bmts\s*(\w+)', r'\1', regex=True)
-    df['Description'] = df['Description'].str.strip()
-    df['Description'] = df['Description'].str.replace(r'\s+', ' ', regex=True)
-    
-    # Crear lista para almacenar las variaciones
-    variaciones = []
-    
-    for _, row in df.iterrows():
-        cod = row["CodArticle"]
-        id_art = row["IDArticle"]
-        original = row["Original"]
-        desc = row["Description"]
-        # Si desc no es string, lo convierte a cadena
-        if not isinstance(desc, str):
-            desc = str(desc)
-        
-        # Variación 0: Texto original sin limpieza (de la BBDD)
-        variaciones.append([cod, original, id_art])
-        
-        # Variación original limpia
-        if desc != original:
-            variaciones.append([cod, desc, id_art])
-        
-        # Variación 1: Reemplazar "polietileno" con "pe"
-        variacion1 = desc.replace("polietileno", "pe")
-        if variacion1 != desc:
-            variaciones.append([cod, variacion1, id_art])
-        
-        # Variación 2: Simplificar dimensiones (eliminar guiones y unir números)
-        variacion2 = re.sub(r'(\d+)-(\d+)', r'\1\2', desc)
-        if variacion2 != desc:
-            variaciones.append([cod, variacion2, id_art])
-        
-        # Variación 3: Invertir el orden de las palabras principales
-        palabras = desc.split()
-        if len(palabras) > 1:
-            variacion3 = f"{palabras[-1]} {' '.join(palabras[:-1])}"
-            variaciones.append([cod, variacion3, id_art])
-        
-        # Variación 4: Reducir a la mínima expresión (solo palabras clave)
-        palabras_clave = [palabra for palabra in palabras if re.match(r'\d+|\w{3,}', palabra)]
-        variacion4 = ' '.join(palabras_clave[:2])
-        if variacion4 != desc and len(palabras_clave) >= 2:
-            variaciones.append([cod, variacion4, id_art])
-        
-        # Crear DataFrame con todas las variaciones y guardarlo en CSV
-        df_variaciones = pd.DataFrame(variaciones, columns=["CodArticle", "Description", "IDArticle"])
-        df_variaciones.to_csv(output_path, index=False)
-        print(f"Datos limpios y variaciones guardados en {output_path}")
-
-# Ejecutar limpieza
-clean_dataset("backend/model/consulta_resultado_clean.csv", 
-             "backend/model/consulta_resultado_clean.csv")
\ No newline at end of file
+import pandas as pd
+
+from normalizacion import STOP_WORDS
+
+
+# Expresiones usadas en la limpieza y en las variaciones (se compilan una sola vez)
+PATRON_CARACTERES = r'[^a-zA-Z0-9áéíóúñÁÉÍÓÚÑ\s-]'
+PATRON_PALABRA_CLAVE = re.compile(r'\d+|\w{3,}')
+COLUMNAS_SALIDA = ["CodArticle", "Description", "IDArticle"]
+
+
+@contextmanager
+def _medir(tiempos: dict, etapa: str):
+    """Acumula en `tiempos[etapa]` los segundos que tarda el bloque."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        tiempos[etapa] = tiempos.get(etapa, 0.0) + time.perf_counter() - inicio
+
+
+def limpiar_descripciones(descripciones: pd.Series) -> pd.Series:
+    """Normaliza la columna Description (minúsculas, caracteres, stop words, sinónimos y espacios)."""
+    # Se trabaja con dtype object para que las expresiones regulares usen siempre el motor `re`
+    desc = descripciones.astype(object).str.lower()
+    desc = desc.str.replace(PATRON_CARACTERES, '', regex=True)
+    desc = pd.Series(
+        [' '.join(word for word in x.split() if word not in STOP_WORDS) if isinstance(x, str) else x for x in desc],
+        index=desc.index, dtype=object,
+    )
+    desc = desc.str.replace(r'\bpe\b', 'polietileno', regex=True)
+    desc = desc.str.replace(r'\bpolie\b', 'polietileno', regex=True)
+    desc = desc.str.replace(r'\b(\d+)\s*mm\b', r'\1mm', regex=True)
+    desc = desc.str.replace(r'\bmts\s*(\w+)', r'\1', regex=True)
+    desc = desc.str.strip()
+    desc = desc.str.replace(r'\s+', ' ', regex=True)
+    return desc
+
+
+def generar_variaciones(df: pd.DataFrame, tiempos: dict = None) -> pd.DataFrame:
+    """
+    Genera todas las variaciones de descripción de un bloque del catálogo con operaciones de columna.
+
+    Para cada artículo, en este orden: la descripción original, la limpia (si cambia), con "pe" en
+    lugar de "polietileno", con las dimensiones unidas ("16-20" -> "1620"), con la última palabra
+    delante y solo con las dos primeras palabras clave.
+
+    Args:
+        df (pd.DataFrame): Bloque con CodArticle, Description e IDArticle.
+        tiempos (dict): Si se indica, acumula el tiempo de cada etapa.
+
+    Returns:
+        pd.DataFrame: Variaciones con las columnas CodArticle, Description e IDArticle.
+    """
+    tiempos = {} if tiempos is None else tiempos
+    original = df["Description"]
+    with _medir(tiempos, "limpieza"):
+        desc = limpiar_descripciones(original)
+        # Las descripciones vacías (NaN) se tratan como texto, igual que antes
+        desc = desc.map(lambda x: x if isinstance(x, str) else str(x))
+
+    with _medir(tiempos, "variaciones"):
+        palabras = desc.str.split()
+        num_palabras = palabras.str.len()
+        variacion1 = desc.str.replace("polietileno", "pe", regex=False)
+        variacion2 = desc.str.replace(r'(\d+)-(\d+)', r'\1\2', regex=True)
+        variacion3 = palabras.str[-1] + " " + palabras.str[:-1].str.join(" ")
+        palabras_clave = pd.Series(
+            [[palabra for palabra in lista if PATRON_PALABRA_CLAVE.match(palabra)] for lista in palabras],
+            index=desc.index, dtype=object,
+        )
+        variacion4 = palabras_clave.str[:2].str.join(" ")
+
+        # (descripción, filas en las que se incluye) en el orden en que se generaban por artículo
+        candidatas = [
+            (original, pd.Series(True, index=desc.index)),
+            (desc, desc != original),
+            (variacion1, variacion1 != desc),
+            (variacion2, variacion2 != desc),
+            (variacion3, num_palabras > 1),
+            (variacion4, (variacion4 != desc) & (palabras_clave.str.len() >= 2)),
+        ]
+        filas = len(df)
+        bloques = []
+        for orden, (descripcion, incluir) in enumerate(candidatas):
+            bloque = pd.DataFrame({
+                "CodArticle": df["CodArticle"].to_numpy(),
+                "Description": descripcion.to_numpy(),
+                "IDArticle": df["IDArticle"].to_numpy(),
+                "_fila": range(filas),
+                "_orden": orden,
+            })
+            bloques.append(bloque[incluir.to_numpy()])
+        variaciones = pd.concat(bloques, ignore_index=True)
+        variaciones = variaciones.sort_values(["_fila", "_orden"], kind="stable")
+    return variaciones[COLUMNAS_SALIDA].reset_index(drop=True)
+
+
+def clean_dataset(input_path: str, output_path: str, chunksize: int = None) -> dict:
+    """
+    Limpia el catálogo y genera el CSV de variaciones escribiendo la salida una sola vez.
+
+    Args:
+        input_path (str): CSV de entrada (CodArticle, Description, IDArticle).
+        output_path (str): CSV de salida; puede ser el mismo que el de entrada.
+        chunksize (int): Si se indica, el catálogo se procesa por bloques de ese número de filas
+            (para catálogos que no caben en memoria) y cada bloque se añade a la salida.
+
+    Returns:
+        dict: Segundos empleados en cada etapa (lectura, limpieza, variaciones, escritura y total).
+    """
+    tiempos = {}
+    inicio = time.perf_counter()
+    # Se escribe en un temporal y se renombra al final, así la entrada puede ser también la salida
+    ruta_tmp = f"{output_path}.tmp"
+    filas = variaciones_totales = 0
+    with _medir(tiempos, "lectura"):
+        lector = pd.read_csv(input_path, chunksize=chunksize) if chunksize else iter([pd.read_csv(input_path)])
+    with open(ruta_tmp, "w", encoding="utf-8", newline="") as salida:
+        primero = True
+        while True:
+            with _medir(tiempos, "lectura"):
+                bloque = next(lector, None)
+            if bloque is None:
+                break
+            variaciones = generar_variaciones(bloque, tiempos)
+            with _medir(tiempos, "escritura"):
+                variaciones.to_csv(salida, index=False, header=primero)
+            primero = False
+            filas += len(bloque)
+            variaciones_totales += len(variaciones)
+        if primero:
+            pd.DataFrame(columns=COLUMNAS_SALIDA).to_csv(salida, index=False)
+    os.replace(ruta_tmp, output_path)
+    tiempos["total"] = time.perf_counter() - inicio
+
+    logging.info(f"{filas} artículos, {variaciones_totales} variaciones guardadas en {output_path}")
+    logging.info("Tiempos por etapa: " + ", ".join(f"{etapa}={segundos:.2f}s" for etapa, segundos in tiempos.items()))
+    print(f"Datos limpios y variaciones guardados en {output_path}")
+    return tiempos
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Limpia el catálogo y genera las variaciones de descripción.")
+    parser.add_argument("entrada", nargs="?", default="backend/model/consulta_resultado_clean.csv")
+    parser.add_argument("salida", nargs="?", default="backend/model/consulta_resultado_clean.csv")
+    parser.add_argument("--chunksize", type=int, default=None, help="Procesar el catálogo por bloques de N filas")
+    args = parser.parse_args()
+    clean_dataset(args.entrada, args.salida, chunksize=args.chunksize)
@@ -0,0 +1,254 @@
+import json
+import logging
+import os
+import shutil
+import threading
+
+import joblib
+
+
+def _escritura_atomica(ruta: str, escribir) -> None:
+    """Escribe en un archivo temporal, lo sincroniza a disco y lo renombra sobre el destino."""
+    ruta_tmp = f"{ruta}.tmp"
+    escribir(ruta_tmp)
+    with open(ruta_tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(ruta_tmp, ruta)
+
+
+class DiarioConfirmaciones:
+    """
+    Persistencia de descripciones_confirmadas con un diario de solo anexado y snapshots periódicos.
+
+    Cada confirmación se añade como una línea JSON al diario y se sincroniza a disco, así que el
+    coste de guardar no depende del tamaño del diccionario. Cada `umbral_compactacion` entradas el
+    diario se rota y el diccionario completo se vuelca en segundo plano al snapshot (joblib y JSON),
+    siempre mediante escritura atómica. Al cargar se lee el snapshot y se reaplican los diarios; una
+    línea incompleta por una caída a mitad de escritura se descarta.
+    """
+
+    def __init__(self, ruta_snapshot: str, ruta_json: str, ruta_diario: str, umbral_compactacion: int = 1000):
+        self.ruta_snapshot = ruta_snapshot
+        self.ruta_json = ruta_json
+        self.ruta_diario = ruta_diario
+        self.ruta_diario_rotado = f"{ruta_diario}.compactando"
+        self.umbral_compactacion = umbral_compactacion
+        self.entradas = 0
+        self._lock = threading.Lock()
+        self._compactacion = None
+
+    def cargar(self) -> dict:
+        """Devuelve las confirmaciones del snapshot con los diarios pendientes reaplicados."""
+        confirmaciones = {}
+        if os.path.exists(self.ruta_snapshot) and os.path.getsize(self.ruta_snapshot) > 0:
+            try:
+                confirmaciones = joblib.load(self.ruta_snapshot)
+            except Exception as e:
+                logging.error(f"Error al cargar {self.ruta_snapshot}: {e}. Se parte de un snapshot vacío.")
+        else:
+            logging.info(f"El archivo {self.ruta_snapshot} no existe o está vacío. Se parte de un snapshot vacío.")
+
+        self._recortar_linea_incompleta(self.ruta_diario)
+        rotado_pendiente = self._reaplicar(self.ruta_diario_rotado, confirmaciones)
+        self.entradas = self._reaplicar(self.ruta_diario, confirmaciones)
+        if os.path.exists(self.ruta_diario_rotado):
+            # Una compactación quedó a medias (p. ej. por una caída): se completa ahora
+            logging.info(f"Completando compactación pendiente ({rotado_pendiente} entradas)")
+            self.compactar(confirmaciones)
+        return confirmaciones
+
+    def leer(self) -> dict:
+        """
+        Como `cargar`, pero sin modificar ningún archivo: para los procesos que solo siguen el diario
+        (los workers de API), mientras el proceso de ingesta es el único que escribe.
+        """
+        return self.leer_con_posicion()[0]
+
+    def leer_con_posicion(self, max_intentos: int = 5) -> tuple:
+        """
+        Como `leer`, devolviendo también la posición del diario desde la que seguir con `entradas_nuevas`.
+
+        El snapshot y los dos diarios se leen uno detrás de otro mientras el proceso de ingesta puede
+        estar compactando: si termina una compactación (o una rotación) a mitad de la lectura, se
+        podría combinar el snapshot antiguo con los diarios ya vaciados. Por eso se comprueba que los
+        archivos son los mismos antes y después de leer, y si no lo son se vuelve a leer.
+
+        Returns:
+            tuple: (confirmaciones, posicion).
+        """
+        for _ in range(max_intentos):
+            antes = self._firma_archivos()
+            posicion = self.posicion()
+            confirmaciones = {}
+            if os.path.exists(self.ruta_snapshot) and os.path.getsize(self.ruta_snapshot) > 0:
+                try:
+                    confirmaciones = joblib.load(self.ruta_snapshot)
+                except Exception as e:
+                    logging.error(f"Error al cargar {self.ruta_snapshot}: {e}. Se parte de un snapshot vacío.")
+            self._reaplicar(self.ruta_diario_rotado, confirmaciones)
+            self._reaplicar(self.ruta_diario, confirmaciones)
+            if self._firma_archivos() == antes:
+                break
+            logging.info("El diario se ha compactado durante la lectura, se vuelve a leer")
+        else:
+            logging.warning(f"El diario {self.ruta_diario} ha cambiado en {max_intentos} lecturas seguidas")
+        return confirmaciones, posicion
+
+    def _firma_archivos(self) -> tuple:
+        """Identidad del snapshot, del diario rotado y del diario (sin el tamaño de este, que crece al añadir)."""
+        firma = []
+        for ruta in (self.ruta_snapshot, self.ruta_diario_rotado, self.ruta_diario):
+            try:
+                stat = os.stat(ruta)
+            except FileNotFoundError:
+                firma.append(None)
+                continue
+            if ruta == self.ruta_diario:
+                firma.append(stat.st_ino)
+            else:
+                firma.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        return tuple(firma)
+
+    def posicion(self) -> tuple:
+        """Posición actual del final del diario: (inodo, bytes). Se pasa después a `entradas_nuevas`."""
+        try:
+            stat = os.stat(self.ruta_diario)
+        except FileNotFoundError:
+            return None, 0
+        return stat.st_ino, stat.st_size
+
+    def entradas_nuevas(self, posicion: tuple):
+        """
+        Lee las entradas completas añadidas al diario desde `posicion`.
+
+        Returns:
+            tuple: (entradas, posicion_nueva). `entradas` es None si el diario se ha rotado desde
+            entonces (compactación): en ese caso hay que volver a leerlo todo con `leer`.
+        """
+        inodo, desplazamiento = posicion
+        inodo_actual, tamano = self.posicion()
+        if inodo is None and inodo_actual is not None:
+            # El diario no existía: todo lo que tenga ahora es nuevo
+            inodo = inodo_actual
+        if inodo_actual != inodo or tamano < desplazamiento:
+            return None, (inodo_actual, tamano)
+        if tamano == desplazamiento:
+            return [], posicion
+        with open(self.ruta_diario, "rb") as f:
+            f.seek(desplazamiento)
+            contenido = f.read(tamano - desplazamiento)
+        # Solo se consumen líneas completas; una a medias se leerá en la siguiente llamada
+        completo = contenido[:contenido.rfind(b"\n") + 1]
+        entradas = []
+        for linea in completo.decode("utf-8").splitlines():
+            try:
+                entradas.append(json.loads(linea))
+            except json.JSONDecodeError:
+                logging.warning(f"Entrada dañada en el diario {self.ruta_diario}, se ignora")
+        return entradas, (inodo, desplazamiento + len(completo))
+
+    @staticmethod
+    def _recortar_linea_incompleta(ruta: str) -> None:
+        """Elimina la última línea si quedó a medias, para que la siguiente entrada empiece en una línea nueva."""
+        if not os.path.exists(ruta) or os.path.getsize(ruta) == 0:
+            return
+        with open(ruta, "rb+") as f:
+            contenido = f.read()
+            if contenido.endswith(b"\n"):
+                return
+            f.truncate(contenido.rfind(b"\n") + 1)
+            logging.warning(f"Descartada una entrada incompleta al final del diario {ruta}")
+
+    @staticmethod
+    def _reaplicar(ruta: str, confirmaciones: dict) -> int:
+        if not os.path.exists(ruta):
+            return 0
+        entradas = 0
+        with open(ruta, "r", encoding="utf-8") as f:
+            for numero, linea in enumerate(f, start=1):
+                try:
+                    entrada = json.loads(linea)
+                    confirmaciones[entrada["descripcion"]] = entrada["codigo"]
+                    entradas += 1
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    logging.warning(f"Entrada {numero} del diario {ruta} incompleta o dañada, se ignora")
+        return entradas
+
+    def registrar(self, descripcion: str, codigo, confirmaciones: dict, original: str = None) -> None:
+        """
+        Añade una confirmación al diario.
+
+        Args:
+            descripcion (str): Descripción normalizada.
+            codigo: CodArticle confirmado.
+            confirmaciones (dict): Diccionario completo, ya actualizado; solo se copia cuando toca compactar.
+            original (str): Descripción tal y como la envió el usuario (la usan los procesos que siguen el diario).
+        """
+        entrada = {"descripcion": descripcion, "codigo": codigo}
+        if original is not None:
+            entrada["original"] = original
+        linea = json.dumps(entrada, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.ruta_diario, "a", encoding="utf-8") as f:
+                f.write(linea)
+                f.flush()
+                os.fsync(f.fileno())
+            self.entradas += 1
+            if self.entradas < self.umbral_compactacion or self._compactando():
+                return
+            # Se rota el diario: lo que llegue a partir de ahora va a un diario nuevo
+            self._rotar()
+            self.entradas = 0
+            copia = dict(confirmaciones)
+        self._compactacion = threading.Thread(target=self._volcar_snapshot, args=(copia,), daemon=True)
+        self._compactacion.start()
+
+    def _compactando(self) -> bool:
+        return self._compactacion is not None and self._compactacion.is_alive()
+
+    def _rotar(self) -> None:
+        """
+        Pasa el diario actual al rotado. Si ya hay uno rotado (una compactación que falló o no llegó
+        a terminar), se le añade el actual en lugar de sustituirlo, para no perder sus entradas.
+        """
+        if not os.path.exists(self.ruta_diario_rotado):
+            os.replace(self.ruta_diario, self.ruta_diario_rotado)
+            return
+        with open(self.ruta_diario, "rb") as origen, open(self.ruta_diario_rotado, "ab") as destino:
+            shutil.copyfileobj(origen, destino)
+            destino.flush()
+            os.fsync(destino.fileno())
+        os.remove(self.ruta_diario)
+
+    def compactar(self, confirmaciones: dict) -> None:
+        """
+        Vuelca el diccionario completo al snapshot y vacía los diarios (de forma síncrona).
+
+        Los diarios solo se borran después de escribir el snapshot: si el proceso cae antes, al
+        cargar se vuelven a reaplicar.
+        """
+        if self._compactando():
+            self._compactacion.join()
+        with self._lock:
+            if self._volcar_snapshot(dict(confirmaciones)):
+                if os.path.exists(self.ruta_diario):
+                    os.remove(self.ruta_diario)
+                self.entradas = 0
+
+    def _volcar_snapshot(self, confirmaciones: dict) -> bool:
+        try:
+            _escritura_atomica(self.ruta_snapshot, lambda ruta: joblib.dump(confirmaciones, ruta))
+
+            def escribir_json(ruta):
+                with open(ruta, "w", encoding="utf-8") as f:
+                    json.dump(confirmaciones, f, ensure_ascii=False, indent=4)
+
+            _escritura_atomica(self.ruta_json, escribir_json)
+            # El snapshot ya contiene todo lo del diario rotado
+            if os.path.exists(self.ruta_diario_rotado):
+                os.remove(self.ruta_diario_rotado)
+            logging.info(f"Snapshot de descripciones confirmadas compactado con {len(confirmaciones)} entradas")
+            return True
+        except Exception as e:
+            logging.error(f"Error compactando las descripciones confirmadas: {e}")
+            return False
@@ -0,0 +1,111 @@
+from collections import ChainMap
+from dataclasses import dataclass, field, replace
+
+import pandas as pd
+
+from buscador import MotorBusqueda
+from catalogo import CatalogoIncremental, CatalogoPaginado
+from similitud import ModeloSimilitud
+
+
+@dataclass(frozen=True)
+class EstadoModelo:
+    """
+    Versión inmutable de todo lo que usan las predicciones: catálogo, índice de búsqueda, modelo de
+    similitud, tablas por CodArticle y confirmaciones del usuario.
+
+    Se publica en una única variable global y se sustituye de una vez (read-copy-update): quien lee
+    toma la referencia al empezar y usa esa versión hasta el final, sin locks y sin ver cambios a
+    mitad. Quien escribe prepara la versión siguiente aparte con `con_correcciones` o `con_base`;
+    las partes grandes (DataFrames, índice, matrices y confirmaciones) se comparten y solo se
+    copian los segmentos delta.
+    """
+
+    catalogo: CatalogoIncremental
+    motor_busqueda: MotorBusqueda
+    modelo_similitud: ModeloSimilitud
+    # CodArticle -> registro del catálogo de entrenamiento (con su posición) y del catálogo original
+    indice_df: dict
+    indice_lookup: dict
+    df_lookup: pd.DataFrame
+    catalogo_paginado: CatalogoPaginado
+    # Descripción normalizada -> CodArticle confirmado por el usuario (no se modifica)
+    confirmaciones: dict = field(default_factory=dict)
+    # Códigos que solo aparecen en el segmento delta (los de la base tienen preferencia)
+    indice_delta: dict = field(default_factory=dict)
+    # Confirmaciones posteriores a la última fusión (tienen preferencia sobre `confirmaciones`)
+    confirmaciones_delta: dict = field(default_factory=dict)
+    version: int = 0
+
+    def registro_df(self, codigo):
+        """Registro del catálogo de entrenamiento para un CodArticle (primera aparición), o None."""
+        registro = self.indice_df.get(codigo)
+        return registro if registro is not None else self.indice_delta.get(codigo)
+
+    def confirmacion(self, descripcion_normalizada: str):
+        """CodArticle confirmado para una descripción normalizada, o None."""
+        codigo = self.confirmaciones_delta.get(descripcion_normalizada)
+        return codigo if codigo is not None else self.confirmaciones.get(descripcion_normalizada)
+
+    def vista_confirmaciones(self) -> ChainMap:
+        """Todas las confirmaciones como un mapping de solo lectura (sin copiar la base)."""
+        return ChainMap(self.confirmaciones_delta, self.confirmaciones)
+
+    def con_filas(self, filas: list) -> "EstadoModelo":
+        """
+        Versión nueva con filas añadidas al segmento delta del catálogo, del índice de búsqueda y de la
+        matriz de similitud.
+
+        Args:
+            filas (list): Diccionarios con "Description", "CodArticle" y "Description_Procesada".
+        """
+        inicio = len(self.catalogo)
+        indice_delta = dict(self.indice_delta)
+        for i, fila in enumerate(filas):
+            if fila["CodArticle"] not in self.indice_df:
+                indice_delta.setdefault(fila["CodArticle"], {**fila, "posicion": inicio + i})
+        return replace(
+            self,
+            catalogo=self.catalogo.con_filas(filas),
+            motor_busqueda=self.motor_busqueda.con_delta(
+                [(fila["Description_Procesada"], inicio + i) for i, fila in enumerate(filas)]
+            ),
+            modelo_similitud=self.modelo_similitud.con_filas([fila["Description_Procesada"] for fila in filas]),
+            indice_delta=indice_delta,
+            version=self.version + 1,
+        )
+
+    def con_correcciones(self, correcciones: list) -> "EstadoModelo":
+        """
+        Versión nueva con correcciones del usuario: quedan confirmadas y se añaden al segmento delta.
+
+        Args:
+            correcciones (list): Tuplas (descripción original, descripción normalizada, CodArticle).
+        """
+        filas = [
+            {"Description": descripcion, "CodArticle": codigo, "Description_Procesada": normalizada}
+            for descripcion, normalizada, codigo in correcciones
+        ]
+        confirmaciones_delta = {
+            **self.confirmaciones_delta, **{normalizada: codigo for _, normalizada, codigo in correcciones}
+        }
+        return replace(self.con_filas(filas), confirmaciones_delta=confirmaciones_delta)
+
+    def con_base(self, catalogo: CatalogoIncremental, motor_busqueda: MotorBusqueda,
+                 modelo_similitud: ModeloSimilitud, indice_df: dict, filas_pendientes: list,
+                 confirmaciones: dict) -> "EstadoModelo":
+        """
+        Versión nueva tras fusionar el delta: sustituye la base por la ya fusionada y vuelve a añadir
+        al delta las filas que llegaron mientras se fusionaba. Igual con las confirmaciones: en el
+        delta solo quedan las que no coinciden con las ya fusionadas.
+        """
+        confirmaciones_delta = {
+            descripcion: codigo for descripcion, codigo in self.confirmaciones_delta.items()
+            if confirmaciones.get(descripcion) != codigo
+        }
+        fusionado = replace(
+            self, catalogo=catalogo, motor_busqueda=motor_busqueda, modelo_similitud=modelo_similitud,
+            indice_df=indice_df, indice_delta={}, confirmaciones=confirmaciones,
+            confirmaciones_delta=confirmaciones_delta,
+        )
+        return fusionado.con_filas(filas_pendientes)
@@ -0,0 +1,307 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from msal import ConfidentialClientApplication
+from requests.adapters import HTTPAdapter
+
+
+GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+
+
+class ClienteGraph:
+    """
+    Cliente compartido para Microsoft Graph.
+
+    Reutiliza una única ConfidentialClientApplication, guarda el token hasta poco antes de que
+    caduque y envía todas las peticiones por una `requests.Session` con conexiones keep-alive,
+    de forma que un sondeo completo cuesta un token y unas pocas conexiones TLS.
+
+    Todas las peticiones llevan un tiempo máximo de conexión y de lectura (`timeout`), para que una
+    conexión colgada no detenga el sondeo; si se agota se reintenta como un 503/504.
+
+    Un `lote` comparte un único plazo (`tiempo_maximo_lote`) entre sus reintentos y los de cada
+    $batch, de forma que un sondeo limitado por Graph no se queda bloqueado más de ese tiempo (más,
+    como mucho, el `timeout` de la petición en curso).
+
+    Con `token_fijo` no se usa MSAL y se envía siempre ese token (para el simulador local de Graph,
+    graph_simulado.py).
+    """
+
+    # Códigos con los que Graph indica que hay que esperar y reintentar
+    CODIGOS_REINTENTO = (429, 503, 504)
+    # Máximo de peticiones que admite Graph en una petición JSON $batch
+    MAX_PETICIONES_LOTE = 20
+
+    def __init__(self, client_id: str, tenant_id: str, client_secret: str, scopes: list,
+                 base_url: str = GRAPH_BASE_URL, margen_expiracion: int = 300, max_conexiones: int = 10,
+                 max_reintentos: int = 5, espera_maxima: float = 60.0, token_fijo: str = None,
+                 timeout: tuple = (10.0, 60.0), tiempo_maximo_lote: float = 300.0):
+        self.client_id = client_id
+        self.tenant_id = tenant_id
+        self.client_secret = client_secret
+        self.scopes = scopes
+        self.base_url = base_url.rstrip("/")
+        self.margen_expiracion = margen_expiracion
+        self.max_conexiones = max_conexiones
+        self.max_reintentos = max_reintentos
+        self.espera_maxima = espera_maxima
+        self.token_fijo = token_fijo
+        # (segundos para conectar, segundos entre bytes recibidos)
+        self.timeout = timeout
+        # Segundos que puede dedicar lote() a esperar reintentos, contando los de cada $batch
+        self.tiempo_maximo_lote = tiempo_maximo_lote
+
+        self._app = None
+        self._token = None
+        self._token_expira = 0.0
+        self._token_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self._adaptador = HTTPAdapter(pool_connections=max_conexiones, pool_maxsize=max_conexiones)
+        self.session.mount("https://", self._adaptador)
+        self.session.mount("http://", self._adaptador)
+
+        # Contadores
+        self.tokens_obtenidos = 0
+        self.peticiones = 0
+        self.limitaciones = 0
+        # Peticiones que agotaron el timeout de conexión o de lectura (red lenta, no limitación de Graph)
+        self.timeouts = 0
+        # Peticiones (o subpeticiones de un $batch) que terminan en error tras los reintentos
+        self.errores = 0
+        self._contadores_lock = threading.Lock()
+
+    def _contar(self, contador: str, cantidad: int = 1) -> None:
+        with self._contadores_lock:
+            setattr(self, contador, getattr(self, contador) + cantidad)
+
+    def url(self, ruta: str) -> str:
+        """Construye la URL completa a partir de una ruta relativa a la versión de la API."""
+        if ruta.startswith(("http://", "https://")):
+            return ruta
+        return f"{self.base_url}/{ruta.lstrip('/')}"
+
+    def token(self, forzar: bool = False) -> str:
+        """Devuelve el token en caché o pide uno nuevo si falta poco para que caduque."""
+        if self.token_fijo:
+            return self.token_fijo
+        with self._token_lock:
+            if not forzar and self._token and time.time() < self._token_expira - self.margen_expiracion:
+                return self._token
+            if self._app is None:
+                self._app = ConfidentialClientApplication(
+                    self.client_id,
+                    authority=f"https://login.microsoftonline.com/{self.tenant_id}",
+                    client_credential=self.client_secret,
+                )
+            result = self._app.acquire_token_for_client(scopes=self.scopes)
+            if "access_token" not in result:
+                error_msg = result.get("error_description", "No se pudo obtener el token de acceso.")
+                raise Exception(f"No se pudo obtener el token de acceso: {error_msg}")
+            self._contar("tokens_obtenidos")
+            self._token = result["access_token"]
+            self._token_expira = time.time() + int(result.get("expires_in", 3600))
+            return self._token
+
+    def peticion(self, metodo: str, ruta: str, headers: dict = None, plazo: float = None,
+                 **kwargs) -> requests.Response:
+        """
+        Envía una petición autenticada a Graph.
+
+        Si el token ha dejado de ser válido (401) se renueva y se reintenta una vez. Si Graph limita
+        la petición (429/503/504) se espera lo indicado en Retry-After, o un tiempo exponencial si no
+        viene, hasta `max_reintentos` veces. Si se agota el `timeout` se reintenta igual (con espera
+        exponencial) y, agotados los reintentos, se lanza la excepción de requests.
+
+        Con `plazo` (instante de time.monotonic()) no se reintenta si la espera lo sobrepasa: se
+        devuelve la última respuesta o se lanza la excepción, como al agotar los reintentos.
+        """
+        cabeceras = {"Accept": "application/json", **(headers or {})}
+        kwargs.setdefault("timeout", self.timeout)
+        token_renovado = False
+        reintentos = 0
+        while True:
+            cabeceras["Authorization"] = f"Bearer {self.token(forzar=token_renovado)}"
+            self._contar("peticiones")
+            try:
+                response = self.session.request(metodo, self.url(ruta), headers=cabeceras, **kwargs)
+            except requests.Timeout as e:
+                espera = min(2 ** reintentos, self.espera_maxima)
+                if reintentos >= self.max_reintentos or not self._cabe_en_plazo(espera, plazo):
+                    self._contar("errores")
+                    raise
+                self._contar("timeouts")
+                logging.warning(
+                    f"Tiempo agotado en la petición a Graph ({metodo} {ruta}: {e}), "
+                    f"reintento {reintentos + 1}/{self.max_reintentos} en {espera:.1f}s"
+                )
+                time.sleep(espera)
+                reintentos += 1
+                continue
+            except requests.RequestException:
+                self._contar("errores")
+                raise
+            if response.status_code == 401 and not token_renovado:
+                logging.warning(f"Token rechazado por Graph ({metodo} {ruta}), se renueva")
+                token_renovado = True
+                continue
+            if response.status_code in self.CODIGOS_REINTENTO and reintentos < self.max_reintentos:
+                espera = self._espera_reintento(response, reintentos)
+                if not self._cabe_en_plazo(espera, plazo):
+                    logging.warning(
+                        f"Graph limitó la petición ({response.status_code} {metodo} {ruta}) "
+                        f"y no quedan {espera:.1f}s de plazo para reintentarla"
+                    )
+                    self._contar("errores")
+                    return response
+                self._contar("limitaciones")
+                logging.warning(
+                    f"Graph limitó la petición ({response.status_code} {metodo} {ruta}), "
+                    f"reintento {reintentos + 1}/{self.max_reintentos} en {espera:.1f}s"
+                )
+                time.sleep(espera)
+                reintentos += 1
+                continue
+            if response.status_code >= 400:
+                self._contar("errores")
+            return response
+
+    def _espera_reintento(self, response, reintentos: int) -> float:
+        """Segundos a esperar antes de reintentar: Retry-After si viene, si no 2^n (con tope)."""
+        cabeceras = response["headers"] if isinstance(response, dict) else response.headers
+        retry_after = cabeceras.get("Retry-After")
+        try:
+            espera = float(retry_after) if retry_after is not None else 2 ** reintentos
+        except ValueError:
+            espera = 2 ** reintentos
+        return min(max(espera, 0.0), self.espera_maxima)
+
+    @staticmethod
+    def _cabe_en_plazo(espera: float, plazo: float = None) -> bool:
+        """Indica si esperar `espera` segundos deja margen antes del `plazo` (sin plazo, siempre)."""
+        return plazo is None or time.monotonic() + espera < plazo
+
+    def get(self, ruta: str, **kwargs) -> requests.Response:
+        return self.peticion("GET", ruta, **kwargs)
+
+    def patch(self, ruta: str, **kwargs) -> requests.Response:
+        return self.peticion("PATCH", ruta, **kwargs)
+
+    def post(self, ruta: str, **kwargs) -> requests.Response:
+        return self.peticion("POST", ruta, **kwargs)
+
+    def descargar_concurrente(self, rutas: list, max_concurrencia: int = None) -> list:
+        """
+        Descarga varias rutas en paralelo con un máximo de `max_concurrencia` peticiones simultáneas.
+
+        Args:
+            rutas (list): Rutas o URLs a descargar (GET).
+            max_concurrencia (int): Límite de descargas simultáneas (por defecto, el tamaño del pool).
+
+        Returns:
+            list: Respuesta de cada ruta, en el mismo orden; None si la descarga lanzó una excepción.
+        """
+        if not rutas:
+            return []
+
+        def descargar(ruta):
+            try:
+                return self.get(ruta)
+            except requests.RequestException as e:
+                logging.error(f"Error descargando {ruta}: {e}")
+                return None
+
+        hilos = max(1, min(max_concurrencia or self.max_conexiones, len(rutas)))
+        with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="descarga-graph") as executor:
+            return list(executor.map(descargar, rutas))
+
+    def lote(self, peticiones: list) -> dict:
+        """
+        Envía peticiones agrupadas con JSON $batch (hasta 20 por petición HTTP).
+
+        Las subpeticiones limitadas por Graph (429/503/504) se reenvían en otro lote tras esperar
+        el Retry-After más largo, hasta `max_reintentos` veces. Estos reintentos y los de cada $batch
+        comparten un plazo de `tiempo_maximo_lote` segundos: si la siguiente espera no cabe, las que
+        siguen limitadas se devuelven con su estado y se cuentan como errores.
+
+        Args:
+            peticiones (list): Diccionarios con "id", "method", "url" (relativa a la versión, p. ej.
+                "/users/x/messages/y") y opcionalmente "body" y "headers".
+
+        Returns:
+            dict: {id: {"status": int, "body": ..., "headers": dict}} para cada petición.
+        """
+        resultados = {}
+        pendientes = list(peticiones)
+        reintentos = 0
+        plazo = time.monotonic() + self.tiempo_maximo_lote
+        while pendientes:
+            limitadas = []
+            for inicio in range(0, len(pendientes), self.MAX_PETICIONES_LOTE):
+                grupo = pendientes[inicio:inicio + self.MAX_PETICIONES_LOTE]
+                for respuesta in self._enviar_lote(grupo, plazo):
+                    resultados[respuesta["id"]] = respuesta
+                    if respuesta["status"] in self.CODIGOS_REINTENTO:
+                        limitadas.append(respuesta)
+            if not limitadas:
+                break
+            espera = max(self._espera_reintento(r, reintentos) for r in limitadas)
+            if reintentos >= self.max_reintentos or not self._cabe_en_plazo(espera, plazo):
+                self._contar("errores", len(limitadas))
+                break
+            self._contar("limitaciones")
+            logging.warning(
+                f"Graph limitó {len(limitadas)} peticiones del lote, "
+                f"reintento {reintentos + 1}/{self.max_reintentos} en {espera:.1f}s"
+            )
+            time.sleep(espera)
+            ids_limitados = {r["id"] for r in limitadas}
+            pendientes = [p for p in pendientes if p["id"] in ids_limitados]
+            reintentos += 1
+        return resultados
+
+    def _enviar_lote(self, grupo: list, plazo: float = None) -> list:
+        """Envía un único $batch y devuelve las subrespuestas (o un error por petición si falla entero)."""
+        response = self.post(
+            "$batch", json={"requests": grupo}, headers={"Content-Type": "application/json"}, plazo=plazo
+        )
+        if response.status_code == 200:
+            respuestas = response.json().get("responses", [])
+            recibidas = {str(r.get("id")) for r in respuestas}
+            # Una subpetición sin respuesta se considera fallida
+            faltan = [p for p in grupo if str(p["id"]) not in recibidas]
+            # Las limitadas no cuentan aquí: lote() las reintenta y solo cuenta las que siguen limitadas
+            fallidas = len(faltan) + sum(
+                1 for r in respuestas
+                if not 200 <= int(r.get("status", 0)) < 300 and int(r.get("status", 0)) not in self.CODIGOS_REINTENTO
+            )
+            if fallidas:
+                self._contar("errores", fallidas)
+            return [
+                {"id": str(r.get("id")), "status": int(r.get("status", 0)),
+                 "body": r.get("body"), "headers": r.get("headers") or {}}
+                for r in respuestas
+            ] + [{"id": str(p["id"]), "status": 0, "body": None, "headers": {}} for p in faltan]
+        logging.error(f"Error en la petición $batch: {response.status_code} - {response.text}")
+        return [
+            {"id": str(p["id"]), "status": response.status_code, "body": None, "headers": dict(response.headers)}
+            for p in grupo
+        ]
+
+    def conexiones_abiertas(self) -> int:
+        """Número total de conexiones TCP/TLS abiertas por el pool de la sesión."""
+        pools = self._adaptador.poolmanager.pools
+        return sum(pools[clave].num_connections for clave in pools.keys())
+
+    def estadisticas(self) -> dict:
+        return {
+            "tokens_obtenidos": self.tokens_obtenidos,
+            "conexiones_abiertas": self.conexiones_abiertas(),
+            "peticiones": self.peticiones,
+            "limitaciones": self.limitaciones,
+            "timeouts": self.timeouts,
+            "errores": self.errores,
+        }
@@ -0,0 +1,516 @@
+"""
+Simulador local de Microsoft Graph para probar el sondeo del buzón sin tocar el correo real.
+
+Sirve los endpoints que usa la aplicación (listado de no leídos, consultas delta, mensajes,
+adjuntos y su contenido, PATCH de isRead y JSON $batch) sobre un buzón en memoria, con latencia,
+limitación (429) y tamaño del backlog configurables. Los correos pueden ser sintéticos o una
+grabación de un día real (`grabar`), reproducida a la velocidad que se quiera:
+
+    python graph_simulado.py grabar --salida dia.jsonl --desde 2026-10-17T00:00:00Z
+    python graph_simulado.py servir --grabacion dia.jsonl --velocidad 10 --latencia-ms 80 --prob-429 0.02
+    python graph_simulado.py servir --correos 2000 --backlog 300 --velocidad 10
+
+y la aplicación se apunta al simulador con:
+
+    GRAPH_BASE_URL=http://127.0.0.1:8089/v1.0 GRAPH_TOKEN_FIJO=simulado INTERVALO_SONDEO=6 python modelo_prediccion.py
+
+GET /_simulador/estado devuelve cuántos correos han llegado, cuántos siguen sin leer y el retraso
+entre la llegada de cada correo y su marcado como leído (en segundos reales y del día simulado).
+"""
+import argparse
+import base64
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+
+# Campos de cada mensaje que se devuelven (el resto de claves internas empiezan por "_")
+CAMPOS_MENSAJE = ("id", "subject", "body", "isRead", "hasAttachments", "receivedDateTime")
+CAMPOS_ADJUNTO = ("id", "name", "contentType", "size")
+
+RUTA_DELTA = re.compile(r"^/users/[^/]+/mailFolders/[^/]+/messages/delta$")
+RUTA_LISTADO = re.compile(r"^/users/[^/]+/mailFolders/[^/]+/messages$")
+RUTA_MENSAJE = re.compile(r"^/users/[^/]+/messages/([^/]+)$")
+RUTA_ADJUNTOS = re.compile(r"^/users/[^/]+/messages/([^/]+)/attachments$")
+RUTA_CONTENIDO = re.compile(r"^/users/[^/]+/messages/([^/]+)/attachments/([^/]+)/\$value$")
+
+
+class BuzonSimulado:
+    """
+    Buzón en memoria con llegadas programadas.
+
+    Cada correo tiene un instante de llegada en segundos del día simulado; el reloj del simulador
+    avanza `velocidad` veces más rápido que el real, así que un día grabado con velocidad 10 se
+    reproduce en 2,4 horas. Cada llegada o cambio (marcar como leído) recibe un número de secuencia,
+    que es lo que usan los tokens de las consultas delta.
+    """
+
+    def __init__(self, correos: list, velocidad: float = 1.0):
+        self.velocidad = velocidad
+        self.inicio = time.monotonic()
+        self._lock = threading.Lock()
+        # Correos aún por llegar, ordenados por instante de llegada
+        self._por_llegar = sorted(correos, key=lambda correo: correo["_llegada"])
+        self.mensajes = {}
+        self.secuencia = 0
+        self.retrasos = []
+
+    def reloj(self) -> float:
+        """Segundos transcurridos del día simulado."""
+        return (time.monotonic() - self.inicio) * self.velocidad
+
+    def _actualizar_llegadas(self) -> None:
+        ahora = self.reloj()
+        while self._por_llegar and self._por_llegar[0]["_llegada"] <= ahora:
+            correo = self._por_llegar.pop(0)
+            self.secuencia += 1
+            correo["_secuencia"] = self.secuencia
+            correo["_llegada_real"] = time.monotonic()
+            self.mensajes[correo["id"]] = correo
+
+    def cambios(self, desde: int, hasta: int = None) -> tuple:
+        """Mensajes llegados o modificados con secuencia en (desde, hasta], y la secuencia actual."""
+        with self._lock:
+            self._actualizar_llegadas()
+            hasta = self.secuencia if hasta is None else hasta
+            mensajes = [m for m in self.mensajes.values() if desde < m["_secuencia"] <= hasta]
+        return sorted(mensajes, key=lambda m: m["_secuencia"]), hasta
+
+    def visibles(self) -> list:
+        with self._lock:
+            self._actualizar_llegadas()
+            return sorted(self.mensajes.values(), key=lambda m: m["_secuencia"])
+
+    def mensaje(self, correo_id: str):
+        with self._lock:
+            self._actualizar_llegadas()
+            return self.mensajes.get(correo_id)
+
+    def marcar_leido(self, correo_id: str, leido: bool) -> bool:
+        with self._lock:
+            mensaje = self.mensajes.get(correo_id)
+            if mensaje is None:
+                return False
+            if leido and not mensaje["isRead"]:
+                self.retrasos.append(time.monotonic() - mensaje["_llegada_real"])
+            if mensaje["isRead"] != leido:
+                mensaje["isRead"] = leido
+                self.secuencia += 1
+                mensaje["_secuencia"] = self.secuencia
+            return True
+
+    def estado(self) -> dict:
+        with self._lock:
+            self._actualizar_llegadas()
+            sin_leer = [m for m in self.mensajes.values() if not m["isRead"]]
+            retrasos = sorted(self.retrasos)
+            p99 = retrasos[int(len(retrasos) * 0.99) - 1] if retrasos else None
+            ahora = time.monotonic()
+            return {
+                "reloj_simulado_s": round(self.reloj(), 1),
+                "llegados": len(self.mensajes),
+                "por_llegar": len(self._por_llegar),
+                "sin_leer": len(sin_leer),
+                "sin_leer_mas_antiguo_s": round(max((ahora - m["_llegada_real"] for m in sin_leer), default=0), 2),
+                "leidos": len(retrasos),
+                "retraso_lectura_p50_s": round(statistics.median(retrasos), 2) if retrasos else None,
+                "retraso_lectura_p99_s": round(p99, 2) if retrasos else None,
+                "retraso_lectura_p99_simulado_s": round(p99 * self.velocidad, 1) if retrasos else None,
+            }
+
+
+class Limitador:
+    """Decide qué peticiones se responden con 429: cubo de fichas por segundo y/o una probabilidad fija."""
+
+    def __init__(self, por_segundo: float = 0, probabilidad: float = 0.0, retry_after: float = 1.0, semilla: int = 1):
+        self.por_segundo = por_segundo
+        self.probabilidad = probabilidad
+        self.retry_after = retry_after
+        self._rng = random.Random(semilla)
+        self._fichas = por_segundo
+        self._ultima = time.monotonic()
+        self._lock = threading.Lock()
+
+    def limitar(self) -> bool:
+        with self._lock:
+            if self.probabilidad and self._rng.random() < self.probabilidad:
+                return True
+            if not self.por_segundo:
+                return False
+            ahora = time.monotonic()
+            self._fichas = min(self.por_segundo, self._fichas + (ahora - self._ultima) * self.por_segundo)
+            self._ultima = ahora
+            if self._fichas < 1:
+                return True
+            self._fichas -= 1
+            return False
+
+
+class SimuladorGraph:
+    """Responde a las peticiones de Graph sobre un BuzonSimulado (las usa el servidor HTTP y $batch)."""
+
+    def __init__(self, buzon: BuzonSimulado, limitador: Limitador, latencia: float = 0.0, variacion: float = 0.0,
+                 tam_pagina: int = 100):
+        self.buzon = buzon
+        self.limitador = limitador
+        self.latencia = latencia
+        self.variacion = variacion
+        self.tam_pagina = tam_pagina
+        self.contadores = {"peticiones": 0, "subpeticiones": 0, "limitadas": 0, "bytes_adjuntos": 0}
+        self._lock = threading.Lock()
+
+    def _contar(self, contador: str, cantidad: int = 1) -> None:
+        with self._lock:
+            self.contadores[contador] += cantidad
+
+    def esperar(self) -> None:
+        if self.latencia or self.variacion:
+            time.sleep(self.latencia + random.uniform(0, self.variacion))
+
+    def responder(self, metodo: str, url: str, cuerpo, cabeceras: dict, base: str, subpeticion: bool = False):
+        """
+        Devuelve (estado, cuerpo, cabeceras); el cuerpo es un dict (JSON) o bytes.
+        """
+        self._contar("subpeticiones" if subpeticion else "peticiones")
+        partes = urlsplit(url)
+        ruta = unquote(partes.path)
+        if ruta.startswith("/v1.0/"):
+            ruta = ruta[len("/v1.0"):]
+        consulta = {clave: valores[-1] for clave, valores in parse_qs(partes.query).items()}
+
+        if ruta == "/_simulador/estado":
+            return 200, {**self.buzon.estado(), **self.contadores}, {}
+        if metodo == "POST" and ruta == "/$batch":
+            return 200, self._lote(cuerpo or {}, base), {}
+        if self.limitador.limitar():
+            self._contar("limitadas")
+            error = {"error": {"code": "TooManyRequests", "message": "Simulador: petición limitada"}}
+            return 429, error, {"Retry-After": str(self.limitador.retry_after)}
+
+        if metodo == "GET" and RUTA_DELTA.match(ruta):
+            return self._delta(ruta, consulta, cabeceras, base)
+        if metodo == "GET" and RUTA_LISTADO.match(ruta):
+            return self._listado(ruta, consulta, base)
+        coincidencia = RUTA_CONTENIDO.match(ruta)
+        if metodo == "GET" and coincidencia:
+            adjunto = self._adjunto(*coincidencia.groups())
+            if adjunto is None:
+                return 404, {"error": {"code": "ErrorItemNotFound"}}, {}
+            contenido = base64.b64decode(adjunto["contentBytes"])
+            self._contar("bytes_adjuntos", len(contenido))
+            return 200, contenido, {"Content-Type": adjunto.get("contentType") or "application/octet-stream"}
+        coincidencia = RUTA_ADJUNTOS.match(ruta)
+        if metodo == "GET" and coincidencia:
+            mensaje = self.buzon.mensaje(coincidencia.group(1))
+            if mensaje is None:
+                return 404, {"error": {"code": "ErrorItemNotFound"}}, {}
+            campos = consulta.get("$select")
+            adjuntos = [_filtrar(adjunto, campos.split(",") if campos else None) for adjunto in mensaje["_adjuntos"]]
+            return 200, {"value": adjuntos}, {}
+        coincidencia = RUTA_MENSAJE.match(ruta)
+        if coincidencia and metodo == "GET":
+            mensaje = self.buzon.mensaje(coincidencia.group(1))
+            if mensaje is None:
+                return 404, {"error": {"code": "ErrorItemNotFound"}}, {}
+            return 200, _publico(mensaje), {}
+        if coincidencia and metodo == "PATCH":
+            if "isRead" in (cuerpo or {}) and self.buzon.marcar_leido(coincidencia.group(1), bool(cuerpo["isRead"])):
+                return 200, _publico(self.buzon.mensaje(coincidencia.group(1))), {}
+            return 404, {"error": {"code": "ErrorItemNotFound"}}, {}
+        return 404, {"error": {"code": "NotImplemented", "message": f"{metodo} {ruta} no está simulado"}}, {}
+
+    def _adjunto(self, correo_id: str, adjunto_id: str):
+        mensaje = self.buzon.mensaje(correo_id)
+        if mensaje is None:
+            return None
+        return next((adjunto for adjunto in mensaje["_adjuntos"] if adjunto["id"] == adjunto_id), None)
+
+    def _delta(self, ruta: str, consulta: dict, cabeceras: dict, base: str):
+        preferencia = re.search(r"odata\.maxpagesize=(\d+)", cabeceras.get("Prefer", ""))
+        tam_pagina = int(preferencia.group(1)) if preferencia else self.tam_pagina
+        if "$skiptoken" in consulta:
+            desde, hasta, posicion = (int(valor) for valor in consulta["$skiptoken"].split("-"))
+            mensajes, _ = self.buzon.cambios(desde, hasta)
+        else:
+            desde, posicion = int(consulta.get("$deltatoken", 0)), 0
+            mensajes, hasta = self.buzon.cambios(desde)
+        pagina = mensajes[posicion:posicion + tam_pagina]
+        respuesta = {"value": [_publico(mensaje, consulta.get("$select")) for mensaje in pagina]}
+        if posicion + tam_pagina < len(mensajes):
+            skiptoken = f"{desde}-{hasta}-{posicion + tam_pagina}"
+            respuesta["@odata.nextLink"] = f"{base}{ruta}?{urlencode({'$skiptoken': skiptoken})}"
+        else:
+            respuesta["@odata.deltaLink"] = f"{base}{ruta}?{urlencode({'$deltatoken': hasta})}"
+        return 200, respuesta, {}
+
+    def _listado(self, ruta: str, consulta: dict, base: str):
+        filtro = consulta.get("$filter", "")
+        mensajes = self.buzon.visibles()
+        if "isRead eq false" in filtro:
+            mensajes = [mensaje for mensaje in mensajes if not mensaje["isRead"]]
+        if "hasAttachments eq true" in filtro:
+            mensajes = [mensaje for mensaje in mensajes if mensaje["hasAttachments"]]
+        top, salto = int(consulta.get("$top", 10)), int(consulta.get("$skip", 0))
+        pagina = mensajes[salto:salto + top]
+        expandir = "attachments" in consulta.get("$expand", "")
+        valores = []
+        for mensaje in pagina:
+            valor = _publico(mensaje, consulta.get("$select"))
+            if expandir:
+                valor["attachments"] = [_filtrar(adjunto, CAMPOS_ADJUNTO) for adjunto in mensaje["_adjuntos"]]
+            valores.append(valor)
+        respuesta = {"value": valores}
+        if salto + top < len(mensajes):
+            siguiente = {clave: valor for clave, valor in consulta.items() if clave != "$skip"}
+            siguiente["$skip"] = salto + top
+            respuesta["@odata.nextLink"] = f"{base}{ruta}?{urlencode(siguiente)}"
+        return 200, respuesta, {}
+
+    def _lote(self, cuerpo: dict, base: str) -> dict:
+        respuestas = []
+        for peticion in cuerpo.get("requests", [])[:20]:
+            estado, datos, cabeceras = self.responder(
+                peticion.get("method", "GET"), peticion.get("url", ""), peticion.get("body"),
+                peticion.get("headers") or {}, base, subpeticion=True,
+            )
+            if isinstance(datos, bytes):
+                datos = base64.b64encode(datos).decode("ascii")
+            respuestas.append({"id": peticion.get("id"), "status": estado, "headers": cabeceras, "body": datos})
+        return {"responses": respuestas}
+
+
+def _filtrar(datos: dict, campos) -> dict:
+    return {clave: valor for clave, valor in datos.items() if campos is None or clave in campos}
+
+
+def _publico(mensaje: dict, select: str = None) -> dict:
+    campos = select.split(",") if select else CAMPOS_MENSAJE
+    return {clave: mensaje[clave] for clave in campos if clave in mensaje and not clave.startswith("_")}
+
+
+def crear_manejador(simulador: SimuladorGraph):
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _atender(self, metodo: str) -> None:
+            longitud = int(self.headers.get("Content-Length") or 0)
+            cuerpo = json.loads(self.rfile.read(longitud)) if longitud else None
+            if not self.path.startswith("/_simulador/") and not self.headers.get("Authorization"):
+                return self._enviar(401, {"error": {"code": "InvalidAuthenticationToken"}}, {})
+            simulador.esperar()
+            prefijo = "/v1.0" if self.path.startswith("/v1.0/") else ""
+            base = f"http://{self.headers.get('Host')}{prefijo}"
+            estado, datos, cabeceras = simulador.responder(metodo, self.path, cuerpo, dict(self.headers), base)
+            self._enviar(estado, datos, cabeceras)
+
+        def _enviar(self, estado: int, datos, cabeceras: dict) -> None:
+            if isinstance(datos, bytes):
+                contenido = datos
+            else:
+                contenido = json.dumps(datos).encode("utf-8")
+                cabeceras = {"Content-Type": "application/json", **cabeceras}
+            self.send_response(estado)
+            for clave, valor in cabeceras.items():
+                self.send_header(clave, valor)
+            self.send_header("Content-Length", str(len(contenido)))
+            self.end_headers()
+            self.wfile.write(contenido)
+
+        def do_GET(self):
+            self._atender("GET")
+
+        def do_POST(self):
+            self._atender("POST")
+
+        def do_PATCH(self):
+            self._atender("PATCH")
+
+        def log_message(self, formato, *args):
+            logging.debug(f"[simulador] {self.address_string()} {formato % args}")
+
+    return Manejador
+
+
+def _correo(indice: int, llegada: float, cuerpo: str, audio: bytes, nombre_audio: str) -> dict:
+    correo_id = f"sim-{indice:07d}"
+    return {
+        "id": correo_id,
+        "subject": f"Pedido {indice}",
+        "body": {"contentType": "text", "content": cuerpo},
+        "isRead": False,
+        "hasAttachments": True,
+        "receivedDateTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + llegada)),
+        "_llegada": llegada,
+        "_adjuntos": [{
+            "id": f"adj-{indice:07d}",
+            "name": nombre_audio,
+            "contentType": "audio/mp4",
+            "size": len(audio),
+            "contentBytes": base64.b64encode(audio).decode("ascii"),
+        }],
+    }
+
+
+def correos_sinteticos(total: int, backlog: int = 0, duracion: float = 86400, items: int = 5,
+                       bytes_audio: int = 32 * 1024, semilla: int = 1, ruta_catalogo: str = None) -> list:
+    """
+    Genera `total` correos de pedido con un audio adjunto: los `backlog` primeros ya están en el
+    buzón al arrancar y el resto llegan repartidos al azar durante `duracion` segundos simulados.
+    """
+    from benchmark import generar_catalogo, generar_cuerpo_correo
+
+    rng = random.Random(semilla)
+    if ruta_catalogo and os.path.exists(ruta_catalogo):
+        import pandas as pd
+        descripciones = pd.read_csv(ruta_catalogo, usecols=["Description"])["Description"].dropna().tolist()
+    else:
+        descripciones = generar_catalogo(2000, semilla)["Description"].tolist()
+    llegadas = [0.0] * min(backlog, total) + sorted(rng.uniform(0, duracion) for _ in range(total - backlog))
+    correos = []
+    for indice, llegada in enumerate(llegadas):
+        orden = f"{rng.randint(1, 9999):04d}-{2026}"
+        nombre_audio = f"{orden}_{rng.randint(1, 200):03d}.mp4"
+        audio = rng.randbytes(bytes_audio)
+        correos.append(_correo(indice, llegada, generar_cuerpo_correo(descripciones, items, rng), audio, nombre_audio))
+    return correos
+
+
+def correos_grabados(ruta: str, backlog: int = 0) -> list:
+    """
+    Carga una grabación (`grabar`). Las llegadas conservan la separación original entre correos;
+    los `backlog` primeros se ponen en el buzón desde el principio.
+    """
+    correos = []
+    with open(ruta, "r", encoding="utf-8") as f:
+        for linea in f:
+            if linea.strip():
+                correos.append(json.loads(linea))
+    fechas = [datetime.fromisoformat(correo["receivedDateTime"].replace("Z", "+00:00")) for correo in correos]
+    primera = min(fechas) if fechas else None
+    for indice, (correo, fecha) in enumerate(sorted(zip(correos, fechas), key=lambda par: par[1])):
+        correo["isRead"] = False
+        correo["_adjuntos"] = correo.pop("attachments", [])
+        correo["hasAttachments"] = bool(correo["_adjuntos"])
+        correo["_llegada"] = 0.0 if indice < backlog else (fecha - primera).total_seconds()
+    return correos
+
+
+def grabar_buzon(cliente, usuario: str, ruta: str, carpeta: str = "Inbox", desde: str = None,
+                 maximo: int = None) -> int:
+    """
+    Guarda en JSONL los correos con adjuntos de una carpeta (con el contenido de los adjuntos), sin
+    modificar nada en el buzón. Cada línea es el mensaje de Graph con su lista "attachments".
+
+    Returns:
+        int: Número de correos grabados.
+    """
+    filtro = "hasAttachments eq true"
+    if desde:
+        filtro += f" and receivedDateTime ge {desde}"
+    ruta_graph = f"users/{usuario}/mailFolders/{carpeta}/messages"
+    params = {"$filter": filtro, "$select": ",".join(CAMPOS_MENSAJE), "$top": "50"}
+    grabados = 0
+    with open(ruta, "w", encoding="utf-8") as salida:
+        while ruta_graph and (maximo is None or grabados < maximo):
+            respuesta = cliente.get(ruta_graph, params=params)
+            if respuesta.status_code != 200:
+                raise Exception(f"Error al listar los correos: {respuesta.status_code} - {respuesta.text}")
+            datos = respuesta.json()
+            for mensaje in datos.get("value", []):
+                if maximo is not None and grabados >= maximo:
+                    break
+                adjuntos = cliente.get(f"users/{usuario}/messages/{mensaje['id']}/attachments")
+                if adjuntos.status_code != 200:
+                    logging.error(f"[simulador] No se pudieron grabar los adjuntos de {mensaje['id']}")
+                    continue
+                mensaje["attachments"] = [
+                    _filtrar(adjunto, CAMPOS_ADJUNTO + ("contentBytes",)) for adjunto in adjuntos.json().get("value", [])
+                ]
+                salida.write(json.dumps(mensaje, ensure_ascii=False) + "\n")
+                grabados += 1
+            ruta_graph, params = datos.get("@odata.nextLink"), None
+    logging.info(f"[simulador] {grabados} correos grabados en {ruta}")
+    return grabados
+
+
+def servir(simulador: SimuladorGraph, host: str, puerto: int, informe_cada: float = 0) -> ThreadingHTTPServer:
+    """Arranca el servidor en un hilo y lo devuelve (para pararlo, `shutdown()`)."""
+    servidor = ThreadingHTTPServer((host, puerto), crear_manejador(simulador))
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    logging.info(f"[simulador] Graph simulado en http://{host}:{servidor.server_address[1]}/v1.0")
+    if informe_cada:
+        def informar():
+            while True:
+                time.sleep(informe_cada)
+                logging.info(f"[simulador] {json.dumps({**simulador.buzon.estado(), **simulador.contadores})}")
+        threading.Thread(target=informar, daemon=True).start()
+    return servidor
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Simulador local de Microsoft Graph.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    parser_servir = subparsers.add_parser("servir", help="Servir un buzón sintético o grabado")
+    parser_servir.add_argument("--grabacion", help="JSONL generado con 'grabar' (si no, correos sintéticos)")
+    parser_servir.add_argument("--correos", type=int, default=1000, help="Correos sintéticos del día")
+    parser_servir.add_argument("--backlog", type=int, default=0, help="Correos ya en el buzón al arrancar")
+    parser_servir.add_argument("--duracion", type=float, default=86400, help="Segundos del día simulado")
+    parser_servir.add_argument("--velocidad", type=float, default=1.0, help="Veces más rápido que el tiempo real")
+    parser_servir.add_argument("--items", type=int, default=5, help="Productos por correo sintético")
+    parser_servir.add_argument("--bytes-audio", type=int, default=32 * 1024, help="Tamaño del audio sintético")
+    parser_servir.add_argument("--catalogo", help="CSV con una columna Description para los correos sintéticos")
+    parser_servir.add_argument("--latencia-ms", type=float, default=0, help="Latencia fija por petición")
+    parser_servir.add_argument("--variacion-ms", type=float, default=0, help="Latencia aleatoria añadida")
+    parser_servir.add_argument("--limite-por-segundo", type=float, default=0, help="Peticiones/s antes de responder 429")
+    parser_servir.add_argument("--prob-429", type=float, default=0.0, help="Probabilidad de responder 429")
+    parser_servir.add_argument("--retry-after", type=float, default=1.0, help="Segundos de Retry-After en los 429")
+    parser_servir.add_argument("--host", default="127.0.0.1")
+    parser_servir.add_argument("--puerto", type=int, default=8089)
+    parser_servir.add_argument("--informe-cada", type=float, default=30, help="Segundos entre informes de estado")
+    parser_servir.add_argument("--semilla", type=int, default=1)
+
+    parser_grabar = subparsers.add_parser("grabar", help="Grabar correos reales (solo lectura) a JSONL")
+    parser_grabar.add_argument("--salida", required=True)
+    parser_grabar.add_argument("--desde", help="Fecha ISO (UTC) del primer correo, p. ej. 2026-10-17T00:00:00Z")
+    parser_grabar.add_argument("--maximo", type=int)
+    parser_grabar.add_argument("--carpeta", default="Inbox")
+    args = parser.parse_args()
+
+    if args.comando == "grabar":
+        from dotenv import load_dotenv
+        from graph_cliente import ClienteGraph
+
+        load_dotenv()
+        cliente = ClienteGraph(
+            os.getenv("CLIENT_ID"), os.getenv("TENANT_ID"), os.getenv("CLIENT_SECRET"),
+            ["https://graph.microsoft.com/.default"],
+        )
+        grabar_buzon(cliente, os.getenv("USER_EMAIL"), args.salida, args.carpeta, args.desde, args.maximo)
+    else:
+        if args.grabacion:
+            correos = correos_grabados(args.grabacion, args.backlog)
+        else:
+            correos = correos_sinteticos(
+                args.correos, args.backlog, args.duracion, args.items, args.bytes_audio, args.semilla, args.catalogo
+            )
+        simulador = SimuladorGraph(
+            BuzonSimulado(correos, args.velocidad),
+            Limitador(args.limite_por_segundo, args.prob_429, args.retry_after, args.semilla),
+            latencia=args.latencia_ms / 1000, variacion=args.variacion_ms / 1000,
+        )
+        servir(simulador, args.host, args.puerto, args.informe_cada)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
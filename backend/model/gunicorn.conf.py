@@ -0,0 +1,21 @@
+# Configuración de gunicorn para los workers de API:  gunicorn -c gunicorn.conf.py wsgi:app
+# (desde backend/model). El proceso de ingesta se arranca aparte con ROL_PROCESO=ingesta.
+import os
+import subprocess
+import sys
+
+bind = os.getenv("BIND_API", "10.83.0.17:5000")
+workers = int(os.getenv("WORKERS_API", str(os.cpu_count() or 2)))
+worker_class = "gthread"
+threads = int(os.getenv("HILOS_WORKER_API", "4"))
+timeout = 120
+raw_env = ["ROL_PROCESO=api"]
+# Sin preload: cada worker importa la aplicación después del fork (SQLite y las sesiones HTTP no se
+# pueden compartir entre procesos); el snapshot mapeado en memoria se comparte igualmente.
+preload_app = False
+
+
+def on_starting(server):
+    # El snapshot se prepara una sola vez antes de arrancar los workers, para que no lo construyan a la vez
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, "modelo_prediccion.py", "--construir-snapshot"], cwd=directorio, check=True)
@@ -0,0 +1,149 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+# Campos de la predicción por los que se puede filtrar el historial (todos con índice)
+CAMPOS_FILTRO = ("correo_id", "IDWorkOrder", "codigo_prediccion")
+
+
+class HistorialPredicciones:
+    """
+    Historial de predicciones acotado en memoria y persistido en SQLite.
+
+    Las últimas `max_memoria` predicciones se guardan en un búfer circular para consultarlas sin ir
+    a disco; todas se guardan además en una base de datos SQLite con índices por correo_id,
+    IDWorkOrder y codigo_prediccion, de modo que la memoria no crece con el tiempo de ejecución.
+
+    Tampoco crece el disco: cada `extend` elimina en la misma transacción las predicciones más
+    antiguas que `retencion` segundos y, si quedan más de `max_filas`, las más antiguas hasta
+    dejar esas (0 desactiva cada límite).
+    """
+
+    def __init__(self, ruta_db: str, max_memoria: int = 1000, retencion: int = 90 * 86400,
+                 max_filas: int = 1_000_000):
+        self.ruta_db = ruta_db
+        self.retencion = retencion
+        self.max_filas = max_filas
+        self.recientes = deque(maxlen=max_memoria)
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta_db, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS predicciones (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fecha REAL NOT NULL,
+                correo_id TEXT,
+                IDWorkOrder TEXT,
+                codigo_prediccion TEXT,
+                datos TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_predicciones_correo ON predicciones (correo_id);
+            CREATE INDEX IF NOT EXISTS idx_predicciones_orden ON predicciones (IDWorkOrder);
+            CREATE INDEX IF NOT EXISTS idx_predicciones_codigo ON predicciones (codigo_prediccion);
+            CREATE INDEX IF NOT EXISTS idx_predicciones_fecha ON predicciones (fecha);
+            """
+        )
+        self._conexion.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conexion.execute("SELECT COUNT(*) FROM predicciones").fetchone()[0]
+
+    def extend(self, predicciones: list) -> None:
+        """Añade las predicciones de un sondeo y purga las que sobran (una sola transacción)."""
+        if not predicciones:
+            return
+        fecha = time.time()
+        filas = [
+            (
+                fecha,
+                _texto(prediccion.get("correo_id")),
+                _texto(prediccion.get("IDWorkOrder")),
+                _texto(prediccion.get("codigo_prediccion")),
+                json.dumps(prediccion, ensure_ascii=False, default=str),
+            )
+            for prediccion in predicciones
+        ]
+        with self._lock:
+            with self._conexion:
+                self._conexion.executemany(
+                    "INSERT INTO predicciones (fecha, correo_id, IDWorkOrder, codigo_prediccion, datos) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    filas,
+                )
+                eliminadas = self._purgar(fecha)
+            self.recientes.extend(predicciones)
+        if eliminadas:
+            logging.info("[historial] %d predicciones antiguas eliminadas", eliminadas)
+
+    def purgar(self) -> int:
+        """Elimina las predicciones fuera de la retención o del máximo de filas; devuelve cuántas."""
+        with self._lock:
+            with self._conexion:
+                return self._purgar(time.time())
+
+    def _purgar(self, ahora: float) -> int:
+        eliminadas = 0
+        if self.retencion:
+            eliminadas += self._conexion.execute(
+                "DELETE FROM predicciones WHERE fecha < ?", (ahora - self.retencion,)
+            ).rowcount
+        if self.max_filas:
+            # Los id crecen con cada inserción: se conservan los `max_filas` más altos
+            eliminadas += self._conexion.execute(
+                "DELETE FROM predicciones WHERE id <= "
+                "(SELECT id FROM predicciones ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (self.max_filas,),
+            ).rowcount
+        return eliminadas
+
+    def ultimas(self, n: int = None) -> list:
+        """Devuelve (desde memoria) las últimas `n` predicciones, de la más antigua a la más reciente."""
+        with self._lock:
+            recientes = list(self.recientes)
+        return recientes if n is None else recientes[-n:]
+
+    def consultar(self, offset: int = 0, limit: int = 50, **filtros) -> dict:
+        """
+        Devuelve una página del historial, de la predicción más reciente a la más antigua.
+
+        Args:
+            offset (int): Primera fila (tras aplicar los filtros).
+            limit (int): Número máximo de filas.
+            **filtros: Valores exactos de correo_id, IDWorkOrder y/o codigo_prediccion.
+
+        Returns:
+            dict: {"data": [...], "total": int, "offset": int, "limit": int}.
+        """
+        if offset < 0 or limit < 0:
+            raise ValueError("offset y limit no pueden ser negativos")
+        desconocidos = set(filtros) - set(CAMPOS_FILTRO)
+        if desconocidos:
+            raise ValueError(f"Filtros no admitidos: {', '.join(sorted(desconocidos))}")
+        condiciones = [(campo, _texto(valor)) for campo, valor in filtros.items() if valor not in (None, "")]
+        where = " AND ".join(f"{campo} = ?" for campo, _ in condiciones)
+        where = f"WHERE {where}" if where else ""
+        valores = [valor for _, valor in condiciones]
+        with self._lock:
+            total = self._conexion.execute(f"SELECT COUNT(*) FROM predicciones {where}", valores).fetchone()[0]
+            filas = self._conexion.execute(
+                f"SELECT id, fecha, datos FROM predicciones {where} ORDER BY id DESC LIMIT ? OFFSET ?",
+                valores + [limit, offset],
+            ).fetchall()
+        datos = [{"id": id_fila, "fecha": fecha, **json.loads(texto)} for id_fila, fecha, texto in filas]
+        return {"data": datos, "total": total, "offset": offset, "limit": limit}
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._conexion.close()
+
+
+def _texto(valor):
+    """Los códigos y órdenes se guardan como texto para que el filtro no dependa del tipo."""
+    return None if valor is None else str(valor)
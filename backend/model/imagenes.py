@@ -0,0 +1,121 @@
+import ast
+import base64
+import binascii
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+
+import pandas as pd
+
+
+# Firmas de los formatos de imagen más habituales en STKArticle.Image
+_FIRMAS_MIMETYPE = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+def decodificar_imagen(valor):
+    """
+    Convierte el valor de la columna Image en los bytes de la imagen.
+
+    La columna puede contener un literal de bytes de Python serializado como texto ("b'...'"),
+    una cadena ya en base64 o directamente bytes.
+
+    Args:
+        valor: Valor de la columna Image.
+
+    Returns:
+        bytes | None: Bytes de la imagen, o None si no hay imagen o no se puede decodificar.
+    """
+    if valor is None or (not isinstance(valor, (bytes, bytearray)) and pd.isna(valor)):
+        return None
+    if isinstance(valor, (bytes, bytearray)):
+        return bytes(valor) or None
+    if not isinstance(valor, str) or not valor:
+        return None
+    try:
+        if valor.startswith(("b'", 'b"')):
+            return ast.literal_eval(valor) or None
+        return base64.b64decode(valor, validate=True) or None
+    except (ValueError, SyntaxError, binascii.Error) as e:
+        logging.error(f"[imagenes] Error al decodificar imagen: {e}")
+        return None
+
+
+def detectar_mimetype(contenido: bytes) -> str:
+    """Deduce el tipo MIME a partir de la cabecera de la imagen (por defecto JPEG)."""
+    if contenido[:4] == b"RIFF" and contenido[8:12] == b"WEBP":
+        return "image/webp"
+    for firma, mimetype in _FIRMAS_MIMETYPE:
+        if contenido.startswith(firma):
+            return mimetype
+    return "image/jpeg"
+
+
+def url_imagen(codigo, registro) -> str:
+    """Devuelve la URL de /api/imagen para el artículo, o "" si no tiene imagen."""
+    if registro is None:
+        return ""
+    valor = registro.get("Image")
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)) or valor == "":
+        return ""
+    return f"/api/imagen/{quote(str(codigo), safe='')}"
+
+
+class CacheImagenes:
+    """
+    Caché LRU de imágenes ya decodificadas, indexadas por CodArticle y acotada en bytes.
+
+    Cada entrada guarda (contenido, mimetype, etag), de modo que la imagen solo se decodifica la
+    primera vez que se pide y las siguientes peticiones se responden directamente desde memoria.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes_actuales = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.bytes_actuales = 0
+
+    def obtener(self, codigo, valor):
+        """
+        Devuelve la imagen decodificada del artículo, decodificándola y guardándola si no estaba.
+
+        Args:
+            codigo: CodArticle del artículo.
+            valor: Valor crudo de la columna Image (solo se usa si la imagen no está en caché).
+
+        Returns:
+            tuple | None: (contenido, mimetype, etag) o None si el artículo no tiene imagen.
+        """
+        with self._lock:
+            entrada = self._entradas.get(codigo)
+            if entrada is not None:
+                self._entradas.move_to_end(codigo)
+                return entrada
+
+        contenido = decodificar_imagen(valor)
+        if contenido is None:
+            return None
+        entrada = (contenido, detectar_mimetype(contenido), hashlib.sha1(contenido).hexdigest())
+
+        with self._lock:
+            if codigo not in self._entradas and len(contenido) <= self.max_bytes:
+                self._entradas[codigo] = entrada
+                self.bytes_actuales += len(contenido)
+                while self.bytes_actuales > self.max_bytes:
+                    _, (antiguo, _, _) = self._entradas.popitem(last=False)
+                    self.bytes_actuales -= len(antiguo)
+        return entrada
@@ -0,0 +1,192 @@
+"""
+Métricas del proceso en formato de texto de Prometheus (sin dependencias): contadores, indicadores
+e histogramas con etiquetas, y un registro que los exporta para /api/metrics.
+
+Cada proceso tiene su propio registro; en el despliegue multiproceso Prometheus debe consultar al
+proceso de ingesta y a cada worker de API por separado.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites (en segundos) de los histogramas de latencia: de 1 ms a 2 minutos
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _etiquetas(nombres: tuple, valores: tuple, extra: str = "") -> str:
+    partes = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _clave(self, etiquetas: dict) -> tuple:
+        return tuple(str(etiquetas.get(nombre, "")) for nombre in self.etiquetas)
+
+    def exportar(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for clave, valor in valores:
+            lineas.extend(self._lineas(clave, valor))
+        return lineas
+
+    def _lineas(self, clave: tuple, valor) -> list:
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}"]
+
+
+class Contador(_Metrica):
+    """Valor que solo crece (se exporta con el sufijo _total)."""
+
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = (), funcion=None):
+        super().__init__(nombre, ayuda, etiquetas)
+        # Si se indica, el valor se lee al exportar (para contadores que ya lleva otro objeto)
+        self.funcion = funcion
+        if not self.etiquetas:
+            self._valores[()] = 0
+
+    def inc(self, cantidad: float = 1, **etiquetas) -> None:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def exportar(self) -> list:
+        if self.funcion is not None:
+            with self._lock:
+                self._valores = {(): self.funcion()}
+        return super().exportar()
+
+    def _lineas(self, clave: tuple, valor) -> list:
+        return [f"{self.nombre}_total{_etiquetas(self.etiquetas, clave)} {_numero(valor)}"]
+
+
+class Indicador(_Metrica):
+    """Valor que sube y baja; con `funcion` se calcula en el momento de exportar."""
+
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = (), funcion=None):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+        if not self.etiquetas:
+            self._valores[()] = 0
+
+    def fijar(self, valor: float, **etiquetas) -> None:
+        with self._lock:
+            self._valores[self._clave(etiquetas)] = valor
+
+    def exportar(self) -> list:
+        if self.funcion is not None:
+            valor = self.funcion()
+            with self._lock:
+                self._valores = {} if valor is None else {(): valor}
+        return super().exportar()
+
+
+class Histograma(_Metrica):
+    """Distribución de valores (latencias) en intervalos acumulados, con su suma y su número."""
+
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = (), limites: tuple = LIMITES_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.limites = tuple(sorted(limites))
+        if not self.etiquetas:
+            self._valores[()] = self._vacio()
+
+    def _vacio(self) -> list:
+        # Un contador por límite más el de +Inf, la suma y el número de observaciones
+        return [[0] * (len(self.limites) + 1), 0.0, 0]
+
+    def observar(self, valor: float, **etiquetas) -> None:
+        clave = self._clave(etiquetas)
+        with self._lock:
+            cubos = self._valores.get(clave)
+            if cubos is None:
+                cubos = self._valores[clave] = self._vacio()
+            cubos[0][bisect.bisect_left(self.limites, valor)] += 1
+            cubos[1] += valor
+            cubos[2] += 1
+
+    @contextmanager
+    def medir(self, **etiquetas):
+        """Observa lo que tarda el bloque `with` (también si lanza una excepción)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **etiquetas)
+
+    def exportar(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        with self._lock:
+            valores = sorted((clave, ([*cubos[0]], cubos[1], cubos[2])) for clave, cubos in self._valores.items())
+        for clave, (cubos, suma, numero) in valores:
+            acumulado = 0
+            for limite, cantidad in zip(self.limites + (float("inf"),), cubos):
+                acumulado += cantidad
+                etiquetas = _etiquetas(self.etiquetas, clave, f'le="{_numero(float(limite))}"')
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {numero}")
+        return lineas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas de un proceso, exportable en formato de texto de Prometheus."""
+
+    TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metricas = []
+
+    def _registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: tuple = (), funcion=None) -> Contador:
+        return self._registrar(Contador(nombre, ayuda, etiquetas, funcion))
+
+    def indicador(self, nombre: str, ayuda: str, etiquetas: tuple = (), funcion=None) -> Indicador:
+        return self._registrar(Indicador(nombre, ayuda, etiquetas, funcion))
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: tuple = (), limites: tuple = LIMITES_LATENCIA) -> Histograma:
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, limites))
+
+    def exportar(self) -> str:
+        lineas = []
+        for metrica in self._metricas:
+            lineas.extend(metrica.exportar())
+        return "\n".join(lineas) + "\n"
+
+
+def memoria_proceso():
+    """Memoria residente (RSS) del proceso en bytes, o None si no se puede obtener."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return None
@@ -1,42 +1,58 @@
 import os
 import re
+import sys
 import time
 import json
+import hmac
 import shutil
-import base64
 import threading
-from threading import Lock
+from contextlib import nullcontext
 
+import requests
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 
-import ast  
 
-# Importar librerias de peticiones HTTP
-import requests
-from msal import ConfidentialClientApplication
+# Cliente de Microsoft Graph (peticiones HTTP)
+from graph_cliente import ClienteGraph
+from buzon import SincronizadorBuzon
 
-from flask import Flask, jsonify, request, send_file, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_file, send_from_directory
 from flask_cors import CORS
 
 # Importar librerías de procesamiento de texto
-import joblib
 import pandas as pd
 
-# Importtar librerias de comparación de texto
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import difflib
-import unicodedata
+from buscador import MotorBusqueda
+from catalogo import indexar_por_codigo, buscar_codigo, CatalogoIncremental, CatalogoPaginado
+from imagenes import CacheImagenes, url_imagen, decodificar_imagen
+from spool import SpoolAudio
+from similitud import ModeloSimilitud
+from normalizacion import procesar_texto
+from diario import DiarioConfirmaciones
+from historial import HistorialPredicciones
+from snapshot import SnapshotCatalogo
+from compartido import BasePublicada, PrediccionesPublicadas
+from estado import EstadoModelo
+from metricas import RegistroMetricas, memoria_proceso
+from perfilado import Perfilador
+from registro import configurar_registro, descartados, registro_items
 
 # Libreria para el manejo de logs
 import logging
 
-# Configuración básica del logging
-logging.basicConfig(level=logging.INFO)
-
 
 load_dotenv()
+
+# Logging asíncrono (cola + hilo escritor). NIVEL_REGISTRO=DEBUG activa los mensajes por producto y
+# por correo, limitados a MAX_REGISTROS_ITEM_POR_SEGUNDO por tipo de mensaje; FORMATO_REGISTRO=json
+# escribe un objeto JSON por línea
+configurar_registro(
+    nivel=os.getenv("NIVEL_REGISTRO", "INFO"),
+    formato=os.getenv("FORMATO_REGISTRO", "texto"),
+    max_items_por_segundo=float(os.getenv("MAX_REGISTROS_ITEM_POR_SEGUNDO", "5")),
+    ruta=os.getenv("RUTA_REGISTRO"),
+)
 CLIENT_ID = os.getenv("CLIENT_ID")
 TENANT_ID = os.getenv("TENANT_ID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET")
@@ -45,129 +61,246 @@ USER_EMAIL = os.getenv("USER_EMAIL")  # Correo electrónico de la bandeja de ent
 
 # Configuración de permisos para el token de acceso
 SCOPES = ["https://graph.microsoft.com/.default"] 
+# URL base de Graph; se puede apuntar al simulador local (graph_simulado.py), que acepta cualquier
+# token fijo (GRAPH_TOKEN_FIJO) en lugar de pedirlo a Azure AD
+GRAPH_BASE_URL = os.getenv("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")
+GRAPH_TOKEN_FIJO = os.getenv("GRAPH_TOKEN_FIJO")
+# Segundos máximos para conectar con Graph y entre bytes de una respuesta; al agotarse se reintenta
+TIMEOUT_CONEXION_GRAPH = float(os.getenv("TIMEOUT_CONEXION_GRAPH", "10"))
+TIMEOUT_LECTURA_GRAPH = float(os.getenv("TIMEOUT_LECTURA_GRAPH", "60"))
+# Segundos máximos que una llamada en lote ($batch) a Graph puede pasar esperando reintentos, en total
+TIEMPO_MAXIMO_LOTE_GRAPH = float(os.getenv("TIEMPO_MAXIMO_LOTE_GRAPH", "300"))
 
 
 # Definir rutas de archivos y carpetas (he usado os.path.join para que sea compatible con Windows y Linux)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-RUTA_CSV_CLEAN = os.path.join(BASE_DIR, "consulta_resultado_clean.csv")
-RUTA_CSV = os.path.join(BASE_DIR, "consulta_resultado.csv")
-RUTA_DESC_CONFIRMADAS_PKL = os.path.join(BASE_DIR, "descripciones_confirmadas.joblib")
-RUTA_DESC_CONFIRMADAS_JSON = os.path.join(BASE_DIR, "descripciones_confirmadas.json")
+# Directorio de los datos (catálogo, snapshots, diario, spool...); por defecto, el del código
+DIRECTORIO_DATOS = os.getenv("DIRECTORIO_DATOS", BASE_DIR)
+RUTA_CSV_CLEAN = os.path.join(DIRECTORIO_DATOS, "consulta_resultado_clean.csv")
+RUTA_CSV = os.path.join(DIRECTORIO_DATOS, "consulta_resultado.csv")
+# Extracción por bloques de conexion.extraer_articulos (imágenes en binario); si existe se usa en lugar del CSV
+RUTA_PARQUET = os.path.join(DIRECTORIO_DATOS, "consulta_resultado.parquet")
+RUTA_DESC_CONFIRMADAS_PKL = os.path.join(DIRECTORIO_DATOS, "descripciones_confirmadas.joblib")
+RUTA_DESC_CONFIRMADAS_JSON = os.path.join(DIRECTORIO_DATOS, "descripciones_confirmadas.json")
+RUTA_DESC_CONFIRMADAS_DIARIO = os.path.join(DIRECTORIO_DATOS, "descripciones_confirmadas.diario.jsonl")
+RUTA_SNAPSHOT = os.path.join(DIRECTORIO_DATOS, "catalogo.snapshot")
+RUTA_ESTADO_BUZON = os.path.join(DIRECTORIO_DATOS, "estado_buzon.json")
+RUTA_SPOOL_AUDIO = os.path.join(DIRECTORIO_DATOS, "spool_audio")
+RUTA_HISTORIAL = os.path.join(DIRECTORIO_DATOS, "historial_predicciones.sqlite3")
+RUTA_PREDICCIONES_PUBLICADAS = os.path.join(DIRECTORIO_DATOS, "predicciones_recientes.json")
+# Base del modelo que el proceso de ingesta publica tras fusionar el delta (la cargan los workers de API)
+RUTA_BASE_PUBLICADA = os.path.join(DIRECTORIO_DATOS, "catalogo.fusionado.snapshot")
+RUTA_PERFILES = os.path.join(DIRECTORIO_DATOS, "perfiles")
 RUTA_BACKUP = os.path.join(BASE_DIR, "../backups")  
 
+# Modo del motor de búsqueda: "indice" (por defecto), "difflib" (búsqueda completa original)
+# o "verificar" (compara el índice con difflib y registra las discrepancias)
+MODO_BUSQUEDA = os.getenv("MODO_BUSQUEDA", "indice")
+MAX_CANDIDATOS = int(os.getenv("MAX_CANDIDATOS", "300"))
+# Número de correcciones acumuladas en el segmento delta a partir del cual se fusionan con la base
+UMBRAL_FUSION_DELTA = int(os.getenv("UMBRAL_FUSION_DELTA", "200"))
+# Número de confirmaciones en el diario a partir del cual se compacta en el snapshot
+UMBRAL_COMPACTACION_DIARIO = int(os.getenv("UMBRAL_COMPACTACION_DIARIO", "1000"))
+# Número máximo de adjuntos que se descargan de Graph a la vez en cada sondeo
+MAX_DESCARGAS_CONCURRENTES = int(os.getenv("MAX_DESCARGAS_CONCURRENTES", "8"))
+# Sincronización del buzón: "delta" (incremental con consultas delta de Graph, por defecto)
+# o "consulta" (filtra los no leídos en cada sondeo, recorriendo todas las páginas)
+MODO_SINCRONIZACION = os.getenv("MODO_SINCRONIZACION", "delta")
+# Segundos entre sondeos del buzón
+INTERVALO_SONDEO = float(os.getenv("INTERVALO_SONDEO", "60"))
+
+# Imágenes de artículos: tamaño máximo de la caché de imágenes decodificadas y tiempo de caché en el navegador
+MAX_BYTES_CACHE_IMAGENES = int(os.getenv("MAX_BYTES_CACHE_IMAGENES", str(64 * 1024 * 1024)))
+MAX_AGE_IMAGENES = int(os.getenv("MAX_AGE_IMAGENES", "86400"))
+
+# Spool de audios en disco: tamaño máximo y tiempo que se conserva cada audio (en segundos)
+MAX_BYTES_SPOOL_AUDIO = int(os.getenv("MAX_BYTES_SPOOL_AUDIO", str(2 * 1024 * 1024 * 1024)))
+RETENCION_SPOOL_AUDIO = int(os.getenv("RETENCION_SPOOL_AUDIO", str(30 * 86400)))
+# Número de predicciones del historial que se mantienen en memoria (el resto solo en SQLite)
+MAX_HISTORIAL_MEMORIA = int(os.getenv("MAX_HISTORIAL_MEMORIA", "1000"))
+# Retención del historial en SQLite: antigüedad máxima (segundos) y número máximo de predicciones (0 = sin límite)
+RETENCION_HISTORIAL = int(os.getenv("RETENCION_HISTORIAL", str(90 * 86400)))
+MAX_FILAS_HISTORIAL = int(os.getenv("MAX_FILAS_HISTORIAL", "1000000"))
+
+# Perfilado bajo demanda (también se cambia en caliente con POST /api/admin/perfilado): ciclos de sondeo
+# a perfilar desde el arranque, umbral en segundos de las peticiones lentas (0 = desactivado) y
+# número de perfiles que se conservan en RUTA_PERFILES
+PERFILAR_CICLOS = int(os.getenv("PERFILAR_CICLOS", "0"))
+UMBRAL_PERFIL_PETICION = float(os.getenv("UMBRAL_PERFIL_PETICION", "0"))
+MAX_ARCHIVOS_PERFIL = int(os.getenv("MAX_ARCHIVOS_PERFIL", "50"))
+# Token de los endpoints /api/admin (cabecera X-Token-Admin); sin él quedan deshabilitados
+TOKEN_ADMIN = os.getenv("TOKEN_ADMIN")
+
+# Despliegue: "completo" (un único proceso que sondea el buzón y sirve la API, por defecto),
+# "ingesta" (el único proceso que sondea Graph y aplica las correcciones) o "api" (workers sin estado
+# detrás de gunicorn que sirven desde el snapshot mapeado en memoria; ver gunicorn.conf.py)
+ROL_PROCESO = os.getenv("ROL_PROCESO", "completo")
+PUERTO_INGESTA = int(os.getenv("PUERTO_INGESTA", "5001"))
+URL_INGESTA = os.getenv("URL_INGESTA", f"http://127.0.0.1:{PUERTO_INGESTA}")
+# Cada cuántos segundos, como mucho, un worker de API comprueba si hay correcciones o predicciones nuevas
+INTERVALO_SINCRONIZACION_API = float(os.getenv("INTERVALO_SINCRONIZACION_API", "1"))
+
 
 # Definir un lock global para el procesamiento de correos
 procesamiento_lock = threading.Lock()
+# Serializa las escrituras sobre el modelo (correcciones y fusión del delta); las lecturas no lo usan
+escritura_modelo_lock = threading.Lock()
+fusion_lock = threading.Lock()
+
+
+
+# Cliente compartido de Microsoft Graph (token en caché y conexiones keep-alive)
+cliente_graph = ClienteGraph(
+    CLIENT_ID, TENANT_ID, CLIENT_SECRET, SCOPES, base_url=GRAPH_BASE_URL,
+    max_conexiones=max(10, MAX_DESCARGAS_CONCURRENTES), token_fijo=GRAPH_TOKEN_FIJO,
+    timeout=(TIMEOUT_CONEXION_GRAPH, TIMEOUT_LECTURA_GRAPH), tiempo_maximo_lote=TIEMPO_MAXIMO_LOTE_GRAPH,
+)
+
+
+# Métricas del proceso, exportadas en GET /api/metrics (formato de texto de Prometheus)
+metricas = RegistroMetricas()
+metrica_etapas_sondeo = metricas.histograma(
+    "pedidos_etapa_sondeo_segundos", "Duración de cada etapa de un ciclo de sondeo del buzón", ("etapa",)
+)
+metrica_ciclo_sondeo = metricas.histograma("pedidos_ciclo_sondeo_segundos", "Duración de un ciclo completo de sondeo")
+metrica_correos = metricas.contador("pedidos_correos_procesados", "Correos procesados")
+metrica_items = metricas.contador("pedidos_items_extraidos", "Productos extraídos de los correos")
+metrica_sin_coincidencia = metricas.contador("pedidos_items_sin_coincidencia", "Productos sin artículo predicho")
+metrica_errores_sondeo = metricas.contador("pedidos_errores_sondeo", "Ciclos de sondeo terminados con error")
+metricas.contador("pedidos_graph_peticiones", "Peticiones HTTP a Graph", funcion=lambda: cliente_graph.peticiones)
+metricas.contador(
+    "pedidos_graph_limitaciones", "Respuestas de Graph con 429/503/504", funcion=lambda: cliente_graph.limitaciones
+)
+metricas.contador(
+    "pedidos_graph_timeouts", "Peticiones a Graph que agotaron el tiempo de conexión o de lectura",
+    funcion=lambda: cliente_graph.timeouts,
+)
+metricas.contador(
+    "pedidos_graph_errores", "Peticiones o subpeticiones a Graph fallidas tras los reintentos",
+    funcion=lambda: cliente_graph.errores,
+)
+metricas.contador("pedidos_graph_tokens", "Tokens obtenidos de Azure AD", funcion=lambda: cliente_graph.tokens_obtenidos)
+metrica_backlog = metricas.indicador("pedidos_backlog_correos", "Correos pendientes encontrados en el último sondeo")
+metricas.indicador(
+    "pedidos_predicciones_recientes", "Predicciones del último sondeo en memoria", funcion=lambda: len(predicciones_recientes)
+)
+metricas.indicador(
+    "pedidos_historial_memoria", "Predicciones del historial en memoria",
+    funcion=lambda: len(historial_predicciones.recientes),
+)
+metricas.indicador("pedidos_memoria_proceso_bytes", "Memoria residente (RSS) del proceso", funcion=memoria_proceso)
+metricas.contador(
+    "pedidos_registros_descartados", "Mensajes de log descartados por tener la cola llena", funcion=descartados
+)
+metrica_peticiones_http = metricas.histograma(
+    "pedidos_peticion_http_segundos", "Latencia de las rutas de la API", ("endpoint", "metodo")
+)
+metrica_respuestas_http = metricas.contador(
+    "pedidos_respuestas_http", "Respuestas de la API por código de estado", ("endpoint", "metodo", "codigo")
+)
+
+perfilador = Perfilador(
+    RUTA_PERFILES, max_archivos=MAX_ARCHIVOS_PERFIL, ciclos=PERFILAR_CICLOS, umbral_peticion=UMBRAL_PERFIL_PETICION
+)
+
+
+sincronizador_buzon = SincronizadorBuzon(cliente_graph, USER_EMAIL, RUTA_ESTADO_BUZON)
+# Los audios se guardan una vez en disco; las predicciones solo llevan su referencia
+# Solo el proceso de ingesta escribe en el spool; los workers de API lo leen
+spool_audio = SpoolAudio(
+    RUTA_SPOOL_AUDIO, max_bytes=MAX_BYTES_SPOOL_AUDIO, retencion=RETENCION_SPOOL_AUDIO,
+    solo_lectura=ROL_PROCESO == "api",
+)
 
 
-STOP_WORDS = [
-    "a", "acá", "ahí", "ajena", "ajenas", "ajeno", "ajenos", "al", "algo", "algún",
-    "alguna", "algunas", "alguno", "algunos", "allá", "alli", "allí", "ambos", "ampleamos",
-    "ante", "antes", "aquel", "aquella", "aquellas", "aquello", "aquellos", "aqui", "aquí",
-    "arriba", "asi", "atras", "aun", "aunque", "bajo", "bastante", "bien", "cabe", "cada",
-    "casi", "cierta", "ciertas", "cierto", "ciertos", "como", "cómo", "con", "conmigo",
-    "conseguimos", "conseguir", "consigo", "consigue", "consiguen", "consigues", "contigo",
-    "contra", "cual", "cuales", "cualquier", "cualquiera", "cualquieras", "cuan", "cuando",
-    "cuanta", "cuantas", "cuanto", "cuantos", "de", "dejar", "del", "demas", "demasiada",
-    "demasiadas", "demasiado", "demasiados", "dentro", "desde", "donde", "dos", "el", "él",
-    "ella", "ellas", "ello", "ellos", "empleais", "emplean", "emplear", "empleas", "empleo",
-    "en", "encima", "entonces", "entre", "era", "eramos", "eran", "eras", "eres", "es",
-    "esa", "esas", "ese", "eso", "esos", "esta", "estaba", "estado", "estais", "estamos",
-    "estan", "estoy", "fin", "fue", "fueron", "fui", "fuimos", "gueno", "ha", "hace",
-    "haceis", "hacemos", "hacen", "hacer", "haces", "hago", "incluso", "intenta", "intentais",
-    "intentamos", "intentan", "intentar", "intentas", "intento", "ir", "jamás", "junto",
-    "juntos", "la", "largo", "las", "lo", "los", "mientras", "mio", "misma", "mismas",
-    "mismo", "mismos", "modo", "mucha", "muchas", "muchísima", "muchísimas", "muchísimo",
-    "muchísimos", "mucho", "muchos", "muy", "nada", "ni", "ninguna", "ningunas", "ninguno",
-    "ningunos", "no", "nos", "nosotras", "nosotros", "nuestra", "nuestras", "nuestro",
-    "nuestros", "nunca", "os", "otra", "otras", "otro", "otros", "para", "parecer", "pero",
-    "poca", "pocas", "poco", "pocos", "podeis", "podemos", "poder", "podria", "podriais",
-    "podriamos", "podrian", "podrias", "por", "por qué", "porque", "primero", "puede",
-    "pueden", "puedo", "pues", "que", "qué", "querer", "quien", "quién", "quienes", "quienesquiera",
-    "quienquiera", "quiza", "quizas", "sabe", "sabeis", "sabemos", "saben", "saber", "sabes",
-    "se", "segun", "ser", "si", "sí", "siempre", "siendo", "sin", "sino", "so", "sobre",
-    "sois", "solamente", "solo", "somos", "soy", "su", "sus", "suya", "suyas", "suyo",
-    "suyos", "tal", "tales", "también", "tampoco", "tan", "tanta", "tantas", "tanto",
-    "tantos", "te", "teneis", "tenemos", "tener", "tengo", "ti", "tiempo", "tiene", "tienen",
-    "toda", "todas", "todo", "todos", "tomar", "trabaja", "trabajais", "trabajamos", "trabajan",
-    "trabajar", "trabajas", "trabajo", "tras", "tú", "último", "un", "una", "unas", "uno",
-    "unos", "usa", "usais", "usamos", "usan", "usar", "usas", "uso", "usted", "ustedes",
-    "va", "vais", "valor", "vamos", "van", "varias", "varios", "vaya", "verdad", "verdadera",
-    "vosotras", "vosotros", "voy", "vuestra", "vuestras", "vuestro", "vuestros", "y", "ya",
-    "yo"
-]
-
+def obtener_token():
+    """Obtiene un token de acceso utilizando Client Credentials Flow (reutiliza el token en caché)."""
+    return cliente_graph.token()
 
 
-def obtener_token():
-    """Obtiene un token de acceso utilizando Client Credentials Flow."""
-    app_conf = ConfidentialClientApplication(
-        CLIENT_ID,
-        authority=f"https://login.microsoftonline.com/{TENANT_ID}",
-        client_credential=CLIENT_SECRET,
-    )
-    result = app_conf.acquire_token_for_client(scopes=SCOPES)
-    if "access_token" in result:
-        return result["access_token"]
-    else:
-        error_msg = result.get("error_description", "No se pudo obtener el token de acceso.")
-        raise Exception(f"No se pudo obtener el token de acceso: {error_msg}")
+def listar_correos_no_leidos(top: int = 100, max_paginas: int = None) -> list:
+    """
+    Devuelve los correos no leídos con adjuntos de la bandeja de entrada, siguiendo
+    @odata.nextLink hasta la última página para no truncar el backlog (el sondeo), o solo hasta
+    `max_paginas` páginas si se indica.
+    """
+    endpoint = f"users/{USER_EMAIL}/mailFolders/Inbox/messages"
+    params = {"$filter": "isRead eq false and hasAttachments eq true", "$expand": "attachments", "$top": str(top)}
+    messages = []
+    paginas = 0
+    while endpoint and (max_paginas is None or paginas < max_paginas):
+        paginas += 1
+        response = cliente_graph.get(endpoint, params=params)
+        if response.status_code != 200:
+            logging.error(f"Error al obtener los correos: {response.status_code} - {response.text}")
+            raise Exception(f"Error al obtener los correos: {response.status_code} - {response.text}")
+        datos = response.json()
+        messages.extend(datos.get("value", []))
+        # nextLink ya incluye los parámetros de la consulta
+        endpoint, params = datos.get("@odata.nextLink"), None
+    return messages
 
 
 
 def procesar_correos():
-    token = obtener_token()
-    headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
-    filtro = "isRead eq false and hasAttachments eq true"
-    endpoint = f"https://graph.microsoft.com/v1.0/users/{USER_EMAIL}/mailFolders/Inbox/messages"
-    params = {"$filter": filtro, "$expand": "attachments", "$top": "100"}
-    
-    response = requests.get(endpoint, headers=headers, params=params)
-    if response.status_code != 200:
-        logging.error(f"Error al obtener los correos: {response.status_code} - {response.text}")
-        raise Exception(f"Error al obtener los correos: {response.status_code} - {response.text}")
-    
-    messages = response.json().get("value", [])
+    with metrica_etapas_sondeo.medir(etapa="token"):
+        cliente_graph.token()
+    with metrica_etapas_sondeo.medir(etapa="lista_correos"):
+        if MODO_SINCRONIZACION == "delta":
+            messages = sincronizador_buzon.mensajes_nuevos()
+        else:
+            messages = listar_correos_no_leidos()
+    metrica_backlog.fijar(len(messages))
     productos = []
-    logging.info(f"Encontrados {len(messages)} correos no leídos con adjuntos para procesar.")
-    
-    for message in messages:
+    logging.info("Encontrados %d correos no leídos con adjuntos para procesar.", len(messages))
+
+    # Primero se localiza el audio de cada correo y se descargan a la vez los que no están en el spool
+    with metrica_etapas_sondeo.medir(etapa="descarga_adjuntos"):
+        audios = [buscar_adjunto_audio(message) for message in messages]
+        for message, audio in zip(messages, audios):
+            if audio is not None:
+                audio["referencia"] = spool_audio.buscar(message.get("id", "Sin ID"), audio["attachment_id"])
+        descargas = [
+            (message.get("id", "Sin ID"), audio)
+            for message, audio in zip(messages, audios)
+            if audio is not None and audio["referencia"] is None
+        ]
+        respuestas = cliente_graph.descargar_concurrente(
+            [audio["endpoint"] for _, audio in descargas], max_concurrencia=MAX_DESCARGAS_CONCURRENTES
+        )
+        for (correo_id, audio), adjunto_response in zip(descargas, respuestas):
+            if adjunto_response is not None and adjunto_response.status_code == 200:
+                audio["referencia"] = spool_audio.guardar(
+                    correo_id, audio["attachment_id"], adjunto_response.content, audio["nombre_archivo"]
+                )
+                registro_items.debug(
+                    "Audio guardado en el spool: %d bytes", len(adjunto_response.content), extra={"correo_id": correo_id}
+                )
+
+    tiempo_parseo = 0.0
+    for message, audio in zip(messages, audios):
         correo_id = message.get("id", "Sin ID")
-        attachments = message.get("attachments", [])
         audio_info = None
-        for att in attachments:
-            nombre_archivo = att.get("name", "")
-            if nombre_archivo.lower().endswith((".mp3", ".mp4")):
-                logging.info(f"Procesando archivo de audio del correo {correo_id}: {nombre_archivo}")
-                dato1, dato2 = extraer_datos_del_nombre(nombre_archivo)
-                if "-" in dato1:
-                    dato1 = dato1.replace("-", "/")
-                attachment_id = att.get("id")
-                adjunto_endpoint = (
-                    f"https://graph.microsoft.com/v1.0/users/{USER_EMAIL}/messages/{correo_id}"
-                    f"/attachments/{attachment_id}/$value"
-                )
-                adjunto_response = requests.get(adjunto_endpoint, headers=headers)
-                if adjunto_response.status_code == 200:
-                    audio_content = adjunto_response.content
-                    audio_base64 = base64.b64encode(audio_content).decode("utf-8")
-                    audio_info = {
-                        "audio_base64": audio_base64,
-                        "IDWorkOrder": dato1,
-                        "IDEmployee": dato2,
-                        "nombre_audio": nombre_archivo # Asegura que tenga la extensión correcta
-                    }
-                    logging.info(f"Audio procesado en memoria para {correo_id}: tamaño {len(audio_base64)} caracteres")
-                else:
-                    logging.error(f"Error al descargar audio {nombre_archivo} del correo {correo_id}")
-                break  # Procesamos solo el primer audio encontrado
+        if audio is not None:
+            nombre_archivo = audio["nombre_archivo"]
+            if audio["referencia"] is not None:
+                audio_info = {
+                    "audio_ref": audio["referencia"],
+                    "IDWorkOrder": audio["IDWorkOrder"],
+                    "IDEmployee": audio["IDEmployee"],
+                    "nombre_audio": nombre_archivo # Asegura que tenga la extensión correcta
+                }
+            else:
+                registro_items.error("Error al descargar audio %s", nombre_archivo, extra={"correo_id": correo_id})
         
         # Procesar el cuerpo del correo
+        inicio_parseo = time.perf_counter()
         cuerpo = message.get("body", {}).get("content", "")
         if message.get("body", {}).get("contentType", "").lower() == "html":
             soup = BeautifulSoup(cuerpo, "html.parser")
             cuerpo = soup.get_text()
         extracted_items = extract_body_message(cuerpo, correo_id)
+        tiempo_parseo += time.perf_counter() - inicio_parseo
         
         for item in extracted_items:
             producto_info = {
@@ -177,38 +310,83 @@ def procesar_correos():
                 "audio": audio_info if audio_info else {}
             }
             productos.append(producto_info)
-        
-        try:
-            marcar_email_como_leido(correo_id)
-        except Exception as e:
-            logging.error(f"Error marcando como leído el correo {correo_id}: {e}")
+
+    metrica_etapas_sondeo.observar(tiempo_parseo, etapa="parseo_cuerpo")
+    metrica_correos.inc(len(messages))
+    metrica_items.inc(len(productos))
+
+    # Todos los correos del sondeo se marcan como leídos en unas pocas peticiones $batch
+    ids_correos = [message.get("id", "Sin ID") for message in messages]
+    fallidos = []
+    try:
+        if ids_correos:
+            with metrica_etapas_sondeo.medir(etapa="marcar_leidos"):
+                resultados = marcar_emails_como_leidos(ids_correos)
+            fallidos = [correo_id for correo_id, ok in resultados.items() if not ok]
+        if fallidos:
+            logging.error(f"No se pudieron marcar como leídos {len(fallidos)} correos: {fallidos}")
+    except Exception as e:
+        logging.error(f"Error marcando como leídos los correos del sondeo: {e}")
+        fallidos = ids_correos
+    if MODO_SINCRONIZACION == "delta":
+        # Se avanza el deltaLink; los que no se pudieron marcar se vuelven a pedir en el siguiente sondeo
+        sincronizador_buzon.confirmar(fallidos)
     
-    logging.info(f"Procesamiento completado, total de productos extraídos: {len(productos)}.")
+    spool_audio.purgar()
+    logging.info("Procesamiento completado, total de productos extraídos: %d.", len(productos))
+    logging.info("Estadísticas del cliente Graph: %s", cliente_graph.estadisticas())
     return productos
 
 
 
 
+def buscar_adjunto_audio(message: dict):
+    """
+    Localiza el primer adjunto de audio (mp3/mp4) de un correo.
+
+    Returns:
+        dict | None: Datos del adjunto y endpoint de descarga, o None si el correo no tiene audio.
+    """
+    correo_id = message.get("id", "Sin ID")
+    for att in message.get("attachments", []):
+        nombre_archivo = att.get("name", "")
+        if nombre_archivo.lower().endswith((".mp3", ".mp4")):
+            registro_items.debug(
+                "Procesando archivo de audio %s", nombre_archivo, extra={"correo_id": correo_id}
+            )
+            dato1, dato2 = extraer_datos_del_nombre(nombre_archivo)
+            if dato1 and "-" in dato1:
+                dato1 = dato1.replace("-", "/")
+            attachment_id = att.get("id")
+            return {
+                "nombre_archivo": nombre_archivo,
+                "attachment_id": attachment_id,
+                "IDWorkOrder": dato1,
+                "IDEmployee": dato2,
+                "endpoint": f"users/{USER_EMAIL}/messages/{correo_id}/attachments/{attachment_id}/$value",
+            }
+    return None
+
+
 def extract_body_message(cuerpo, correo_id):
     try:
         cuerpo = cuerpo.replace("'", '"')
         try:
             mensaje_json = json.loads(cuerpo)
-            logging.info(f"JSON parseado exitosamente para correo {correo_id}: {mensaje_json}")
         except json.JSONDecodeError as e:
-            logging.warning(f"Error inicial parseando JSON en correo {correo_id}: {e}")
+            # Es habitual: el cuerpo trae texto alrededor del JSON
+            registro_items.debug("Cuerpo sin JSON directo (%s), se busca el substring", e, extra={"correo_id": correo_id})
             match = re.search(r'(\{.*\})', cuerpo, re.DOTALL)
             if match:
-                cuerpo_json = match.group(1)
-                logging.info(f"Substring JSON extraído para correo {correo_id}: {cuerpo_json[:200]}...")
-                mensaje_json = json.loads(cuerpo_json)
-                logging.info(f"JSON parseado del substring para correo {correo_id}: {mensaje_json}")
+                mensaje_json = json.loads(match.group(1))
             else:
-                logging.error(f"No se pudo extraer JSON válido en correo {correo_id}: {e}")
+                logging.error("No se pudo extraer JSON válido en correo %s: %s", correo_id, e)
                 raise e
         if "items" in mensaje_json:
             descriptions = []
-            logging.info(f"Items encontrados en correo {correo_id}: {len(mensaje_json['items'])}")
+            registro_items.debug(
+                "Items encontrados en el correo: %d", len(mensaje_json["items"]), extra={"correo_id": correo_id}
+            )
             for item in mensaje_json["items"]:
                 producto = item.get("product", "")
                 size = item.get("size", "")
@@ -217,16 +395,18 @@ def extract_body_message(cuerpo, correo_id):
                 combined = f"{producto} {size}".strip()
                 quantity = item.get("quantity", "")
                 descriptions.append([combined, quantity, correo_id])
-                logging.info(f"Producto extraído del correo {correo_id}: Descripción '{combined}', Cantidad '{quantity}'")
+                registro_items.debug(
+                    "Producto extraído: '%s', cantidad '%s'", combined, quantity, extra={"correo_id": correo_id}
+                )
             return descriptions
         else:
-            logging.warning(f"No se encontraron 'items' en el JSON del correo {correo_id}")
+            logging.warning("No se encontraron 'items' en el JSON del correo %s", correo_id)
             return []
     except json.JSONDecodeError as e:
-        logging.error(f"Error final parseando JSON en correo {correo_id}: {e}")
+        logging.error("Error final parseando JSON en correo %s: %s", correo_id, e)
         return []
     except Exception as e:
-        logging.error(f"Error general procesando correo {correo_id}: {e}")
+        logging.error("Error general procesando correo %s: %s", correo_id, e)
         return []
 
 
@@ -249,146 +429,114 @@ def extraer_datos_del_nombre(nombre_archivo: str) -> tuple:
     partes = [parte.strip() for parte in base.split('_')]
     if len(partes) >= 2:
         dato1, dato2 = partes[0], partes[1]
-        logging.info(f"Datos extraídos del audio {nombre_archivo}: IDWorkOrder={dato1}, IDEmployee={dato2}")
+        registro_items.debug("Datos extraídos del audio %s: IDWorkOrder=%s, IDEmployee=%s", nombre_archivo, dato1, dato2)
         return dato1, dato2
-    logging.warning(f"Formato de nombre inválido para {nombre_archivo}, no se extrajeron datos.")
+    logging.warning("Formato de nombre inválido para %s, no se extrajeron datos.", nombre_archivo)
     return None, None
 
 
 
 def descargar_audio_desde_correo():
-    token = obtener_token()
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/json",
-    }
-    endpoint = f"https://graph.microsoft.com/v1.0/users/{USER_EMAIL}/mailFolders/Inbox/messages"
-    params = {"$filter": "isRead eq false and hasAttachments eq true", "$expand": "attachments", "$top": "50"}
-    response = requests.get(endpoint, headers=headers, params=params)
-    audios = []
-    if response.status_code == 200:
-        messages = response.json().get("value", [])
-        logging.info(f"Encontrados {len(messages)} correos no leídos con adjuntos para descargar audios.")
-        for message in messages:
-            correo_id = message.get("id", "Sin ID")
-            attachments = message.get("attachments", [])
-            for attachment in attachments:
-                nombre_archivo = attachment.get("name", "")
-                if nombre_archivo.lower().endswith((".mp3", ".mp4")):  # Soporte para mp3 y mp4
-                    logging.info(f"Procesando archivo de audio del correo {correo_id}: {nombre_archivo}")
-                    dato1, dato2 = extraer_datos_del_nombre(nombre_archivo)
-                    nombre_archivo = dato1 + "_" + dato2 + ".mp4"
-                    if dato1 and '-' in dato1:
-                        dato1 = dato1.replace("-", "/")
-                    
-                    attachment_id = attachment.get("id")
-                    adjunto_endpoint = f'https://graph.microsoft.com/v1.0/users/{USER_EMAIL}/messages/{correo_id}/attachments/{attachment_id}/$value'
-                    adjunto_response = requests.get(adjunto_endpoint, headers=headers)
-                    if adjunto_response.status_code == 200:
-                        audio_content = adjunto_response.content
-                        audio_base64 = base64.b64encode(audio_content).decode("utf-8")
-                        audios.append({
-                            "nombre": nombre_archivo,  # Guardamos el nombre completo del archivo
-                            "IDWorkOrder": dato1,
-                            "IDEmployee": dato2,
-                            "audio_base64": audio_base64,
-                            "correo_id": correo_id
-                        })
-                    else:
-                        logging.error(f"Error al obtener el audio {nombre_archivo}: {adjunto_response.status_code}")
-        return audios if audios else None
-    else:
-        logging.error(f"Error al obtener correos para audios: {response.status_code} - {response.text}")
-        raise Exception(f"Error al obtener correos: {response.status_code} - {response.text}")
+    """
+    Devuelve el audio del primer correo no leído que lo tenga (en una lista, o None si no hay).
+
+    Solo se consulta la primera página de correos y se descarga un único audio: el resto del
+    backlog lo recorre el sondeo, que es quien guarda los demás en el spool.
+    """
+    messages = listar_correos_no_leidos(top=50, max_paginas=1)
+    logging.info("Encontrados %d correos no leídos con adjuntos para descargar audios.", len(messages))
+    for message in messages:
+        correo_id = message.get("id", "Sin ID")
+        attachments = message.get("attachments", [])
+        for attachment in attachments:
+            nombre_archivo = attachment.get("name", "")
+            if nombre_archivo.lower().endswith((".mp3", ".mp4")):  # Soporte para mp3 y mp4
+                registro_items.debug(
+                    "Procesando archivo de audio %s", nombre_archivo, extra={"correo_id": correo_id}
+                )
+                dato1, dato2 = extraer_datos_del_nombre(nombre_archivo)
+                nombre_archivo = dato1 + "_" + dato2 + ".mp4"
+                if dato1 and '-' in dato1:
+                    dato1 = dato1.replace("-", "/")
+
+                attachment_id = attachment.get("id")
+                referencia = spool_audio.buscar(correo_id, attachment_id)
+                if referencia is None:
+                    adjunto_endpoint = f'users/{USER_EMAIL}/messages/{correo_id}/attachments/{attachment_id}/$value'
+                    adjunto_response = cliente_graph.get(adjunto_endpoint)
+                    if adjunto_response.status_code != 200:
+                        registro_items.error(
+                            "Error al obtener el audio %s: %s", nombre_archivo, adjunto_response.status_code,
+                            extra={"correo_id": correo_id},
+                        )
+                        continue
+                    referencia = spool_audio.guardar(correo_id, attachment_id, adjunto_response.content, nombre_archivo)
+                return [{
+                    "nombre": nombre_archivo,  # Guardamos el nombre completo del archivo
+                    "IDWorkOrder": dato1,
+                    "IDEmployee": dato2,
+                    "audio_ref": referencia,
+                    "correo_id": correo_id
+                }]
+    return None
 
 
 
 def marcar_email_como_leido(email_id):
-    token = obtener_token()
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-    }
-    endpoint = f"https://graph.microsoft.com/v1.0/users/{USER_EMAIL}/messages/{email_id}"
+    endpoint = f"users/{USER_EMAIL}/messages/{email_id}"
     data = {"isRead": True}
-    response = requests.patch(endpoint, headers=headers, json=data)
+    response = cliente_graph.patch(endpoint, json=data)
     if response.status_code != 200:
-        print(f"Error al marcar correo como leído: {response.status_code} - {response.text}")
-
+        logging.error("Error al marcar correo como leído: %s - %s", response.status_code, response.text)
 
 
-def procesar_texto(texto: str) -> str:
+def marcar_emails_como_leidos(email_ids: list) -> dict:
     """
-    Normaliza el texto: elimina caracteres especiales y stop words, y finalmente reemplaza sinónimos.
-    
+    Marca varios correos como leídos agrupando los PATCH en peticiones JSON $batch de Graph.
+
     Args:
-        texto (str): Texto original.
-    
+        email_ids (list): IDs de los correos.
+
     Returns:
-        str: Texto procesado.
-    
+        dict: {email_id: True/False} según si Graph confirmó el cambio.
     """
-      # Reemplazar sinónimos después de procesar el texto
-    texto = texto.lower()
-    texto = str(texto)
-
-    sinonimos = {
-        "pegamento": "adhesivo",
-        "cola": "adhesivo",
-        "mililitros": "ml",
-        "mililitro": "ml",
-        "milímetros": "mm",
-        "milímetro": "mm",
-        "centímetros": "cm",
-        "centímetro": "cm",
-        "metros": "m",
-        "pp": "polipropileno",
-        "polipropileno": "pp",
-        "polietileno": "pe",
-        "galvanizado": "galvaniz",
-        "por": "-",
-        
-        # Agregar más sinónimos según se requiera.
-    }
-    
-    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("utf-8")
-    texto = re.sub(r"[^\w\s]", "", texto, flags=re.UNICODE)
-    texto = re.sub(r"\b(\w+)(es|s)\b", r"\1", texto)
-    # Eliminar stop words
-    palabras = texto.split()
-    palabras = [palabra for palabra in palabras if palabra not in STOP_WORDS]
-    texto_procesado = " ".join(palabras)
-
-  
-    for palabra, reemplazo in sinonimos.items():
-        texto_procesado = re.sub(rf"\b{palabra}\b", reemplazo, texto_procesado, flags=re.IGNORECASE)
-    return texto_procesado
-
-
+    ids_unicos = list(dict.fromkeys(email_ids))
+    peticiones = [
+        {
+            "id": str(i),
+            "method": "PATCH",
+            "url": f"/users/{USER_EMAIL}/messages/{email_id}",
+            "body": {"isRead": True},
+            "headers": {"Content-Type": "application/json"},
+        }
+        for i, email_id in enumerate(ids_unicos)
+    ]
+    respuestas = cliente_graph.lote(peticiones)
+    resultados = {}
+    for i, email_id in enumerate(ids_unicos):
+        respuesta = respuestas.get(str(i), {})
+        resultados[email_id] = 200 <= respuesta.get("status", 0) < 300
+        if not resultados[email_id]:
+            registro_items.error(
+                "Error al marcar correo como leído: %s - %s", respuesta.get("status"), respuesta.get("body"),
+                extra={"correo_id": email_id},
+            )
+    return resultados
+
+
+
+diario_confirmaciones = DiarioConfirmaciones(
+    RUTA_DESC_CONFIRMADAS_PKL, RUTA_DESC_CONFIRMADAS_JSON, RUTA_DESC_CONFIRMADAS_DIARIO,
+    umbral_compactacion=UMBRAL_COMPACTACION_DIARIO,
+)
 
 def guardar_descripciones_confirmadas(ruta_pkl: str, ruta_json: str):
-    joblib.dump(descripciones_confirmadas, ruta_pkl)
-    with open(ruta_json, "w", encoding="utf-8") as f:
-        json.dump(descripciones_confirmadas, f, ensure_ascii=False, indent=4)
+    """Vuelca todas las confirmaciones al snapshot (joblib y JSON) y vacía el diario."""
+    diario_confirmaciones.compactar(estado_modelo.vista_confirmaciones())
 
 def cargar_descripciones_confirmadas(ruta):
-    # Verificar si el archivo existe y no está vacío
-    if os.path.exists(ruta) and os.path.getsize(ruta) > 0:
-        try:
-            # Intentar cargar el archivo existente
-            return joblib.load(ruta)
-        except Exception as e:
-            # Si hay un error al cargar, informar y crear un archivo nuevo
-            print(f"Error al cargar {ruta}: {e}. Creando un archivo nuevo.")
-            descripciones_confirmadas = {}
-            joblib.dump(descripciones_confirmadas, ruta)
-            return descripciones_confirmadas
-    else:
-        # Si el archivo no existe o está vacío, crear uno nuevo
-        print(f"El archivo {ruta} no existe o está vacío. Creando un archivo nuevo.")
-        descripciones_confirmadas = {}
-        joblib.dump(descripciones_confirmadas, ruta)
-        return descripciones_confirmadas
+    """Carga el snapshot de confirmaciones y reaplica las entradas del diario."""
+    return diario_confirmaciones.cargar()
 
 
 def cargar_datos(ruta_csv: str):
@@ -399,145 +547,182 @@ def cargar_datos(ruta_csv: str):
     y = df_local["CodArticle"].tolist()
     return X, y, df_local
 
-def modelo_predecir(descripcion: str) -> dict:
+def modelo_predecir(descripcion: str, estado: EstadoModelo = None) -> dict:
+    estado = estado or estado_modelo
     descripcion_procesada = procesar_texto(descripcion)
-    logging.info(f"[modelo_predecir] Descripción original: '{descripcion}'")
-    logging.info(f"[modelo_predecir] Descripción procesada: '{descripcion_procesada}'")
-    matches = difflib.get_close_matches(descripcion_procesada, df["Description_Procesada"].tolist(), n=1, cutoff=0.5)
-    logging.info(f"[modelo_predecir] Matches encontrados: {matches}")
+    matches = estado.motor_busqueda.buscar(descripcion_procesada, n=1, cutoff=0.5)
     if matches:
         match = matches[0]
-        row = df.loc[df["Description_Procesada"] == match].iloc[0]
+        row = estado.catalogo.fila(estado.motor_busqueda.posicion(match))
         codigo_prediccion = row["CodArticle"]
-        logging.info(f"[modelo_predecir] Coincidencia encontrada: '{match}', CodArticle: '{codigo_prediccion}'")
+        registro_items.debug(
+            "[modelo_predecir] '%s' -> '%s': coincidencia '%s', CodArticle '%s'",
+            descripcion, descripcion_procesada, match, codigo_prediccion,
+        )
         return {"codigo_prediccion": codigo_prediccion}
     else:
-        logging.warning(f"[modelo_predecir] No se encontró coincidencia para '{descripcion_procesada}'")
+        registro_items.warning("[modelo_predecir] No se encontró coincidencia para '%s'", descripcion_procesada)
         return {"codigo_prediccion": None}
 
 
-def modelo_predecir_fuzzy(descripcion: str) -> dict:
-    descripcion_normalizada = procesar_texto(descripcion)
-    logging.info(f"[modelo_predecir_fuzzy] Descripción original: '{descripcion}'")
-    logging.info(f"[modelo_predecir_fuzzy] Descripción normalizada: '{descripcion_normalizada}'")
-    lista_descripciones = df["Description_Procesada"].tolist()
-    logging.info(f"[modelo_predecir_fuzzy] Total de descripciones en df: {len(lista_descripciones)}")
-    matches = difflib.get_close_matches(descripcion_normalizada, lista_descripciones, n=1, cutoff=0.5)
-    logging.info(f"[modelo_predecir_fuzzy] Matches encontrados: {matches}")
-    if matches:
-        match = matches[0]
-        row = df.loc[df["Description_Procesada"] == match].iloc[0]
-        codigo_prediccion = row["CodArticle"]
-        descripcion_csv = row["Description"]
-        logging.info(f"[modelo_predecir_fuzzy] Coincidencia encontrada: '{match}' con código '{codigo_prediccion}'")
-        return {
-            "codigo_prediccion": codigo_prediccion,
-            "descripcion_producto": descripcion_csv,
-            "match_method": "fuzzy"
-        }
-    else:
-        logging.warning(f"[modelo_predecir_fuzzy] No se encontró coincidencia para '{descripcion}'")
-        return {
-            "codigo_prediccion": None,
-            "mensaje": "No se encontró una coincidencia similar",
-            "match_method": "fuzzy"
-        }
-
-
-
-def procesar_producto(producto: dict) -> dict:
-    descripcion = producto["descripcion"]
-    cantidad = producto["cantidad"]
-    correo_id = producto["correo_id"]
-    audio_info = producto["audio"]
+def actualizar_modelo(descripcion: str, seleccion: str):
+    """
+    Incorpora una corrección del usuario sin copiar el catálogo ni reconstruir el índice.
 
-    logging.info(f"[procesar_producto] Procesando producto del correo {correo_id}")
-    logging.info(f"[procesar_producto] Descripción recibida: '{descripcion}'")
-    
-    descripcion_procesada = procesar_texto(descripcion)
-    logging.info(f"[procesar_producto] Descripción procesada: '{descripcion_procesada}'")
+    La versión siguiente del modelo se prepara aparte, con la fila nueva en el segmento delta del
+    catálogo, del motor de búsqueda y de la matriz de similitud, y se publica sustituyendo la
+    referencia; las predicciones en curso siguen con la versión que tomaron. Cuando el delta supera
+    UMBRAL_FUSION_DELTA se fusiona en segundo plano.
+    """
+    global estado_modelo
+    descripcion_normalizada = procesar_texto(descripcion)
+    with escritura_modelo_lock:
+        nuevo_estado = estado_modelo.con_correcciones([(descripcion, descripcion_normalizada, seleccion)])
+        diario_confirmaciones.registrar(
+            descripcion_normalizada, seleccion, nuevo_estado.vista_confirmaciones(), original=descripcion
+        )
+        estado_modelo = nuevo_estado
+    if len(nuevo_estado.catalogo.delta) >= UMBRAL_FUSION_DELTA and not fusion_lock.locked():
+        threading.Thread(target=fusionar_delta, daemon=True).start()
 
-    # Realizar la predicción basándose únicamente en el texto
-    if descripcion_procesada in descripciones_confirmadas:
-        codigo_prediccion = descripciones_confirmadas[descripcion_procesada]
-        exactitud = 100
-        logging.info(f"[procesar_producto] Predicción confirmada encontrada: {codigo_prediccion}")
-    else:
-        resultado_prediccion = modelo_predecir(descripcion)
-        codigo_prediccion = resultado_prediccion.get("codigo_prediccion")
-        if codigo_prediccion in df["CodArticle"].values:
-            descripcion_csv_predicha = df.loc[df["CodArticle"] == codigo_prediccion, "Description_Procesada"].iloc[0]
-            vectorizador_similitud = TfidfVectorizer()
-            tfidf_matrix = vectorizador_similitud.fit_transform([descripcion_procesada, descripcion_csv_predicha])
-            cosine_sim = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
-            exactitud = int(min((cosine_sim + 0.19) * 100, 100))
-            logging.info(f"[procesar_producto] Predicción calculada: {codigo_prediccion} con exactitud {exactitud}%")
-        else:
-            exactitud = 0
-            logging.warning(f"[procesar_producto] Código predicho no se encontró en df: {codigo_prediccion}")
 
-    # Lookup para obtener datos adicionales (descripción CSV, imagen, etc.)
-    if not df_lookup.empty:
-        registros = df_lookup[df_lookup["CodArticle"] == codigo_prediccion]
-        descripcion_csv = registros["Description"].iloc[0] if not registros.empty else "Descripción no encontrada"
-        imagen = ""
-        if not registros.empty and "Image" in registros:
-            imagen_temp = registros["Image"].iloc[0]
-            if pd.isna(imagen_temp):
-                imagen = ""
-            elif isinstance(imagen_temp, str) and (imagen_temp.startswith("b'") or imagen_temp.startswith('b"')):
-                try:
-                    imagen_bytes = ast.literal_eval(imagen_temp)
-                    imagen_base64 = base64.b64encode(imagen_bytes).decode("utf-8")
-                    imagen = imagen_base64
-                except Exception as e:
-                    logging.error(f"[procesar_producto] Error al convertir imagen a base64: {e}")
-                    imagen = ""
-            else:
-                imagen = imagen_temp
-        id_article_arr = df_lookup[df_lookup["CodArticle"] == codigo_prediccion]["IDArticle"].values
-        id_article = id_article_arr[0] if len(id_article_arr) > 0 else None
-    else:
-        descripcion_csv = "Descripción no encontrada"
-        imagen = ""
-        id_article = None
+posicion_diario = (None, 0)
+ultima_sincronizacion = 0.0
+sincronizacion_lock = threading.Lock()
 
-    # Usar el nombre original del audio para FileName, pero formatearlo para tener la extensión correcta
-    nombre_audio_original = audio_info.get("nombre_audio", "") if audio_info else ""
-    
-    # FileMP3 contendrá el audio en base64
-    file_mp3 = audio_info.get("audio_base64", "") if audio_info else ""
-    
 
-    resultado = {
-        "descripcion": descripcion.upper(),
-        "codigo_prediccion": codigo_prediccion if codigo_prediccion is not None else "Sin predicción",
-        "descripcion_csv": descripcion_csv,
-        "cantidad": cantidad,
-        "imagen": imagen,
-        "exactitud": exactitud,
-        "id_article": id_article,
-        "correo_id": correo_id,
-        "IDWorkOrder": audio_info.get("IDWorkOrder") if audio_info else "",
-        "IDEmployee": audio_info.get("IDEmployee") if audio_info else "",
-        "FileMP3": file_mp3,
-        "FileName": nombre_audio_original  # Se conserva el nombre original, pero con la extensión corregida
-    }
-    return resultado
+def sincronizar_con_ingesta(forzar: bool = False) -> None:
+    """
+    En los workers de API: aplica las correcciones que el proceso de ingesta (el único que escribe)
+    ha añadido al diario desde la última vez, recoge las últimas predicciones que ha publicado y,
+    si ha fusionado el delta, carga en segundo plano la base fusionada que ha publicado.
+    Se comprueba como mucho cada INTERVALO_SINCRONIZACION_API segundos.
+    """
+    global posicion_diario, ultima_sincronizacion, estado_modelo, predicciones_recientes
+    ahora = time.monotonic()
+    if not forzar and ahora - ultima_sincronizacion < INTERVALO_SINCRONIZACION_API:
+        return
+    # Si otro hilo ya está sincronizando, la petición sigue con el estado actual
+    if not sincronizacion_lock.acquire(blocking=forzar):
+        return
+    try:
+        ultima_sincronizacion = ahora
+        entradas, posicion = diario_confirmaciones.entradas_nuevas(posicion_diario)
+        if entradas is None:
+            # El diario se ha compactado: se relee todo y se aplican solo las diferencias
+            confirmaciones, posicion = diario_confirmaciones.leer_con_posicion()
+            actual = estado_modelo
+            entradas = [
+                {"descripcion": descripcion, "codigo": codigo}
+                for descripcion, codigo in confirmaciones.items()
+                if actual.confirmacion(descripcion) != codigo
+            ]
+        # Las que ya están en la base publicada (leída antes que el diario) no se vuelven a aplicar
+        entradas = [entrada for entrada in entradas if estado_modelo.confirmacion(entrada["descripcion"]) != entrada["codigo"]]
+        if entradas:
+            correcciones = [
+                (entrada.get("original", entrada["descripcion"]), entrada["descripcion"], entrada["codigo"])
+                for entrada in entradas
+            ]
+            with escritura_modelo_lock:
+                estado_modelo = estado_modelo.con_correcciones(correcciones)
+            logging.info(f"[api] {len(entradas)} correcciones aplicadas desde el diario del proceso de ingesta")
+        posicion_diario = posicion
+
+        # El worker no fusiona el delta: carga la base que publica el proceso de ingesta al fusionar
+        if base_publicada.cambiada() and not fusion_lock.locked():
+            threading.Thread(target=cargar_base_publicada, daemon=True).start()
+
+        publicadas = predicciones_publicadas.actualizadas()
+        if publicadas is not None:
+            predicciones_recientes = publicadas
+    finally:
+        sincronizacion_lock.release()
+
+
+def fusionar_delta():
+    """
+    Fusiona el segmento delta con la base construyendo el catálogo, el índice y la matriz nuevos
+    aparte y publicando después la versión nueva, de modo que las peticiones siguen usando la
+    actual mientras tanto. En el proceso de ingesta la base fusionada se publica además en disco
+    para los workers de API, que no fusionan por su cuenta.
+    """
+    global estado_modelo
+    if not fusion_lock.acquire(blocking=False):
+        return
+    try:
+        inicio = time.perf_counter()
+        estado = estado_modelo
+        n = len(estado.catalogo.delta)
+        catalogo_nuevo = estado.catalogo.fusionado(n)
+        motor_nuevo = construir_motor_busqueda(catalogo_nuevo.base)
+        similitud_nueva = estado.modelo_similitud.fusionado(n)
+        # Los códigos del delta no están en la base, así que basta con unir los dos índices
+        indice_nuevo = {**estado.indice_df, **estado.indice_delta}
+        confirmaciones_nuevas = {**estado.confirmaciones, **estado.confirmaciones_delta}
+        with escritura_modelo_lock:
+            # Las correcciones llegadas durante la fusión pasan al delta de la versión nueva
+            actual = estado_modelo
+            estado_modelo = actual.con_base(
+                catalogo_nuevo, motor_nuevo, similitud_nueva, indice_nuevo, actual.catalogo.delta[n:],
+                confirmaciones_nuevas,
+            )
+            publicado = estado_modelo
+        logging.info(f"Segmento delta fusionado ({n} filas) en {time.perf_counter() - inicio:.2f}s")
+        if ROL_PROCESO == "ingesta":
+            # Con todas las confirmaciones y las filas que siguen en el delta, para que el worker
+            # que la cargue no pierda las correcciones que llegaron durante la fusión
+            base_publicada.publicar({
+                "huella": huella_catalogo,
+                "df": catalogo_nuevo.base,
+                "motor_busqueda": motor_nuevo,
+                "modelo_similitud": similitud_nueva,
+                "indice_df": indice_nuevo,
+                "filas_delta": list(publicado.catalogo.delta),
+                "confirmaciones": dict(publicado.vista_confirmaciones()),
+            })
+    except Exception as e:
+        logging.error(f"Error fusionando el segmento delta: {e}")
+    finally:
+        fusion_lock.release()
 
 
-def actualizar_modelo(descripcion: str, seleccion: str):
-    global  vectorizer, df, descripciones_confirmadas
-    descripcion_normalizada = procesar_texto(descripcion)
-    descripciones_confirmadas[descripcion_normalizada] = seleccion
-    guardar_descripciones_confirmadas(RUTA_DESC_CONFIRMADAS_PKL, RUTA_DESC_CONFIRMADAS_JSON)
-    # Crea el nuevo registro incluyendo la columna calculada "Description_Procesada"
-    nuevo_registro = pd.DataFrame([{
-        "Description": descripcion,
-        "CodArticle": seleccion,
-        "Description_Procesada": procesar_texto(descripcion)
-    }])
-    df = pd.concat([df, nuevo_registro], ignore_index=True)
+def cargar_base_publicada():
+    """
+    En los workers de API: sustituye la base del modelo por la que ha publicado el proceso de
+    ingesta tras fusionar el delta. Del delta propio solo se conservan las correcciones que la base
+    publicada todavía no incluye.
+    """
+    global estado_modelo
+    if not fusion_lock.acquire(blocking=False):
+        return
+    try:
+        inicio = time.perf_counter()
+        base = base_publicada.actualizada()
+        if base is None or base["huella"] != huella_catalogo:
+            return
+        motor = base["motor_busqueda"]
+        motor.modo = MODO_BUSQUEDA
+        motor.max_candidatos = MAX_CANDIDATOS
+        confirmaciones = base["confirmaciones"]
+        with escritura_modelo_lock:
+            actual = estado_modelo
+            pendientes = [
+                fila for fila in actual.catalogo.delta
+                if confirmaciones.get(fila["Description_Procesada"]) != fila["CodArticle"]
+            ]
+            estado_modelo = actual.con_base(
+                CatalogoIncremental(base["df"]), motor, base["modelo_similitud"], base["indice_df"],
+                base["filas_delta"] + pendientes, confirmaciones,
+            )
+        logging.info(
+            f"[api] Base fusionada cargada ({len(base['df'])} filas, {len(pendientes)} correcciones propias pendientes) "
+            f"en {time.perf_counter() - inicio:.2f}s"
+        )
+    except Exception as e:
+        logging.error(f"[api] Error cargando la base publicada por el proceso de ingesta: {e}")
+    finally:
+        fusion_lock.release()
     
 def backup_model(ruta_original: str, ruta_backup_dir: str):
     if not os.path.exists(ruta_backup_dir):
@@ -549,23 +734,134 @@ def backup_model(ruta_original: str, ruta_backup_dir: str):
     nombre_backup = f"{ruta_backup_dir}/modelo_backup_{timestamp}.joblib"
     shutil.copy2(ruta_original, nombre_backup)
 
-def inicializar_modelo():
-    global  df_lookup, descripciones_confirmadas, df
+cache_imagenes = CacheImagenes(MAX_BYTES_CACHE_IMAGENES)
+
+def construir_motor_busqueda(df_catalogo: pd.DataFrame) -> MotorBusqueda:
+    """Construye el índice de búsqueda sobre las descripciones procesadas del catálogo."""
+    inicio = time.perf_counter()
+    motor = MotorBusqueda(
+        df_catalogo["Description_Procesada"].tolist(), modo=MODO_BUSQUEDA, max_candidatos=MAX_CANDIDATOS
+    )
+    logging.info(
+        f"Motor de búsqueda ({MODO_BUSQUEDA}) construido con {len(motor)} descripciones únicas "
+        f"en {time.perf_counter() - inicio:.2f}s"
+    )
+    return motor
+
+def construir_catalogo() -> dict:
+    """
+    Prepara todo lo que depende solo de los archivos del catálogo (lo que se guarda en el snapshot):
+    descripciones normalizadas, índice de búsqueda, modelo de similitud, índices por CodArticle e
+    imágenes ya decodificadas.
+    """
     # Cargar los datos para generar predicciones desde CSV limpio:
-    _, _, df = cargar_datos(RUTA_CSV_CLEAN)    
-    if os.path.exists(RUTA_CSV):
-        df_lookup = pd.read_csv(RUTA_CSV, usecols=["CodArticle", "Description", "IDArticle", "Image"])
-        logging.info(f"df_lookup cargado con {len(df_lookup)} registros")
+    _, _, df_catalogo = cargar_datos(RUTA_CSV_CLEAN)
+    df_catalogo = df_catalogo.reset_index(drop=True)
+    motor = construir_motor_busqueda(df_catalogo)
+    similitud = ModeloSimilitud(df_catalogo["Description_Procesada"].tolist())
+    ruta_lookup = RUTA_PARQUET if os.path.exists(RUTA_PARQUET) else RUTA_CSV
+    if os.path.exists(ruta_lookup):
+        columnas_lookup = ["CodArticle", "Description", "IDArticle", "Image"]
+        if ruta_lookup == RUTA_PARQUET:
+            df_articulos = pd.read_parquet(RUTA_PARQUET, columns=columnas_lookup)
+        else:
+            df_articulos = pd.read_csv(RUTA_CSV, usecols=columnas_lookup)
+        # Las imágenes se guardan ya decodificadas (bytes) para no hacerlo en cada arranque
+        df_articulos["Image"] = df_articulos["Image"].map(decodificar_imagen).astype(object)
+        logging.info(f"df_lookup cargado desde {ruta_lookup} con {len(df_articulos)} registros")
+    else:
+        df_articulos = pd.DataFrame()
+    return {
+        "df": df_catalogo,
+        "df_lookup": df_articulos,
+        "motor_busqueda": motor,
+        "modelo_similitud": similitud,
+        # Índices hash CodArticle -> registro para evitar recorrer las columnas en cada producto
+        "indice_df": indexar_por_codigo(df_catalogo, ["Description", "Description_Procesada"], con_posicion=True),
+        "indice_lookup": indexar_por_codigo(df_articulos, ["Description", "Image", "IDArticle"]),
+    }
+
+
+# Snapshot del catálogo: se reconstruye solo cuando cambia el contenido de los archivos de origen
+snapshot_catalogo = SnapshotCatalogo(RUTA_SNAPSHOT, [RUTA_CSV_CLEAN, RUTA_CSV, RUTA_PARQUET])
+
+
+# Versión publicada del modelo: se sustituye entera (nunca se modifica) y se lee sin locks
+estado_modelo = None
+# Huella del snapshot del catálogo: una base publicada solo vale para el catálogo del que se fusionó
+huella_catalogo = None
+base_publicada = BasePublicada(RUTA_BASE_PUBLICADA)
+
+
+def inicializar_modelo():
+    global  estado_modelo, posicion_diario, huella_catalogo
+    contenido = snapshot_catalogo.cargar_o_construir(construir_catalogo)
+    huella_catalogo = contenido["huella"]
+    motor_busqueda = contenido["motor_busqueda"]
+    # El modo de búsqueda se puede cambiar por configuración sin reconstruir el snapshot
+    motor_busqueda.modo = MODO_BUSQUEDA
+    motor_busqueda.max_candidatos = MAX_CANDIDATOS
+    df_lookup = contenido["df_lookup"]
+    version_catalogo = contenido["huella"][:16] if len(df_lookup) else "vacio"
+    cache_imagenes.limpiar()
+    if ROL_PROCESO == "api":
+        # Los workers no escriben el diario: solo lo leen y siguen después lo que añada el proceso de ingesta
+        descripciones_confirmadas, posicion_diario = diario_confirmaciones.leer_con_posicion()
     else:
-        df_lookup = pd.DataFrame()
-    descripciones_confirmadas = cargar_descripciones_confirmadas(RUTA_DESC_CONFIRMADAS_PKL)
-    logging.info(f"descripciones_confirmadas: {descripciones_confirmadas}")
+        descripciones_confirmadas = cargar_descripciones_confirmadas(RUTA_DESC_CONFIRMADAS_PKL)
+    logging.info(f"descripciones_confirmadas: {len(descripciones_confirmadas)} entradas cargadas")
+    estado_modelo = EstadoModelo(
+        catalogo=CatalogoIncremental(contenido["df"]),
+        motor_busqueda=motor_busqueda,
+        modelo_similitud=contenido["modelo_similitud"],
+        indice_df=contenido["indice_df"],
+        indice_lookup=contenido["indice_lookup"],
+        df_lookup=df_lookup,
+        catalogo_paginado=CatalogoPaginado(df_lookup, version_catalogo),
+        confirmaciones=descripciones_confirmadas,
+    )
+    if ROL_PROCESO == "ingesta":
+        # El proceso de ingesta parte del catálogo sin fusionar: la base publicada anterior ya no vale
+        base_publicada.eliminar()
+    elif ROL_PROCESO == "api":
+        cargar_base_publicada()
+        # Las confirmaciones del diario posteriores a la base publicada se añaden como correcciones
+        correcciones = [
+            (descripcion, descripcion, codigo) for descripcion, codigo in descripciones_confirmadas.items()
+            if estado_modelo.confirmacion(descripcion) != codigo
+        ]
+        if correcciones:
+            estado_modelo = estado_modelo.con_correcciones(correcciones)
 
 
 app = Flask(__name__, static_folder='static')
 CORS(app)
 
 
+@app.before_request
+def iniciar_medida_peticion():
+    g.inicio_peticion = time.perf_counter()
+    g.captura_perfil = perfilador.iniciar_peticion()
+
+
+@app.after_request
+def registrar_medida_peticion(response):
+    inicio = g.pop("inicio_peticion", None)
+    if inicio is not None:
+        # Se etiqueta por la regla de la ruta (no por la URL) para no crear una serie por artículo o audio
+        endpoint = request.url_rule.rule if request.url_rule is not None else "sin_ruta"
+        metrica_peticiones_http.observar(time.perf_counter() - inicio, endpoint=endpoint, metodo=request.method)
+        metrica_respuestas_http.inc(endpoint=endpoint, metodo=request.method, codigo=response.status_code)
+    perfilador.terminar_peticion(g.pop("captura_perfil", None), f"{request.method} {request.path}")
+    return response
+
+
+@app.before_request
+def sincronizar_worker():
+    if ROL_PROCESO == "api":
+        sincronizar_con_ingesta()
+
+
 @app.after_request
 def fix_cors_headers(response):
     # Asegurarse de que el header tenga un único valor
@@ -576,13 +872,52 @@ def fix_cors_headers(response):
 
 @app.route("/api/cargar_csv", methods=["GET"])
 def cargar_csv():
+    """
+    Devuelve el catálogo original desde memoria. Admite los parámetros opcionales
+    `offset`, `limit` y `filtro` (texto a buscar en el código o la descripción).
+    """
     try:
-        df_csv = pd.read_csv(RUTA_CSV, usecols=["CodArticle", "Description","IDArticle"])
-        datos_csv = df_csv.to_dict(orient="records")
-        return jsonify({"data": datos_csv}), 200
+        offset = int(request.args.get("offset", 0))
+        limit = request.args.get("limit")
+        limit = int(limit) if limit else None
+        respuesta = estado_modelo.catalogo_paginado.respuesta(offset, limit, request.args.get("filtro", ""))
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros de paginación no válidos: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"error": f"No se pudo cargar el archivo CSV: {str(e)}"}), 500
 
+    if respuesta["etag"] in request.if_none_match:
+        respuesta_http = Response(status=304)
+    elif "gzip" in request.accept_encodings:
+        respuesta_http = Response(respuesta["cuerpo_gzip"], mimetype="application/json")
+        respuesta_http.headers["Content-Encoding"] = "gzip"
+    else:
+        respuesta_http = Response(respuesta["cuerpo"], mimetype="application/json")
+    respuesta_http.set_etag(respuesta["etag"])
+    respuesta_http.headers["Vary"] = "Accept-Encoding"
+    return respuesta_http
+
+
+@app.route("/api/imagen/<path:cod_article>", methods=["GET"])
+def obtener_imagen(cod_article):
+    registro = buscar_codigo(estado_modelo.indice_lookup, cod_article)
+    imagen = cache_imagenes.obtener(cod_article, registro.get("Image")) if registro is not None else None
+    if imagen is None:
+        return jsonify({"error": f"No hay imagen para el artículo {cod_article}"}), 404
+    contenido, mimetype, etag = imagen
+    respuesta = Response(contenido, mimetype=mimetype)
+    respuesta.set_etag(etag)
+    respuesta.headers["Cache-Control"] = f"public, max-age={MAX_AGE_IMAGENES}"
+    return respuesta.make_conditional(request)
+
+
+def reenviar_a_ingesta(metodo: str, ruta: str, **kwargs) -> requests.Response:
+    """
+    Reenvía una petición al proceso de ingesta. Los workers de API no escriben en el diario ni en el
+    spool ni llaman a Graph: lo hace todo el proceso de ingesta.
+    """
+    return requests.request(metodo, f"{URL_INGESTA}{ruta}", timeout=30, **kwargs)
+
 
 @app.route("/api/send-seleccion", methods=["POST"])
 def recibir_seleccion():
@@ -592,6 +927,13 @@ def recibir_seleccion():
         print(f"Datos recibidos: {data}")
         seleccion = data.get("seleccion")
         descripcion = data.get("descripcion")
+        if ROL_PROCESO == "api":
+            # Las correcciones solo las escribe el proceso de ingesta; el worker las recoge del diario
+            respuesta = reenviar_a_ingesta("POST", "/api/send-seleccion", json=data)
+            if respuesta.status_code != 200:
+                return jsonify({"error": f"El proceso de ingesta rechazó la corrección: {respuesta.text}"}), 502
+            sincronizar_con_ingesta(forzar=True)
+            return obtener_predicciones()
         actualizar_modelo(descripcion, seleccion)
         # Se asume que las predicciones se actualizarán en segundo plano.
         predicciones_actualizadas = obtener_predicciones()
@@ -605,79 +947,118 @@ audio_info_global = {}
 
 @app.route("/api/getAudio", methods=["GET"])
 def get_audio():
+    """
+    Sirve un audio del spool. Con `ref` se devuelve ese audio (admite peticiones Range); sin él,
+    se descarga el audio del primer correo no leído, como hasta ahora.
+    """
     global audio_info_global
-    info_list = descargar_audio_desde_correo()
-    if info_list and len(info_list) > 0:
+    referencia = request.args.get("ref")
+    if referencia is None:
+        if ROL_PROCESO == "api":
+            # El proceso de ingesta lo descarga y lo guarda en el spool; el worker lo sirve desde ahí
+            respuesta = reenviar_a_ingesta("GET", "/api/ingesta/primer_audio")
+            if respuesta.status_code != 200:
+                return jsonify({"error": f"El proceso de ingesta no pudo obtener el audio: {respuesta.text}"}), 502
+            info_list = respuesta.json().get("audios")
+        else:
+            info_list = descargar_audio_desde_correo()
+        if not info_list:
+            return jsonify({"message": "No hay audio disponible."}), 200
         # Seleccionar el primer audio disponible
         info = info_list[0]
         audio_info_global = {
             "IDWorkOrder": info.get("IDWorkOrder"),
             "IDEmployee": info.get("IDEmployee"),
         }
-        return send_file(
-            info.get("ruta"),
-            mimetype="audio/mpeg",
-            as_attachment=True,
-            download_name="audio.mp4",
-        )
-    else:
-        return jsonify({"message": "No hay audio disponible."}), 200
+        referencia = info.get("audio_ref")
+
+    audio = spool_audio.obtener(referencia)
+    if audio is None:
+        return jsonify({"error": "Audio no encontrado"}), 404
+    ruta, nombre, mimetype = audio
+    # conditional=True activa ETag, If-None-Match y Range (206) sobre el archivo del spool
+    return send_file(
+        ruta,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=nombre or "audio.mp4",
+        conditional=True,
+        etag=referencia,
+        max_age=MAX_AGE_IMAGENES,
+    )
 
+@app.route("/api/ingesta/primer_audio", methods=["GET"])
+def primer_audio_ingesta():
+    """Para los workers de API: descarga al spool el audio del primer correo no leído y devuelve su referencia."""
+    if ROL_PROCESO == "api":
+        return jsonify({"error": "Solo lo atiende el proceso de ingesta"}), 404
+    try:
+        return jsonify({"audios": descargar_audio_desde_correo()}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Últimas predicciones: la lista no se modifica, cada sondeo publica una nueva sustituyendo la referencia
 predicciones_recientes = []
-historial_predicciones = []
-predicciones_lock = Lock()
+# Predicciones que el proceso de ingesta publica en disco para los workers de API
+predicciones_publicadas = PrediccionesPublicadas(RUTA_PREDICCIONES_PUBLICADAS)
+# Historial acotado en memoria y completo en SQLite (consultable desde /api/historial)
+historial_predicciones = HistorialPredicciones(
+    RUTA_HISTORIAL, max_memoria=MAX_HISTORIAL_MEMORIA, retencion=RETENCION_HISTORIAL, max_filas=MAX_FILAS_HISTORIAL,
+)
 
 
 def procesar_producto(producto: dict) -> dict:
     descripcion = producto["descripcion"]
-    cantidad = producto["cantidad"]
     correo_id = producto["correo_id"]
-    audio_info = producto["audio"]
+    # Toda la predicción usa la misma versión del modelo aunque se publique otra mientras tanto
+    estado = estado_modelo
 
-    logging.info(f"[procesar_producto] Procesando producto del correo {correo_id}")
-    logging.info(f"[procesar_producto] Descripción recibida: '{descripcion}'")
-    
     descripcion_procesada = procesar_texto(descripcion)
-    logging.info(f"[procesar_producto] Descripción procesada: '{descripcion_procesada}'")
 
     # Se determina si ya existe una predicción confirmada
-    if descripcion_procesada in descripciones_confirmadas:
-        codigo_prediccion = descripciones_confirmadas[descripcion_procesada]
+    codigo_confirmado = estado.confirmacion(descripcion_procesada)
+    if codigo_confirmado is not None:
+        codigo_prediccion = codigo_confirmado
         exactitud = 100
-        logging.info(f"[procesar_producto] Predicción confirmada encontrada: {codigo_prediccion}")
+        registro_items.debug(
+            "[procesar_producto] '%s': predicción confirmada %s", descripcion, codigo_prediccion,
+            extra={"correo_id": correo_id},
+        )
     else:
-        resultado_prediccion = modelo_predecir(descripcion)
+        resultado_prediccion = modelo_predecir(descripcion, estado)
         codigo_prediccion = resultado_prediccion.get("codigo_prediccion")
-        if codigo_prediccion in df["CodArticle"].values:
-            descripcion_csv_predicha = df.loc[df["CodArticle"] == codigo_prediccion, "Description_Procesada"].iloc[0]
-            vectorizador_similitud = TfidfVectorizer()
-            tfidf_matrix = vectorizador_similitud.fit_transform([descripcion_procesada, descripcion_csv_predicha])
-            cosine_sim = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
+        registro_df = estado.registro_df(codigo_prediccion)
+        if registro_df is not None:
+            cosine_sim = estado.modelo_similitud.similitud_lote([descripcion_procesada], [registro_df["posicion"]])[0]
             exactitud = int(min((cosine_sim + 0.15) * 100, 100))
-            logging.info(f"[procesar_producto] Predicción calculada: {codigo_prediccion} con exactitud {exactitud}%")
+            registro_items.debug(
+                "[procesar_producto] '%s': predicción %s con exactitud %d%%", descripcion, codigo_prediccion, exactitud,
+                extra={"correo_id": correo_id},
+            )
         else:
             exactitud = 0
-            logging.warning(f"[procesar_producto] Código predicho no se encontró en df: {codigo_prediccion}")
-    if not df_lookup.empty:
-        registros = df_lookup[df_lookup["CodArticle"] == codigo_prediccion]
-        descripcion_csv = registros["Description"].iloc[0] if not registros.empty else "Descripción no encontrada"
-        imagen = ""
-        if not registros.empty and "Image" in registros:
-            imagen_temp = registros["Image"].iloc[0]
-            if pd.isna(imagen_temp):
-                imagen = ""
-            elif isinstance(imagen_temp, str) and (imagen_temp.startswith("b") or imagen_temp.startswith('b"')):
-                try:
-                    imagen_bytes = ast.literal_eval(imagen_temp)
-                    imagen_base64 = base64.b64encode(imagen_bytes).decode("utf-8")
-                    imagen = imagen_base64
-                except Exception as e:
-                    logging.error(f"[procesar_producto] Error al convertir imagen a base64: {e}")
-                    imagen = ""
-            else:
-                imagen = imagen_temp
-        id_article_arr = df_lookup[df_lookup["CodArticle"] == codigo_prediccion]["IDArticle"].values
-        id_article = id_article_arr[0] if len(id_article_arr) > 0 else None
+            registro_items.warning(
+                "[procesar_producto] Código predicho no se encontró en df: %s", codigo_prediccion,
+                extra={"correo_id": correo_id},
+            )
+    return construir_resultado(producto, codigo_prediccion, exactitud, estado)
+
+
+def construir_resultado(producto: dict, codigo_prediccion, exactitud: int, estado: EstadoModelo = None) -> dict:
+    """
+    Completa una predicción con los datos originales del artículo (descripción, imagen, ID) y del audio.
+    """
+    descripcion = producto["descripcion"]
+    audio_info = producto["audio"]
+    estado = estado or estado_modelo
+
+    registro = estado.indice_lookup.get(codigo_prediccion)
+    if registro is not None:
+        descripcion_csv = registro["Description"]
+        # Solo se envía la URL; la imagen se decodifica y se sirve aparte desde /api/imagen
+        imagen = url_imagen(codigo_prediccion, registro)
+        id_article = registro.get("IDArticle")
     else:
         descripcion_csv = "Descripción no encontrada"
         imagen = ""
@@ -687,59 +1068,211 @@ def procesar_producto(producto: dict) -> dict:
     file_name = f"{audio_info.get('IDWorkOrder')}_{audio_info.get('IDEmployee')}.{formato_audio}"
     if "/" in file_name:
         file_name = file_name.replace("/", "-")
+    # Solo se envía la referencia al audio del spool; el audio se descarga desde /api/getAudio
+    audio_ref = audio_info.get("audio_ref", "")
     
     resultado = {
         "descripcion": descripcion.upper(),
         "codigo_prediccion": codigo_prediccion if codigo_prediccion is not None else "Sin predicción",
         "descripcion_csv": descripcion_csv,
-        "cantidad": cantidad,
+        "cantidad": producto["cantidad"],
         "imagen": imagen,
         "exactitud": exactitud,
         "id_article": id_article,
-        "correo_id": correo_id,
+        "correo_id": producto["correo_id"],
         "IDWorkOrder": audio_info.get("IDWorkOrder"),
         "IDEmployee": audio_info.get("IDEmployee"),
-        "audio_base64": audio_info.get("audio_base64", ""),
+        "audio_ref": audio_ref,
+        "audio_url": f"/api/getAudio?ref={audio_ref}" if audio_ref else "",
         "file_name": file_name
     }
     return resultado
 
+
+def predecir_lote(productos: list, etapas=None) -> list:
+    """
+    Predice todos los productos de un sondeo de correo a la vez.
+
+    Normaliza todas las descripciones, preselecciona los candidatos de todas ellas con un único
+    producto disperso contra el índice del catálogo y calcula la exactitud de todas las
+    predicciones contra la matriz TF-IDF precalculada del catálogo.
+
+    Args:
+        productos (list): Productos tal y como los devuelve procesar_correos().
+        etapas (Histograma): Si se indica, se observa en él lo que tarda cada etapa (normalizar,
+            coincidencia y consulta de artículos).
+
+    Returns:
+        list: Un resultado por producto, en el mismo orden y con el mismo formato que procesar_producto().
+    """
+    if not productos:
+        return []
+    # Todo el lote usa la misma versión del modelo aunque se publique otra mientras tanto
+    estado = estado_modelo
+    medir = etapas.medir if etapas is not None else (lambda etapa: nullcontext())
+    with medir(etapa="normalizar"):
+        descripciones_procesadas = [procesar_texto(producto["descripcion"]) for producto in productos]
+    codigos = [None] * len(productos)
+    exactitudes = [0] * len(productos)
+
+    with medir(etapa="coincidencia"):
+        # Las descripciones ya confirmadas por el usuario no pasan por el modelo
+        pendientes = []
+        for i, descripcion_procesada in enumerate(descripciones_procesadas):
+            codigo_confirmado = estado.confirmacion(descripcion_procesada)
+            if codigo_confirmado is not None:
+                codigos[i] = codigo_confirmado
+                exactitudes[i] = 100
+            else:
+                pendientes.append(i)
+
+        matches = estado.motor_busqueda.buscar_lote([descripciones_procesadas[i] for i in pendientes], n=1, cutoff=0.5)
+        a_puntuar, posiciones = [], []
+        for i, coincidencias in zip(pendientes, matches):
+            if not coincidencias:
+                continue
+            codigos[i] = estado.catalogo.fila(estado.motor_busqueda.posicion(coincidencias[0]))["CodArticle"]
+            registro_df = estado.registro_df(codigos[i])
+            if registro_df is not None:
+                a_puntuar.append(i)
+                posiciones.append(registro_df["posicion"])
+
+        similitudes = estado.modelo_similitud.similitud_lote([descripciones_procesadas[i] for i in a_puntuar], posiciones)
+        for i, cosine_sim in zip(a_puntuar, similitudes):
+            exactitudes[i] = int(min((cosine_sim + 0.15) * 100, 100))
+
+    logging.info(
+        "[predecir_lote] %d productos: %d confirmados, %d predichos, %d sin coincidencia",
+        len(productos), len(productos) - len(pendientes), len(a_puntuar), len(pendientes) - len(a_puntuar),
+    )
+    with medir(etapa="consulta_articulos"):
+        return [
+            construir_resultado(producto, codigo, exactitud, estado)
+            for producto, codigo, exactitud in zip(productos, codigos, exactitudes)
+        ]
+
 def actualizar_predicciones_periodicamente():
     """
     Actualiza las predicciones de forma periódica procesando correos recibidos.
     """
-    global predicciones_recientes, historial_predicciones
+    global predicciones_recientes
     
     while True:
+        inicio_ciclo = time.perf_counter()
         try:
-            productos = procesar_correos()
-            nuevas_predicciones = [procesar_producto(producto) for producto in productos]
-            with predicciones_lock:
-                predicciones_recientes.clear()
-                predicciones_recientes.extend(nuevas_predicciones)
-                historial_predicciones.extend(nuevas_predicciones)
+            with perfilador.ciclo():
+                productos = procesar_correos()
+                nuevas_predicciones = predecir_lote(productos, etapas=metrica_etapas_sondeo)
+                metrica_sin_coincidencia.inc(
+                    sum(1 for prediccion in nuevas_predicciones if prediccion["codigo_prediccion"] == "Sin predicción")
+                )
+                with metrica_etapas_sondeo.medir(etapa="serializar"):
+                    historial_predicciones.extend(nuevas_predicciones)
+                    predicciones_recientes = nuevas_predicciones
+                    if ROL_PROCESO == "ingesta":
+                        predicciones_publicadas.publicar(nuevas_predicciones)
         except Exception as e:
+            metrica_errores_sondeo.inc()
             logging.error("Error actualizando predicciones: %s", e)
-        time.sleep(60)
+        metrica_ciclo_sondeo.observar(time.perf_counter() - inicio_ciclo)
+        time.sleep(INTERVALO_SONDEO)
+
+@app.route("/api/admin/perfilado", methods=["GET", "POST"])
+def administrar_perfilado():
+    """
+    Consulta (GET) o cambia (POST {"ciclos": N, "umbral_peticion_s": s}) el perfilado bajo demanda.
+
+    Cada proceso tiene su propio perfilador: los ciclos de sondeo se perfilan en el proceso de
+    ingesta (o en el completo) y las peticiones en el worker que las atiende.
+    """
+    if not TOKEN_ADMIN or not hmac.compare_digest(request.headers.get("X-Token-Admin", ""), TOKEN_ADMIN):
+        return jsonify({"error": "No autorizado"}), 403
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        try:
+            return jsonify(perfilador.configurar(data.get("ciclos"), data.get("umbral_peticion_s"))), 200
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Parámetros de perfilado no válidos: {str(e)}"}), 400
+    return jsonify(perfilador.estado()), 200
+
 
+@app.route("/api/marcar_leido", methods=["POST"])
 def marcar_correo_leido():
     data = request.get_json()
     email_id = data.get("correo_id")
-    if not email_id:
+    email_ids = data.get("correo_ids")
+    if not email_id and not email_ids:
         return jsonify({"error": "ID del correo no proporcionado"}), 400
     try:
+        if ROL_PROCESO == "api":
+            # Las llamadas a Graph solo las hace el proceso de ingesta
+            respuesta = reenviar_a_ingesta("POST", "/api/marcar_leido", json=data)
+            return Response(respuesta.content, status=respuesta.status_code, mimetype="application/json")
+        if email_ids:
+            # Varios correos a la vez: se agrupan en peticiones $batch y se informa de cada uno
+            resultados = marcar_emails_como_leidos(email_ids)
+            codigo = 200 if all(resultados.values()) else 207
+            return jsonify({"message": "Correos procesados", "resultados": resultados}), codigo
         marcar_email_como_leido(email_id)
         
         return jsonify({"message": "Correo marcado como leído y datos limpiados"}), 200
     except Exception as e:
         return jsonify({"error": f"No se pudo marcar el correo como leído: {e}"}), 500
 
+@app.route("/api/metrics", methods=["GET"])
+def exportar_metricas():
+    """Métricas del proceso en formato de texto de Prometheus."""
+    return Response(metricas.exportar(), content_type=RegistroMetricas.TIPO_CONTENIDO)
+
+
 @app.route("/api/predicciones", methods=["GET"])
 def obtener_predicciones():
-    global predicciones_recientes
-    with predicciones_lock:
-        predicciones = predicciones_recientes.copy()
-    return jsonify(predicciones), 200
+    return jsonify(predicciones_recientes), 200
+
+
+@app.route("/api/predecir", methods=["POST"])
+def predecir():
+    """
+    Predice el artículo de una lista de descripciones sin pasar por el correo. Recibe
+    {"productos": [{"descripcion", "cantidad"}, ...]} o {"descripciones": [...]}.
+    """
+    data = request.get_json(silent=True) or {}
+    productos = data.get("productos")
+    if productos is None:
+        productos = [{"descripcion": descripcion} for descripcion in data.get("descripciones", [])]
+    if not isinstance(productos, list) or not all(isinstance(p, dict) and p.get("descripcion") for p in productos):
+        return jsonify({"error": "Se esperaba una lista de productos con 'descripcion'"}), 400
+    productos = [
+        {
+            "descripcion": str(producto["descripcion"]),
+            "cantidad": producto.get("cantidad", ""),
+            "correo_id": producto.get("correo_id"),
+            "audio": {},
+        }
+        for producto in productos
+    ]
+    try:
+        return jsonify(predecir_lote(productos)), 200
+    except Exception as e:
+        return jsonify({"error": f"No se pudo predecir: {str(e)}"}), 500
+
+
+@app.route("/api/historial", methods=["GET"])
+def obtener_historial():
+    """
+    Devuelve el historial de predicciones paginado, de la más reciente a la más antigua. Admite
+    `offset`, `limit` (máximo 500) y los filtros exactos `correo_id`, `IDWorkOrder` y `codigo_prediccion`.
+    """
+    try:
+        offset = int(request.args.get("offset", 0))
+        limit = min(int(request.args.get("limit", 50)), 500)
+        filtros = {campo: request.args.get(campo) for campo in ("correo_id", "IDWorkOrder", "codigo_prediccion")}
+        return jsonify(historial_predicciones.consultar(offset, limit, **filtros)), 200
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros de paginación no válidos: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"No se pudo consultar el historial: {str(e)}"}), 500
+
 @app.route("/")
 def serve_react():
     return send_from_directory(app.static_folder, "index.html")
@@ -757,14 +1290,25 @@ def static_assets(filename):
 
 
 if __name__ == "__main__":
+    if "--construir-snapshot" in sys.argv:
+        # Paso de construcción: prepara el snapshot del catálogo sin arrancar el servidor
+        snapshot_catalogo.cargar_o_construir(construir_catalogo)
+        sys.exit(0)
+    if ROL_PROCESO == "api":
+        sys.exit("Los workers de API se arrancan con gunicorn: gunicorn -c gunicorn.conf.py wsgi:app")
     inicializar_modelo()
     hilo_actualizador = threading.Thread(target=actualizar_predicciones_periodicamente, daemon=True)
     hilo_actualizador.start()
-    
+
+    if ROL_PROCESO == "ingesta":
+        # Solo lo usan los workers de API (correcciones reenviadas); el público va a gunicorn
+        host, puerto = os.getenv("HOST_INGESTA", "127.0.0.1"), PUERTO_INGESTA
+    else:
+        host, puerto = "10.83.0.17", 5000
     try:
         from waitress import serve
         # Serve usando Waitress (pip install waitress)
-        serve(app, host="10.83.0.17", port=5000, threads=1)
+        serve(app, host=host, port=puerto, threads=1)
     except ImportError:
         # Si no está instalado waitress, se arranca en modo desarrollo (no recomendado en producción)
-        app.run(host="0.0.0.0", port=5000, debug=False)
\ No newline at end of file
+        app.run(host="0.0.0.0" if ROL_PROCESO == "completo" else host, port=puerto, debug=False)
\ No newline at end of file
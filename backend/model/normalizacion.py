@@ -0,0 +1,118 @@
+"""
+Normalización de descripciones de productos.
+
+procesar_texto se ejecuta sobre cada fila del catálogo al arrancar y varias veces por producto,
+así que todo lo que no depende del texto (stop words, sinónimos y expresiones regulares) se
+prepara una sola vez al importar el módulo, y los resultados se memorizan en una caché acotada.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+
+STOP_WORDS = frozenset([
+    "a", "acá", "ahí", "ajena", "ajenas", "ajeno", "ajenos", "al", "algo", "algún",
+    "alguna", "algunas", "alguno", "algunos", "allá", "alli", "allí", "ambos", "ampleamos",
+    "ante", "antes", "aquel", "aquella", "aquellas", "aquello", "aquellos", "aqui", "aquí",
+    "arriba", "asi", "atras", "aun", "aunque", "bajo", "bastante", "bien", "cabe", "cada",
+    "casi", "cierta", "ciertas", "cierto", "ciertos", "como", "cómo", "con", "conmigo",
+    "conseguimos", "conseguir", "consigo", "consigue", "consiguen", "consigues", "contigo",
+    "contra", "cual", "cuales", "cualquier", "cualquiera", "cualquieras", "cuan", "cuando",
+    "cuanta", "cuantas", "cuanto", "cuantos", "de", "dejar", "del", "demas", "demasiada",
+    "demasiadas", "demasiado", "demasiados", "dentro", "desde", "donde", "dos", "el", "él",
+    "ella", "ellas", "ello", "ellos", "empleais", "emplean", "emplear", "empleas", "empleo",
+    "en", "encima", "entonces", "entre", "era", "eramos", "eran", "eras", "eres", "es",
+    "esa", "esas", "ese", "eso", "esos", "esta", "estaba", "estado", "estais", "estamos",
+    "estan", "estoy", "fin", "fue", "fueron", "fui", "fuimos", "gueno", "ha", "hace",
+    "haceis", "hacemos", "hacen", "hacer", "haces", "hago", "incluso", "intenta", "intentais",
+    "intentamos", "intentan", "intentar", "intentas", "intento", "ir", "jamás", "junto",
+    "juntos", "la", "largo", "las", "lo", "los", "mientras", "mio", "misma", "mismas",
+    "mismo", "mismos", "modo", "mucha", "muchas", "muchísima", "muchísimas", "muchísimo",
+    "muchísimos", "mucho", "muchos", "muy", "nada", "ni", "ninguna", "ningunas", "ninguno",
+    "ningunos", "no", "nos", "nosotras", "nosotros", "nuestra", "nuestras", "nuestro",
+    "nuestros", "nunca", "os", "otra", "otras", "otro", "otros", "para", "parecer", "pero",
+    "poca", "pocas", "poco", "pocos", "podeis", "podemos", "poder", "podria", "podriais",
+    "podriamos", "podrian", "podrias", "por", "por qué", "porque", "primero", "puede",
+    "pueden", "puedo", "pues", "que", "qué", "querer", "quien", "quién", "quienes", "quienesquiera",
+    "quienquiera", "quiza", "quizas", "sabe", "sabeis", "sabemos", "saben", "saber", "sabes",
+    "se", "segun", "ser", "si", "sí", "siempre", "siendo", "sin", "sino", "so", "sobre",
+    "sois", "solamente", "solo", "somos", "soy", "su", "sus", "suya", "suyas", "suyo",
+    "suyos", "tal", "tales", "también", "tampoco", "tan", "tanta", "tantas", "tanto",
+    "tantos", "te", "teneis", "tenemos", "tener", "tengo", "ti", "tiempo", "tiene", "tienen",
+    "toda", "todas", "todo", "todos", "tomar", "trabaja", "trabajais", "trabajamos", "trabajan",
+    "trabajar", "trabajas", "trabajo", "tras", "tú", "último", "un", "una", "unas", "uno",
+    "unos", "usa", "usais", "usamos", "usan", "usar", "usas", "uso", "usted", "ustedes",
+    "va", "vais", "valor", "vamos", "van", "varias", "varios", "vaya", "verdad", "verdadera",
+    "vosotras", "vosotros", "voy", "vuestra", "vuestras", "vuestro", "vuestros", "y", "ya",
+    "yo"
+])
+
+# El orden importa: los sinónimos se aplican uno detrás de otro, igual que en la versión original
+SINONIMOS = {
+    "pegamento": "adhesivo",
+    "cola": "adhesivo",
+    "mililitros": "ml",
+    "mililitro": "ml",
+    "milímetros": "mm",
+    "milímetro": "mm",
+    "centímetros": "cm",
+    "centímetro": "cm",
+    "metros": "m",
+    "pp": "polipropileno",
+    "polipropileno": "pp",
+    "polietileno": "pe",
+    "galvanizado": "galvaniz",
+    "por": "-",
+    
+    # Agregar más sinónimos según se requiera.
+}
+
+TAMANO_CACHE = 16384
+
+_RE_CARACTERES_ESPECIALES = re.compile(r"[^\w\s]", flags=re.UNICODE)
+_RE_PLURALES = re.compile(r"\b(\w+)(es|s)\b")
+
+
+def _componer_sinonimos(sinonimos: dict) -> dict:
+    """
+    Convierte la lista ordenada de sinónimos en un único reemplazo por palabra.
+
+    Aplicar los sinónimos uno detrás de otro equivale a sustituir cada palabra por el resultado
+    de pasar su reemplazo por los sinónimos que vienen después (p. ej. "pp" -> "polipropileno" -> "pp").
+    """
+    reglas = list(sinonimos.items())
+    compuestos = {}
+    for i, (palabra, reemplazo) in enumerate(reglas):
+        for siguiente, reemplazo_siguiente in reglas[i + 1:]:
+            reemplazo = re.sub(rf"\b{siguiente}\b", reemplazo_siguiente, reemplazo, flags=re.IGNORECASE)
+        compuestos.setdefault(palabra.lower(), reemplazo)
+    return compuestos
+
+
+_SINONIMOS_COMPUESTOS = _componer_sinonimos(SINONIMOS)
+_RE_SINONIMOS = re.compile(
+    r"\b(" + "|".join(re.escape(p) for p in sorted(SINONIMOS, key=len, reverse=True)) + r")\b",
+    flags=re.IGNORECASE,
+)
+
+
+@lru_cache(maxsize=TAMANO_CACHE)
+def procesar_texto(texto: str) -> str:
+    """
+    Normaliza el texto: elimina caracteres especiales y stop words, y finalmente reemplaza sinónimos.
+    
+    Args:
+        texto (str): Texto original.
+    
+    Returns:
+        str: Texto procesado.
+    
+    """
+    texto = str(texto).lower()
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("utf-8")
+    texto = _RE_CARACTERES_ESPECIALES.sub("", texto)
+    texto = _RE_PLURALES.sub(r"\1", texto)
+    # Eliminar stop words
+    texto_procesado = " ".join(palabra for palabra in texto.split() if palabra not in STOP_WORDS)
+    # Reemplazar sinónimos de una sola pasada
+    return _RE_SINONIMOS.sub(lambda m: _SINONIMOS_COMPUESTOS[m.group(1).lower()], texto_procesado)
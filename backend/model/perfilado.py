@@ -0,0 +1,201 @@
+"""
+Perfilado bajo demanda de los ciclos de sondeo y de las peticiones lentas, sin reiniciar el proceso.
+
+- Los próximos N ciclos de sondeo se perfilan con cProfile (`.prof`, para pstats o snakeviz) y con
+  un muestreo de la pila del hilo (`.folded`).
+- Con un umbral de peticiones, cada petición se muestrea mientras se atiende y su perfil solo se
+  guarda si ha tardado más que el umbral.
+
+Los `.folded` están en formato de pilas colapsadas (una línea "marco;marco;marco muestras"), que
+leen directamente flamegraph.pl, speedscope o inferno. Los archivos se escriben en un directorio
+que se rota conservando los `max_archivos` más recientes.
+
+Mientras no hay nada activado, `ciclo()` y `iniciar_peticion()` solo comprueban dos atributos y
+el hilo de muestreo no existe.
+"""
+import cProfile
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+class CapturaPila:
+    """Muestras de la pila de un hilo: {pila colapsada: número de muestras}."""
+
+    def __init__(self, hilo: int):
+        self.hilo = hilo
+        self.muestras = Counter()
+        self.inicio = time.perf_counter()
+
+
+def colapsar_pila(frame) -> str:
+    """Pila de un frame en formato colapsado, de la raíz a la hoja."""
+    marcos = []
+    while frame is not None:
+        codigo = frame.f_code
+        marcos.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(marcos))
+
+
+class Perfilador:
+    """
+    Activa el perfilado de ciclos y de peticiones en caliente (desde variables de entorno o desde
+    el endpoint de administración) y escribe los perfiles en un directorio rotativo.
+    """
+
+    def __init__(self, directorio: str, max_archivos: int = 50, intervalo_muestreo: float = 0.005,
+                 ciclos: int = 0, umbral_peticion: float = 0.0):
+        self.directorio = directorio
+        self.max_archivos = max_archivos
+        self.intervalo_muestreo = intervalo_muestreo
+        # Ciclos de sondeo que quedan por perfilar y umbral (segundos) de las peticiones; 0 = desactivado
+        self.ciclos_pendientes = ciclos
+        self.umbral_peticion = umbral_peticion
+        self._lock = threading.Lock()
+        self._capturas = {}
+        self._hay_capturas = threading.Event()
+        self._hilo_muestreo = None
+
+    def configurar(self, ciclos: int = None, umbral_peticion: float = None) -> dict:
+        """Cambia lo que se perfila (None deja el valor como está) y devuelve el estado."""
+        with self._lock:
+            if ciclos is not None:
+                self.ciclos_pendientes = max(0, int(ciclos))
+            if umbral_peticion is not None:
+                self.umbral_peticion = max(0.0, float(umbral_peticion))
+        logging.info(
+            f"[perfilado] Ciclos por perfilar: {self.ciclos_pendientes}, "
+            f"umbral de peticiones: {self.umbral_peticion or 'desactivado'}"
+        )
+        return self.estado()
+
+    def estado(self) -> dict:
+        return {
+            "ciclos_pendientes": self.ciclos_pendientes,
+            "umbral_peticion_s": self.umbral_peticion,
+            "directorio": self.directorio,
+            "archivos": self.archivos()[-self.max_archivos:],
+        }
+
+    def archivos(self) -> list:
+        """Perfiles guardados, del más antiguo al más reciente."""
+        try:
+            nombres = [nombre for nombre in os.listdir(self.directorio) if nombre.endswith((".prof", ".folded"))]
+        except FileNotFoundError:
+            return []
+        return sorted(nombres, key=lambda nombre: os.path.getmtime(os.path.join(self.directorio, nombre)))
+
+    # --- Muestreo de pilas ---
+
+    def _registrar(self, captura: CapturaPila) -> None:
+        with self._lock:
+            self._capturas[id(captura)] = captura
+            self._hay_capturas.set()
+            if self._hilo_muestreo is None:
+                self._hilo_muestreo = threading.Thread(target=self._muestrear, name="perfilado", daemon=True)
+                self._hilo_muestreo.start()
+
+    def _retirar(self, captura: CapturaPila) -> None:
+        with self._lock:
+            self._capturas.pop(id(captura), None)
+            if not self._capturas:
+                self._hay_capturas.clear()
+
+    def _muestrear(self) -> None:
+        while True:
+            self._hay_capturas.wait()
+            frames = sys._current_frames()
+            with self._lock:
+                capturas = list(self._capturas.values())
+            for captura in capturas:
+                frame = frames.get(captura.hilo)
+                if frame is not None:
+                    captura.muestras[colapsar_pila(frame)] += 1
+            del frames
+            time.sleep(self.intervalo_muestreo)
+
+    # --- Ciclos de sondeo ---
+
+    @contextmanager
+    def ciclo(self):
+        """Perfila el bloque `with` si quedan ciclos por perfilar."""
+        if not self.ciclos_pendientes:
+            yield
+            return
+        with self._lock:
+            if not self.ciclos_pendientes:
+                perfilar = False
+            else:
+                self.ciclos_pendientes -= 1
+                perfilar = True
+        if not perfilar:
+            yield
+            return
+
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Otro perfilador determinista activo en el proceso (Python 3.12+): solo se muestrea
+            logging.warning("[perfilado] cProfile ya está en uso; el ciclo solo se muestrea")
+            perfil = None
+        captura = CapturaPila(threading.get_ident())
+        self._registrar(captura)
+        try:
+            yield
+        finally:
+            if perfil is not None:
+                perfil.disable()
+            self._retirar(captura)
+            duracion = time.perf_counter() - captura.inicio
+            nombre = f"{time.strftime('%Y%m%d-%H%M%S')}_ciclo_{duracion:.1f}s"
+            self._guardar(nombre, captura, perfil)
+
+    # --- Peticiones lentas ---
+
+    def iniciar_peticion(self):
+        """Empieza a muestrear la petición actual si hay umbral; devuelve la captura o None."""
+        if not self.umbral_peticion:
+            return None
+        captura = CapturaPila(threading.get_ident())
+        self._registrar(captura)
+        return captura
+
+    def terminar_peticion(self, captura, descripcion: str) -> None:
+        """Deja de muestrear y guarda el perfil si la petición ha superado el umbral."""
+        if captura is None:
+            return
+        self._retirar(captura)
+        duracion = time.perf_counter() - captura.inicio
+        if self.umbral_peticion and duracion >= self.umbral_peticion:
+            detalle = "".join(c if c.isalnum() else "-" for c in descripcion).strip("-")[:60]
+            self._guardar(f"{time.strftime('%Y%m%d-%H%M%S')}_peticion_{detalle}_{duracion:.2f}s", captura)
+
+    # --- Escritura y rotación ---
+
+    def _guardar(self, nombre: str, captura: CapturaPila, perfil: cProfile.Profile = None) -> None:
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            base = os.path.join(self.directorio, nombre)
+            if perfil is not None:
+                perfil.dump_stats(f"{base}.prof")
+            with open(f"{base}.folded", "w", encoding="utf-8") as f:
+                for pila, muestras in captura.muestras.most_common():
+                    f.write(f"{pila} {muestras}\n")
+            logging.info(f"[perfilado] Perfil guardado: {base} ({sum(captura.muestras.values())} muestras)")
+            self._rotar()
+        except OSError as e:
+            logging.error(f"[perfilado] No se pudo guardar el perfil {nombre}: {e}")
+
+    def _rotar(self) -> None:
+        archivos = self.archivos()
+        for nombre in archivos[:max(0, len(archivos) - self.max_archivos)]:
+            try:
+                os.remove(os.path.join(self.directorio, nombre))
+            except OSError:
+                pass
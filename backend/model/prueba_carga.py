@@ -0,0 +1,134 @@
+"""
+Prueba de carga del despliegue multiproceso: arranca gunicorn (wsgi:app) con distinto número de
+workers de API y mide el rendimiento de /api/predicciones, /api/cargar_csv y /api/predecir.
+
+    python prueba_carga.py --workers 1 2 4 --clientes 16 --duracion 20
+
+Usa los archivos del catálogo de este directorio (y construye el snapshot si hace falta). Los
+clientes son procesos aparte para que el generador de carga no quede limitado por el GIL.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from multiprocessing import Pool
+
+import requests
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PALABRAS = (
+    "tubo codo polietileno pvc manguito te reduccion valvula bola laton grifo 16mm 20mm 25mm 32mm "
+    "40mm 50mm gotero riego aspersor filtro malla anilla brida enlace hembra macho"
+).split()
+
+
+def peticion_aleatoria(sesion: requests.Session, url: str, rng: random.Random):
+    tipo = rng.random()
+    if tipo < 0.4:
+        descripciones = [" ".join(rng.choices(PALABRAS, k=3)) for _ in range(5)]
+        return "predecir", sesion.post(f"{url}/api/predecir", json={"descripciones": descripciones}, timeout=30)
+    if tipo < 0.7:
+        offset = rng.randrange(0, 1000)
+        return "cargar_csv", sesion.get(f"{url}/api/cargar_csv", params={"offset": offset, "limit": 50}, timeout=30)
+    return "predicciones", sesion.get(f"{url}/api/predicciones", timeout=30)
+
+
+def cliente(argumentos):
+    """Lanza peticiones seguidas durante `duracion` segundos y devuelve [(tipo, latencia, ok)]."""
+    url, duracion, semilla = argumentos
+    rng = random.Random(semilla)
+    sesion = requests.Session()
+    resultados = []
+    fin = time.perf_counter() + duracion
+    while time.perf_counter() < fin:
+        inicio = time.perf_counter()
+        try:
+            tipo, respuesta = peticion_aleatoria(sesion, url, rng)
+            ok = respuesta.status_code == 200
+        except requests.RequestException:
+            tipo, ok = "error", False
+        resultados.append((tipo, time.perf_counter() - inicio, ok))
+    return resultados
+
+
+def esperar_servidor(url: str, proceso, limite: float = 180) -> None:
+    fin = time.time() + limite
+    while time.time() < fin:
+        if proceso.poll() is not None:
+            raise RuntimeError("gunicorn terminó antes de estar listo")
+        try:
+            if requests.get(f"{url}/api/predicciones", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"El servidor no respondió en {limite}s")
+
+
+def medir(workers: int, clientes: int, duracion: float, puerto: int, hilos: int) -> dict:
+    url = f"http://127.0.0.1:{puerto}"
+    entorno = {**os.environ, "WORKERS_API": str(workers), "HILOS_WORKER_API": str(hilos),
+               "BIND_API": f"127.0.0.1:{puerto}"}
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+        cwd=BASE_DIR, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        esperar_servidor(url, proceso)
+        # Calentamiento: cada worker recibe alguna petición antes de medir
+        cliente((url, 2, 0))
+        inicio = time.perf_counter()
+        with Pool(clientes) as pool:
+            resultados = pool.map(cliente, [(url, duracion, semilla) for semilla in range(1, clientes + 1)])
+        transcurrido = time.perf_counter() - inicio
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=30)
+
+    todas = [resultado for lista in resultados for resultado in lista]
+    latencias = sorted(latencia for _, latencia, ok in todas if ok)
+    por_tipo = {}
+    for tipo, latencia, ok in todas:
+        por_tipo.setdefault(tipo, []).append(latencia)
+    return {
+        "workers": workers,
+        "clientes": clientes,
+        "peticiones": len(todas),
+        "errores": sum(1 for _, _, ok in todas if not ok),
+        "peticiones_s": round(len(latencias) / transcurrido, 1),
+        "p50_ms": round(statistics.median(latencias) * 1000, 1) if latencias else None,
+        "p99_ms": round(latencias[int(len(latencias) * 0.99) - 1] * 1000, 1) if latencias else None,
+        "por_endpoint": {tipo: len(valores) for tipo, valores in sorted(por_tipo.items())},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de los workers de API.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Número de workers a probar")
+    parser.add_argument("--clientes", type=int, default=16, help="Procesos cliente concurrentes")
+    parser.add_argument("--duracion", type=float, default=20, help="Segundos de medida por configuración")
+    parser.add_argument("--hilos", type=int, default=4, help="Hilos por worker de gunicorn")
+    parser.add_argument("--puerto", type=int, default=5080)
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    # El snapshot se construye una vez antes de medir (así el arranque no cuenta en la primera configuración)
+    subprocess.run([sys.executable, "modelo_prediccion.py", "--construir-snapshot"], cwd=BASE_DIR, check=True)
+    filas = []
+    for workers in args.workers:
+        fila = medir(workers, args.clientes, args.duracion, args.puerto, args.hilos)
+        base = filas[0]["peticiones_s"] if filas else fila["peticiones_s"]
+        fila["escalado"] = round(fila["peticiones_s"] / base, 2) if base else None
+        filas.append(fila)
+        print(
+            f"workers={fila['workers']:>2}  peticiones/s={fila['peticiones_s']:>8}  p50={fila['p50_ms']}ms  "
+            f"p99={fila['p99_ms']}ms  errores={fila['errores']}  escalado=x{fila['escalado']}"
+        )
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump({"cpus": os.cpu_count(), "resultados": filas}, f, indent=4)
@@ -0,0 +1,147 @@
+"""
+Configuración del logging del proceso: asíncrona, con formato diferido y campos estructurados.
+
+Los hilos que registran (el sondeo, los workers de Flask) solo meten el registro en una cola
+acotada; un hilo aparte (QueueListener) lo formatea y lo escribe. Con argumentos al estilo %s
+("... %s", valor) el mensaje solo se compone si el registro pasa el nivel y los filtros, y el
+resto del formato (fecha, campos, JSON) se hace en ese hilo. Si la cola se llena, los registros
+se descartan (y se cuentan) en lugar de bloquear al que registra.
+
+Los mensajes por producto o por correo van al logger `registro_items` (nivel DEBUG) con un
+filtro que deja pasar como mucho `max_por_segundo` registros por plantilla de mensaje.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+# Atributos propios de un LogRecord; el resto son campos estructurados pasados con extra={...}
+_ATRIBUTOS_REGISTRO = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+# Logger de los mensajes por producto/correo (muestreados)
+registro_items = logging.getLogger("pedidos.items")
+
+_oyente = None
+
+
+def campos_extra(record: logging.LogRecord) -> dict:
+    return {clave: valor for clave, valor in vars(record).items() if clave not in _ATRIBUTOS_REGISTRO}
+
+
+class FormateadorEstructurado(logging.Formatter):
+    """Añade al mensaje los campos pasados con `extra` (clave=valor), o escribe cada registro en JSON."""
+
+    def __init__(self, json_por_linea: bool = False):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+        self.json_por_linea = json_por_linea
+
+    def format(self, record: logging.LogRecord) -> str:
+        campos = campos_extra(record)
+        if self.json_por_linea:
+            datos = {
+                "fecha": self.formatTime(record), "nivel": record.levelname, "logger": record.name,
+                "mensaje": record.getMessage(), "hilo": record.threadName, **campos,
+            }
+            if record.exc_info or record.exc_text:
+                datos["excepcion"] = record.exc_text or self.formatException(record.exc_info)
+            return json.dumps(datos, ensure_ascii=False, default=str)
+        linea = super().format(record)
+        if campos:
+            linea += " " + " ".join(f"{clave}={valor}" for clave, valor in campos.items())
+        return linea
+
+
+class FiltroMuestreo(logging.Filter):
+    """
+    Deja pasar como mucho `max_por_segundo` registros por segundo de cada plantilla de mensaje; al
+    siguiente que pasa se le añade cuántos se han omitido (campo `omitidos`). Los avisos y errores
+    (WARNING o más) pasan siempre.
+    """
+
+    def __init__(self, max_por_segundo: float = 5):
+        super().__init__()
+        self.max_por_segundo = max_por_segundo
+        self._ventanas = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.max_por_segundo or record.levelno >= logging.WARNING:
+            return True
+        ahora = time.monotonic()
+        with self._lock:
+            inicio, emitidos, omitidos = self._ventanas.get(record.msg, (ahora, 0, 0))
+            if ahora - inicio >= 1.0:
+                inicio, emitidos = ahora, 0
+            if emitidos >= self.max_por_segundo:
+                self._ventanas[record.msg] = (inicio, emitidos, omitidos + 1)
+                return False
+            self._ventanas[record.msg] = (inicio, emitidos + 1, 0)
+        if omitidos:
+            record.omitidos = omitidos
+        return True
+
+
+class ColaRegistro(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no bloquea ni formatea en el hilo que registra.
+
+    El QueueHandler estándar formatea el registro entero antes de encolarlo; aquí solo se compone
+    el mensaje con sus argumentos (que el que registra puede modificar después) y la traza de las
+    excepciones, y el resto del formato se hace en el hilo del QueueListener.
+    """
+
+    def __init__(self, cola: queue.Queue):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Se llega aquí después del nivel y los filtros, así que los registros descartados no se componen
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+def configurar_registro(nivel: str = "INFO", formato: str = "texto", max_cola: int = 10000,
+                        max_items_por_segundo: float = 5, ruta: str = None) -> None:
+    """
+    Configura el logger raíz con una cola y un hilo escritor (como logging.basicConfig, no hace
+    nada si el proceso ya tiene handlers).
+
+    Args:
+        nivel (str): Nivel del logger raíz ("DEBUG", "INFO"...).
+        formato (str): "texto" (una línea con los campos clave=valor) o "json" (un objeto por línea).
+        max_cola (int): Registros pendientes de escribir antes de empezar a descartar.
+        max_items_por_segundo (float): Límite por plantilla de los mensajes de `registro_items` (0 = sin límite).
+        ruta (str): Archivo de log; si no se indica se escribe en stderr.
+    """
+    global _oyente
+    raiz = logging.getLogger()
+    if raiz.handlers:
+        return
+    raiz.setLevel(nivel.upper())
+    destino = logging.FileHandler(ruta, encoding="utf-8") if ruta else logging.StreamHandler()
+    destino.setFormatter(FormateadorEstructurado(json_por_linea=formato == "json"))
+    cola = queue.Queue(maxsize=max_cola)
+    raiz.addHandler(ColaRegistro(cola))
+    _oyente = logging.handlers.QueueListener(cola, destino, respect_handler_level=True)
+    _oyente.start()
+    # Al salir se escribe lo que quede en la cola
+    atexit.register(_oyente.stop)
+    registro_items.addFilter(FiltroMuestreo(max_items_por_segundo))
+
+
+def descartados() -> int:
+    """Registros descartados porque la cola estaba llena."""
+    return sum(getattr(handler, "descartados", 0) for handler in logging.getLogger().handlers)
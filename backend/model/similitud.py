@@ -0,0 +1,69 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+class ModeloSimilitud:
+    """
+    Vectorizador TF-IDF ajustado una sola vez sobre las descripciones procesadas del catálogo.
+
+    La matriz del catálogo se mantiene en memoria (una fila por fila del DataFrame), de modo que
+    la similitud coseno entre una descripción entrante y el artículo predicho se obtiene con un
+    `transform` de la consulta y un producto disperso contra la fila ya calculada. El vectorizador
+    y la matriz se guardan en el snapshot del catálogo, que es quien decide cuándo reajustarlos.
+    """
+
+    def __init__(self, descripciones=None, vectorizador=None, matriz=None):
+        if vectorizador is None:
+            vectorizador = TfidfVectorizer()
+            matriz = vectorizador.fit_transform(descripciones)
+        self.vectorizador = vectorizador
+        self.matriz = matriz
+        # Filas añadidas después del ajuste (correcciones del usuario)
+        self.filas_extra = []
+
+    def __len__(self):
+        return self.matriz.shape[0] + len(self.filas_extra)
+
+    def con_filas(self, descripciones: list) -> "ModeloSimilitud":
+        """
+        Devuelve un modelo nuevo con filas añadidas al final del catálogo. La matriz y el vectorizador
+        se comparten; el modelo actual no cambia.
+        """
+        modelo = ModeloSimilitud(vectorizador=self.vectorizador, matriz=self.matriz)
+        modelo.filas_extra = self.filas_extra + [self.vectorizador.transform([d]) for d in descripciones]
+        return modelo
+
+    def fusionado(self, n: int) -> "ModeloSimilitud":
+        """Devuelve un modelo nuevo con las `n` primeras filas añadidas incorporadas a la matriz."""
+        matriz = sp.vstack([self.matriz] + self.filas_extra[:n], format="csr") if n > 0 else self.matriz
+        modelo = ModeloSimilitud(vectorizador=self.vectorizador, matriz=matriz)
+        modelo.filas_extra = self.filas_extra[n:]
+        return modelo
+
+    def filas(self, posiciones) -> sp.csr_matrix:
+        """Devuelve las filas del catálogo en las posiciones indicadas."""
+        base = self.matriz.shape[0]
+        posiciones = np.asarray(posiciones, dtype=np.int64)
+        if not self.filas_extra or (posiciones < base).all():
+            return self.matriz[posiciones]
+        return sp.vstack(
+            [self.matriz[p] if p < base else self.filas_extra[p - base] for p in posiciones], format="csr"
+        )
+
+    def similitud_lote(self, consultas: list, posiciones) -> np.ndarray:
+        """
+        Calcula la similitud coseno de cada consulta con la fila del catálogo correspondiente.
+
+        Args:
+            consultas (list): Descripciones ya procesadas.
+            posiciones (list): Posición en el catálogo del artículo con el que comparar cada consulta.
+
+        Returns:
+            np.ndarray: Similitud coseno (0-1) para cada par consulta/artículo.
+        """
+        if len(consultas) == 0:
+            return np.zeros(0)
+        # Las filas de TF-IDF ya están normalizadas (L2), así que el coseno es el producto escalar
+        vectores = self.vectorizador.transform(consultas)
+        return np.asarray(vectores.multiply(self.filas(posiciones)).sum(axis=1)).ravel()
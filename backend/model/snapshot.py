@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pickle
+import struct
+import time
+
+
+# Se incrementa cuando cambia el contenido o el formato del snapshot (obliga a reconstruirlo)
+VERSION_SNAPSHOT = 2
+MAGIC_SNAPSHOT = b"SNAPCAT1"
+# Alineación de los buffers dentro del archivo (para que numpy los use directamente)
+ALINEACION = 64
+
+
+def _alinear(posicion: int) -> int:
+    return (posicion + ALINEACION - 1) // ALINEACION * ALINEACION
+
+
+def escribir_snapshot(ruta: str, contenido) -> None:
+    """
+    Serializa `contenido` con pickle (protocolo 5) sacando los arrays de numpy/scipy fuera de banda.
+
+    Formato: MAGIC, número de buffers, tabla (desplazamiento, longitud) de cada buffer y del pickle,
+    y a continuación los datos, cada bloque alineado a 64 bytes. Se escribe en un temporal y se renombra.
+    """
+    buffers = []
+    datos = pickle.dumps(contenido, protocol=5, buffer_callback=buffers.append)
+    vistas = [buffer.raw() for buffer in buffers] + [memoryview(datos)]
+    cabecera = len(MAGIC_SNAPSHOT) + 8 + 16 * len(vistas)
+    tabla, posicion = [], _alinear(cabecera)
+    for vista in vistas:
+        tabla.append((posicion, vista.nbytes))
+        posicion = _alinear(posicion + vista.nbytes)
+
+    ruta_tmp = f"{ruta}.tmp"
+    with open(ruta_tmp, "wb") as f:
+        f.write(MAGIC_SNAPSHOT)
+        f.write(struct.pack("<Q", len(buffers)))
+        for desplazamiento, longitud in tabla:
+            f.write(struct.pack("<QQ", desplazamiento, longitud))
+        for (desplazamiento, _), vista in zip(tabla, vistas):
+            f.write(b"\0" * (desplazamiento - f.tell()))
+            f.write(vista)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(ruta_tmp, ruta)
+
+
+def leer_snapshot(ruta: str):
+    """
+    Carga un snapshot escrito con `escribir_snapshot` mapeando el archivo en memoria: los arrays
+    quedan como vistas de solo lectura sobre el mapa, sin copiarlos.
+    """
+    with open(ruta, "rb") as f:
+        mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapa[:len(MAGIC_SNAPSHOT)] != MAGIC_SNAPSHOT:
+        raise ValueError(f"{ruta} no es un snapshot del catálogo")
+    posicion = len(MAGIC_SNAPSHOT)
+    num_buffers = struct.unpack_from("<Q", mapa, posicion)[0]
+    posicion += 8
+    tabla = [struct.unpack_from("<QQ", mapa, posicion + 16 * i) for i in range(num_buffers + 1)]
+    vista = memoryview(mapa)
+    buffers = [vista[desplazamiento:desplazamiento + longitud] for desplazamiento, longitud in tabla[:-1]]
+    desplazamiento, longitud = tabla[-1]
+    return pickle.loads(vista[desplazamiento:desplazamiento + longitud], buffers=buffers)
+
+
+class SnapshotCatalogo:
+    """
+    Snapshot binario del catálogo ya preparado: descripciones normalizadas, índice de búsqueda,
+    modelo de similitud, tablas de búsqueda por CodArticle e imágenes ya decodificadas.
+
+    Se guarda con pickle (protocolo 5) y los arrays de numpy/scipy fuera de banda en el mismo archivo,
+    que se mapea en memoria al cargar: los objetos de Python se reconstruyen con el unpickler nativo
+    y los arrays se usan directamente desde el mapa, sin copiarlos.
+
+    Junto al snapshot se guarda un JSON con la huella (sha256) de los archivos de origen y su tamaño
+    y fecha; si no han cambiado ni siquiera se vuelven a leer. Solo se reconstruye cuando cambia el
+    contenido de alguna fuente o la versión del snapshot.
+    """
+
+    def __init__(self, ruta: str, fuentes: list):
+        self.ruta = ruta
+        self.ruta_meta = f"{ruta}.json"
+        self.fuentes = list(fuentes)
+
+    def _leer_meta(self) -> dict:
+        if not os.path.exists(self.ruta_meta):
+            return {}
+        try:
+            with open(self.ruta_meta, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"[snapshot] No se pudo leer {self.ruta_meta}: {e}")
+            return {}
+
+    def _estado_fuentes(self) -> dict:
+        estado = {}
+        for ruta in self.fuentes:
+            if os.path.exists(ruta):
+                stat = os.stat(ruta)
+                estado[ruta] = [stat.st_size, stat.st_mtime_ns]
+            else:
+                estado[ruta] = None
+        return estado
+
+    def _calcular_huella(self) -> str:
+        huella = hashlib.sha256(f"v{VERSION_SNAPSHOT}".encode("utf-8"))
+        for ruta in self.fuentes:
+            huella.update(os.path.basename(ruta).encode("utf-8") + b"\0")
+            if not os.path.exists(ruta):
+                continue
+            with open(ruta, "rb") as f:
+                for bloque in iter(lambda: f.read(1024 * 1024), b""):
+                    huella.update(bloque)
+        return huella.hexdigest()
+
+    def huella(self, meta: dict = None) -> str:
+        """
+        Huella de las fuentes. Si su tamaño y fecha coinciden con los del snapshot guardado se reutiliza
+        la huella guardada sin leer los archivos.
+        """
+        meta = self._leer_meta() if meta is None else meta
+        if meta.get("version") == VERSION_SNAPSHOT and meta.get("fuentes") == self._estado_fuentes():
+            return meta["huella"]
+        return self._calcular_huella()
+
+    def cargar_o_construir(self, construir) -> dict:
+        """
+        Carga el snapshot si corresponde a las fuentes actuales; si no, lo construye y lo guarda.
+
+        Args:
+            construir (callable): Función sin argumentos que devuelve el diccionario a guardar.
+
+        Returns:
+            dict: Contenido del snapshot, con la clave "huella" añadida.
+        """
+        meta = self._leer_meta()
+        huella = self.huella(meta)
+        if meta.get("huella") == huella and os.path.exists(self.ruta):
+            inicio = time.perf_counter()
+            try:
+                contenido = leer_snapshot(self.ruta)
+                # Las fuentes no han cambiado aunque su fecha sí: se actualiza la fecha para no volver a leerlas
+                if meta.get("fuentes") != self._estado_fuentes():
+                    self._guardar_meta(huella)
+                logging.info(f"[snapshot] Catálogo cargado desde {self.ruta} en {time.perf_counter() - inicio:.2f}s")
+                contenido["huella"] = huella
+                return contenido
+            except Exception as e:
+                logging.error(f"[snapshot] Error al cargar {self.ruta}: {e}. Se reconstruye.")
+
+        inicio = time.perf_counter()
+        contenido = construir()
+        self.guardar(contenido, huella)
+        logging.info(f"[snapshot] Catálogo construido y guardado en {self.ruta} en {time.perf_counter() - inicio:.2f}s")
+        contenido["huella"] = huella
+        return contenido
+
+    def guardar(self, contenido: dict, huella: str = None) -> None:
+        """Guarda el snapshot (escritura atómica) y su JSON de metadatos."""
+        huella = huella or self._calcular_huella()
+        escribir_snapshot(self.ruta, contenido)
+        self._guardar_meta(huella)
+
+    def _guardar_meta(self, huella: str) -> None:
+        ruta_tmp = f"{self.ruta_meta}.tmp"
+        with open(ruta_tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": VERSION_SNAPSHOT,
+                "huella": huella,
+                "fuentes": self._estado_fuentes(),
+                "creado": time.time(),
+            }, f, indent=4)
+        os.replace(ruta_tmp, self.ruta_meta)
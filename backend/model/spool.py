@@ -0,0 +1,244 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+
+# Tipo MIME según la extensión del adjunto
+MIMETYPES_AUDIO = {".mp3": "audio/mpeg", ".mp4": "audio/mp4"}
+
+
+class SpoolAudio:
+    """
+    Almacén en disco de los adjuntos de audio, direccionado por contenido.
+
+    Cada audio se guarda una sola vez en `<directorio>/objetos/<sha256[:2]>/<sha256>` y un índice
+    relaciona cada (correo, adjunto) con su hash, de modo que las predicciones solo llevan la
+    referencia (el hash) y no el audio. Los audios más antiguos que `retencion` segundos se
+    eliminan, y si el total supera `max_bytes` se eliminan los más antiguos hasta quedar por debajo.
+
+    El índice es un archivo JSONL de solo anexado: cada `guardar` añade una línea y `purgar` lo
+    reescribe compactado. Solo escribe un proceso (el de ingesta); los demás lo abren con
+    `solo_lectura=True` y leen las líneas nuevas cuando no encuentran una referencia.
+    """
+
+    def __init__(self, directorio: str, max_bytes: int = 2 * 1024 * 1024 * 1024, retencion: int = 30 * 86400,
+                 solo_lectura: bool = False):
+        self.directorio = directorio
+        self.directorio_objetos = os.path.join(directorio, "objetos")
+        self.ruta_indice = os.path.join(directorio, "indice.jsonl")
+        self.max_bytes = max_bytes
+        self.retencion = retencion
+        self.solo_lectura = solo_lectura
+        self._lock = threading.Lock()
+        # {hash: {"nombre", "tamano", "guardado", "adjuntos": ["correo/adjunto", ...]}}
+        self.objetos = {}
+        # {"correo/adjunto": hash}
+        self.adjuntos = {}
+        # Posición leída del índice (inodo, bytes) y líneas que tiene, para saber cuándo compactarlo
+        self._posicion = (None, 0)
+        self._lineas = 0
+        os.makedirs(self.directorio_objetos, exist_ok=True)
+        self._cargar_indice()
+        if not solo_lectura:
+            self._migrar_indice_json()
+
+    @staticmethod
+    def _clave(correo_id: str, adjunto_id: str) -> str:
+        return f"{correo_id}/{adjunto_id}"
+
+    def _ruta_objeto(self, referencia: str) -> str:
+        return os.path.join(self.directorio_objetos, referencia[:2], referencia)
+
+    def _cargar_indice(self) -> None:
+        """Lee el índice completo, descartando las entradas cuyo archivo ya no existe."""
+        self.objetos, self.adjuntos = {}, {}
+        self._posicion, self._lineas = (None, 0), 0
+        self._leer_lineas_nuevas()
+        ausentes = [referencia for referencia in self.objetos if not os.path.exists(self._ruta_objeto(referencia))]
+        for referencia in ausentes:
+            self._quitar(referencia)
+
+    def _leer_lineas_nuevas(self) -> None:
+        """Aplica las líneas completas añadidas al índice desde la última lectura."""
+        try:
+            stat = os.stat(self.ruta_indice)
+        except FileNotFoundError:
+            return
+        inodo, desplazamiento = self._posicion
+        if inodo is not None and (stat.st_ino != inodo or stat.st_size < desplazamiento):
+            # El índice se ha compactado desde la última lectura: se vuelve a leer entero
+            self._cargar_indice()
+            return
+        if stat.st_size == desplazamiento:
+            return
+        try:
+            with open(self.ruta_indice, "rb") as f:
+                f.seek(desplazamiento)
+                contenido = f.read(stat.st_size - desplazamiento)
+        except OSError as e:
+            logging.error(f"[spool] Error al leer {self.ruta_indice}: {e}")
+            return
+        # Solo se consumen líneas completas; una a medias se leerá en la siguiente llamada
+        completo = contenido[:contenido.rfind(b"\n") + 1]
+        for linea in completo.decode("utf-8").splitlines():
+            try:
+                self._aplicar(json.loads(linea))
+            except (json.JSONDecodeError, KeyError, TypeError):
+                logging.warning(f"[spool] Entrada dañada en {self.ruta_indice}, se ignora")
+            self._lineas += 1
+        self._posicion = (stat.st_ino, desplazamiento + len(completo))
+
+    def _aplicar(self, entrada: dict) -> None:
+        referencia = entrada["ref"]
+        if entrada.get("eliminado"):
+            self._quitar(referencia)
+            return
+        objeto = self.objetos.setdefault(
+            referencia, {"nombre": entrada["nombre"], "tamano": entrada["tamano"], "guardado": entrada["guardado"], "adjuntos": []}
+        )
+        for clave in entrada["adjuntos"]:
+            if clave not in objeto["adjuntos"]:
+                objeto["adjuntos"].append(clave)
+            self.adjuntos[clave] = referencia
+
+    def _quitar(self, referencia: str) -> None:
+        objeto = self.objetos.pop(referencia, None)
+        if objeto is not None:
+            for clave in objeto["adjuntos"]:
+                self.adjuntos.pop(clave, None)
+
+    def _anexar(self, entrada: dict) -> None:
+        """Añade una línea al índice (una única escritura en modo append, que no se mezcla con otras)."""
+        with open(self.ruta_indice, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        self._lineas += 1
+        self._avanzar_posicion()
+
+    def _compactar_indice(self) -> None:
+        """Reescribe el índice con una línea por audio (escritura atómica)."""
+        ruta_tmp = f"{self.ruta_indice}.tmp"
+        with open(ruta_tmp, "w", encoding="utf-8") as f:
+            for referencia, objeto in self.objetos.items():
+                f.write(json.dumps({"ref": referencia, **objeto}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta_tmp, self.ruta_indice)
+        self._lineas = len(self.objetos)
+        self._avanzar_posicion()
+
+    def _avanzar_posicion(self) -> None:
+        """Tras escribir, lo leído llega hasta el final del índice (el proceso que escribe no lo relee)."""
+        stat = os.stat(self.ruta_indice)
+        self._posicion = (stat.st_ino, stat.st_size)
+
+    def _migrar_indice_json(self) -> None:
+        """Pasa al índice JSONL el índice JSON de versiones anteriores, si existe."""
+        ruta_antigua = os.path.join(self.directorio, "indice.json")
+        if not os.path.exists(ruta_antigua):
+            return
+        try:
+            with open(ruta_antigua, "r", encoding="utf-8") as f:
+                objetos = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"[spool] Error al leer {ruta_antigua}: {e}. Se descarta.")
+            objetos = {}
+        for referencia, objeto in objetos.items():
+            if os.path.exists(self._ruta_objeto(referencia)):
+                self._aplicar({"ref": referencia, **objeto})
+        self._compactar_indice()
+        os.remove(ruta_antigua)
+
+    def _comprobar_escritura(self) -> None:
+        if self.solo_lectura:
+            raise RuntimeError("El spool de audio está abierto en solo lectura: solo escribe el proceso de ingesta")
+
+    def __len__(self):
+        return len(self.objetos)
+
+    def bytes_totales(self) -> int:
+        return sum(objeto["tamano"] for objeto in self.objetos.values())
+
+    def buscar(self, correo_id: str, adjunto_id: str):
+        """Devuelve la referencia del adjunto si ya está en el spool (para no volver a descargarlo)."""
+        return self.adjuntos.get(self._clave(correo_id, adjunto_id))
+
+    def guardar(self, correo_id: str, adjunto_id: str, contenido: bytes, nombre: str) -> str:
+        """
+        Guarda el audio (si no estaba ya) y lo asocia al correo y adjunto.
+
+        Returns:
+            str: Referencia del audio (sha256 del contenido).
+        """
+        self._comprobar_escritura()
+        referencia = hashlib.sha256(contenido).hexdigest()
+        ruta = self._ruta_objeto(referencia)
+        if not os.path.exists(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            ruta_tmp = f"{ruta}.{threading.get_ident()}.tmp"
+            with open(ruta_tmp, "wb") as f:
+                f.write(contenido)
+            os.replace(ruta_tmp, ruta)
+        clave = self._clave(correo_id, adjunto_id)
+        with self._lock:
+            if self.adjuntos.get(clave) != referencia:
+                entrada = {"ref": referencia, "nombre": nombre, "tamano": len(contenido), "guardado": time.time(),
+                           "adjuntos": [clave]}
+                self._aplicar(entrada)
+                self._anexar(entrada)
+        return referencia
+
+    def obtener(self, referencia: str):
+        """
+        Devuelve (ruta, nombre, mimetype) del audio, o None si no está en el spool.
+        """
+        objeto = self.objetos.get(referencia)
+        if objeto is None and _es_referencia(referencia) and os.path.exists(self._ruta_objeto(referencia)):
+            # Lo ha guardado otro proceso (el de ingesta): se leen las líneas nuevas del índice
+            with self._lock:
+                self._leer_lineas_nuevas()
+            objeto = self.objetos.get(referencia)
+        ruta = self._ruta_objeto(referencia) if objeto else None
+        if ruta is None or not os.path.exists(ruta):
+            return None
+        extension = os.path.splitext(objeto["nombre"])[1].lower()
+        return ruta, objeto["nombre"], MIMETYPES_AUDIO.get(extension, "audio/mp4")
+
+    def purgar(self) -> int:
+        """
+        Aplica la política de retención: elimina los audios caducados y, si el spool sigue por encima
+        de `max_bytes`, los más antiguos. Después compacta el índice si ha cambiado o si tiene más
+        líneas que el doble de audios.
+
+        Returns:
+            int: Número de audios eliminados.
+        """
+        self._comprobar_escritura()
+        limite = time.time() - self.retencion
+        with self._lock:
+            por_antiguedad = sorted(self.objetos.items(), key=lambda item: item[1]["guardado"])
+            total = sum(objeto["tamano"] for _, objeto in por_antiguedad)
+            eliminados = []
+            for referencia, objeto in por_antiguedad:
+                if objeto["guardado"] >= limite and total <= self.max_bytes:
+                    break
+                eliminados.append(referencia)
+                total -= objeto["tamano"]
+            for referencia in eliminados:
+                self._quitar(referencia)
+                try:
+                    os.remove(self._ruta_objeto(referencia))
+                except OSError as e:
+                    logging.error(f"[spool] Error eliminando el audio {referencia}: {e}")
+            if eliminados or self._lineas > 2 * len(self.objetos):
+                self._compactar_indice()
+        if eliminados:
+            logging.info(f"[spool] Eliminados {len(eliminados)} audios; quedan {len(self.objetos)} ({total} bytes)")
+        return len(eliminados)
+
+
+def _es_referencia(referencia: str) -> bool:
+    """Una referencia válida es un sha256 en hexadecimal (evita construir rutas con texto arbitrario)."""
+    return len(referencia) == 64 and all(c in "0123456789abcdef" for c in referencia)
@@ -0,0 +1,65 @@
+import pytest
+
+from buscador import MODO_DIFFLIB, MODO_INDICE, MODO_VERIFICAR, MotorBusqueda
+
+
+CATALOGO = [
+    "TUBO PE 16MM",
+    "TUBO PE 20MM",
+    "TUBO PVC 20MM",
+    "CODO PVC 20MM",
+    "CODO PVC 25MM",
+    "VALVULA BOLA 1/2",
+    "VALVULA BOLA 3/4",
+    "GRIFO LATON 1/2",
+    "TE PVC 32MM",
+    "MANGUITO PE 16MM",
+]
+# Añadida después de construir el índice, como una confirmación pendiente de fusionar
+DELTA = [("GOTERO AUTOCOMPENSANTE 4L", len(CATALOGO))]
+
+CONSULTAS = [
+    "TUBO PE 16",
+    "CODO PVC 25",
+    "VALVULA BOLA 3 4",
+    "GRIFO LATON",
+    "GOTERO AUTOCOMPENSANTE",
+    "XYZ QWERTY",
+]
+
+
+def crear_motor(modo, max_candidatos=3):
+    # Pocos candidatos para que la preselección del índice descarte de verdad parte del catálogo
+    return MotorBusqueda(CATALOGO, modo=modo, max_candidatos=max_candidatos).con_delta(DELTA)
+
+
+# Con n > 1 hacen falta más candidatos que coincidencias pedidas, como en producción (300 frente a 1)
+@pytest.mark.parametrize("n, max_candidatos", [(1, 3), (3, 300)])
+def test_el_indice_devuelve_lo_mismo_que_difflib(n, max_candidatos):
+    indice, referencia = crear_motor(MODO_INDICE, max_candidatos), crear_motor(MODO_DIFFLIB, max_candidatos)
+    resultados = indice.buscar_lote(CONSULTAS, n=n, cutoff=0.5)
+
+    assert resultados == referencia.buscar_lote(CONSULTAS, n=n, cutoff=0.5)
+    assert resultados == [indice.buscar(consulta, n=n, cutoff=0.5) for consulta in CONSULTAS]
+    assert resultados[0][0] == "TUBO PE 16MM"
+    assert resultados[4] == ["GOTERO AUTOCOMPENSANTE 4L"]
+    assert resultados[5] == []
+
+
+def test_la_delta_conserva_su_posicion_y_no_cambia_el_motor_original():
+    base = MotorBusqueda(CATALOGO, modo=MODO_INDICE, max_candidatos=3)
+    motor = base.con_delta(DELTA + [("TUBO PE 16MM", 99)])
+
+    assert motor.posicion("GOTERO AUTOCOMPENSANTE 4L") == len(CATALOGO)
+    # Una descripción que ya estaba en la base conserva su primera posición
+    assert motor.posicion("TUBO PE 16MM") == 0
+    assert len(motor) == len(CATALOGO) + 1
+    assert len(base) == len(CATALOGO)
+    assert base.buscar("GOTERO AUTOCOMPENSANTE") == []
+
+
+def test_el_modo_verificar_no_encuentra_discrepancias():
+    motor = crear_motor(MODO_VERIFICAR)
+    motor.buscar_lote(CONSULTAS, n=1, cutoff=0.5)
+    assert motor.verificaciones == len(CONSULTAS)
+    assert motor.discrepancias == 0
@@ -0,0 +1,90 @@
+import sqlite3
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from conexion import _esquema, _tabla, extraer_articulos
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE articulos (CodArticle TEXT, Description TEXT, IDArticle INTEGER, Image BLOB, "
+        "InactiveDate TEXT, CodCompany TEXT, ModificationDate TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO articulos VALUES (?, ?, ?, ?, NULL, '1', ?)",
+        [
+            ("A1", "TUBO PE 16MM", 1, b"\x89PNG", "2026-10-01 10:00:00"),
+            ("A2", "CODO PVC 20MM", 2, None, "2026-10-01 10:00:00"),
+            ("A3", "VALVULA BOLA", 3, None, "2026-10-02 09:00:00"),
+        ],
+    )
+    yield conn
+    conn.close()
+
+
+def leer(ruta):
+    filas = pq.read_table(ruta).to_pylist()
+    return {fila["CodArticle"]: fila for fila in filas}
+
+
+def test_completo_sin_incremental_no_consulta_la_marca_de_agua(conn, tmp_path):
+    conn.execute("CREATE TABLE sin_marca AS SELECT CodArticle, Description, IDArticle, Image, InactiveDate, CodCompany FROM articulos")
+    ruta = str(tmp_path / "art.parquet")
+    resultado = extraer_articulos(conn, ruta, tam_bloque=2, tabla="sin_marca")
+    assert resultado["modo"] == "completo"
+    assert resultado["filas"] == 3
+    assert leer(ruta)["A1"]["Image"] == b"\x89PNG"
+    assert not (tmp_path / "art.parquet.estado.json").exists()
+
+
+def test_incremental_no_pierde_filas_con_la_misma_fecha_que_la_marca(conn, tmp_path):
+    ruta = str(tmp_path / "art.parquet")
+    assert extraer_articulos(conn, ruta, tam_bloque=2, incremental=True, tabla="articulos")["modo"] == "completo"
+
+    # Confirmado después de la extracción, pero con la misma fecha que la marca de agua
+    conn.execute("INSERT INTO articulos VALUES ('A4', 'GRIFO LATON', 4, NULL, NULL, '1', '2026-10-02 09:00:00')")
+    conn.execute("UPDATE articulos SET Description = 'CODO PVC 25MM', ModificationDate = '2026-10-03 08:00:00' WHERE CodArticle = 'A2'")
+    conn.execute("UPDATE articulos SET InactiveDate = '2026-10-03', ModificationDate = '2026-10-03 08:00:00' WHERE CodArticle = 'A1'")
+    resultado = extraer_articulos(conn, ruta, tam_bloque=2, incremental=True, tabla="articulos")
+
+    assert resultado["modo"] == "incremental"
+    assert resultado["marca_agua"] == "2026-10-03 08:00:00"
+    articulos = leer(ruta)
+    assert sorted(articulos) == ["A2", "A3", "A4"]
+    assert articulos["A2"]["Description"] == "CODO PVC 25MM"
+    assert resultado["filas"] == 3
+
+    # Sin cambios, las filas con la fecha de la marca se vuelven a pedir pero no se duplican
+    resultado = extraer_articulos(conn, ruta, tam_bloque=2, incremental=True, tabla="articulos")
+    assert resultado["filas"] == 3
+    assert sorted(pq.read_table(ruta).column("CodArticle").to_pylist()) == ["A2", "A3", "A4"]
+
+
+def test_completo_admite_decimales_despues_de_un_primer_bloque_de_enteros(conn, tmp_path):
+    conn.execute("UPDATE articulos SET IDArticle = 3.5 WHERE CodArticle = 'A3'")
+    ruta = str(tmp_path / "art.parquet")
+    # El primer bloque (A1, A2) solo trae enteros; el segundo (A3), un decimal
+    resultado = extraer_articulos(conn, ruta, tam_bloque=2, tabla="articulos")
+    assert resultado["filas"] == 3
+    articulos = leer(ruta)
+    assert [articulos[codigo]["IDArticle"] for codigo in ("A1", "A2", "A3")] == [1, 2, 3.5]
+
+
+def test_esquema_usa_el_tipo_de_cursor_description():
+    columnas = ["CodArticle", "Description", "IDArticle", "Image"]
+    # Como pyodbc: el tipo de Python de cada columna, aunque el bloque de muestra solo traiga enteros
+    descripcion = [("CodArticle", str), ("Description", str), ("IDArticle", Decimal), ("Image", bytearray)]
+    esquema = _esquema(columnas, descripcion, [("A1", "TUBO", 1, None)])
+    assert esquema.field("IDArticle").type == pa.float64()
+    assert esquema.field("CodArticle").type == pa.string()
+
+    tabla = _tabla([("A2", "CODO", Decimal("2.5"), bytearray(b"\x89PNG"))], esquema)
+    assert tabla.to_pylist() == [{"CodArticle": "A2", "Description": "CODO", "IDArticle": 2.5, "Image": b"\x89PNG"}]
+
+    descripcion[2] = ("IDArticle", int)
+    assert _esquema(columnas, descripcion, []).field("IDArticle").type == pa.int64()
@@ -0,0 +1,89 @@
+import json
+
+import joblib
+import pytest
+
+import diario
+from diario import DiarioConfirmaciones
+
+
+class Caida(BaseException):
+    """Simula que el proceso muere (no la captura el `except Exception` de la compactación)."""
+
+
+def crear_diario(tmp_path, umbral=1000):
+    return DiarioConfirmaciones(
+        str(tmp_path / "confirmadas.joblib"), str(tmp_path / "confirmadas.json"),
+        str(tmp_path / "confirmadas.diario.jsonl"), umbral_compactacion=umbral,
+    )
+
+
+def escribir_diario(ruta, confirmaciones):
+    with open(ruta, "w", encoding="utf-8") as f:
+        for descripcion, codigo in confirmaciones.items():
+            f.write(json.dumps({"descripcion": descripcion, "codigo": codigo}) + "\n")
+
+
+def test_caida_al_completar_compactacion_pendiente_no_pierde_entradas(tmp_path, monkeypatch):
+    registro = crear_diario(tmp_path)
+    joblib.dump({"a": 1}, registro.ruta_snapshot)
+    escribir_diario(registro.ruta_diario_rotado, {"b": 2})
+    escribir_diario(registro.ruta_diario, {"c": 3})
+
+    def caer(ruta, escribir):
+        raise Caida()
+
+    monkeypatch.setattr(diario, "_escritura_atomica", caer)
+    with pytest.raises(Caida):
+        registro.cargar()
+    monkeypatch.undo()
+
+    assert crear_diario(tmp_path).cargar() == {"a": 1, "b": 2, "c": 3}
+
+
+def test_cargar_completa_la_compactacion_y_vacia_los_diarios(tmp_path):
+    registro = crear_diario(tmp_path)
+    joblib.dump({"a": 1}, registro.ruta_snapshot)
+    escribir_diario(registro.ruta_diario_rotado, {"b": 2})
+    escribir_diario(registro.ruta_diario, {"c": 3, "a": 4})
+
+    assert registro.cargar() == {"a": 4, "b": 2, "c": 3}
+    assert joblib.load(registro.ruta_snapshot) == {"a": 4, "b": 2, "c": 3}
+    assert not (tmp_path / "confirmadas.diario.jsonl").exists()
+    assert not (tmp_path / "confirmadas.diario.jsonl.compactando").exists()
+
+
+def test_rotar_con_diario_rotado_pendiente_anade_en_lugar_de_sustituir(tmp_path, monkeypatch):
+    registro = crear_diario(tmp_path, umbral=1)
+    escribir_diario(registro.ruta_diario_rotado, {"b": 2})
+    # La compactación en segundo plano falla, así que el diario rotado se queda
+    monkeypatch.setattr(registro, "_volcar_snapshot", lambda confirmaciones: False)
+    registro.registrar("c", 3, {"b": 2, "c": 3})
+    registro._compactacion.join()
+
+    assert crear_diario(tmp_path).cargar() == {"b": 2, "c": 3}
+
+
+def test_leer_no_pierde_entradas_si_se_compacta_a_mitad_de_lectura(tmp_path, monkeypatch):
+    escritor = crear_diario(tmp_path)
+    joblib.dump({"a": 1}, escritor.ruta_snapshot)
+    escribir_diario(escritor.ruta_diario_rotado, {"b": 2})
+    escribir_diario(escritor.ruta_diario, {"c": 3})
+    lector = crear_diario(tmp_path)
+
+    reaplicar = DiarioConfirmaciones._reaplicar
+    compactado = []
+
+    def reaplicar_con_compactacion(ruta, confirmaciones):
+        # La compactación del proceso de ingesta termina justo después de leer el snapshot
+        if ruta == escritor.ruta_diario_rotado and not compactado:
+            compactado.append(True)
+            escritor._volcar_snapshot({"a": 1, "b": 2})
+        return reaplicar(ruta, confirmaciones)
+
+    monkeypatch.setattr(DiarioConfirmaciones, "_reaplicar", staticmethod(reaplicar_con_compactacion))
+    confirmaciones, posicion = lector.leer_con_posicion()
+
+    assert compactado
+    assert confirmaciones == {"a": 1, "b": 2, "c": 3}
+    assert posicion == lector.posicion()
@@ -0,0 +1,81 @@
+import pandas as pd
+
+from buscador import MotorBusqueda
+from catalogo import CatalogoIncremental, CatalogoPaginado
+from estado import EstadoModelo
+from similitud import ModeloSimilitud
+
+
+def crear_estado(confirmaciones):
+    df = pd.DataFrame({
+        "Description": ["TUBO PE 16MM", "CODO PVC 20MM"],
+        "CodArticle": ["A1", "A2"],
+        "Description_Procesada": ["tubo pe 16mm", "codo pvc 20mm"],
+    })
+    return EstadoModelo(
+        catalogo=CatalogoIncremental(df),
+        motor_busqueda=MotorBusqueda(df["Description_Procesada"].tolist()),
+        modelo_similitud=ModeloSimilitud(df["Description_Procesada"].tolist()),
+        indice_df={}, indice_lookup={}, df_lookup=df,
+        catalogo_paginado=CatalogoPaginado(df, "prueba"),
+        confirmaciones=confirmaciones,
+    )
+
+
+def test_correcciones_no_copian_la_base_y_tienen_preferencia():
+    base = {"tubo pe 16mm": "A1", "codo pvc 20mm": "A2"}
+    estado = crear_estado(base)
+    nuevo = estado.con_correcciones([("Codo PVC 20", "codo pvc 20mm", "A9"), ("Grifo", "grifo", "A3")])
+
+    assert nuevo.confirmaciones is base
+    assert base == {"tubo pe 16mm": "A1", "codo pvc 20mm": "A2"}
+    assert nuevo.confirmacion("codo pvc 20mm") == "A9"
+    assert nuevo.confirmacion("grifo") == "A3"
+    assert nuevo.confirmacion("tubo pe 16mm") == "A1"
+    assert nuevo.confirmacion("valvula") is None
+    assert estado.confirmacion("codo pvc 20mm") == "A2"
+    assert dict(nuevo.vista_confirmaciones()) == {"tubo pe 16mm": "A1", "codo pvc 20mm": "A9", "grifo": "A3"}
+
+
+def test_con_base_fusiona_las_confirmaciones_y_conserva_las_posteriores():
+    estado = crear_estado({"tubo pe 16mm": "A1"}).con_correcciones([("Grifo", "grifo", "A3")])
+    fusionadas = {**estado.confirmaciones, **estado.confirmaciones_delta}
+    # Llega otra corrección mientras se fusiona
+    actual = estado.con_correcciones([("Tubo PE 16", "tubo pe 16mm", "A7")])
+
+    fusionado = actual.con_base(
+        actual.catalogo.fusionado(len(estado.catalogo.delta)), actual.motor_busqueda, actual.modelo_similitud,
+        {}, actual.catalogo.delta[len(estado.catalogo.delta):], fusionadas,
+    )
+    assert fusionado.confirmaciones == {"tubo pe 16mm": "A1", "grifo": "A3"}
+    assert fusionado.confirmaciones_delta == {"tubo pe 16mm": "A7"}
+    assert fusionado.confirmacion("tubo pe 16mm") == "A7"
+    assert fusionado.confirmacion("grifo") == "A3"
+
+
+def test_correccion_durante_la_fusion_sigue_encontrandose_y_confirmada():
+    estado = crear_estado({"tubo pe 16mm": "A1"}).con_correcciones([("Grifo latón", "grifo laton", "A3")])
+    # La fusión trabaja sobre la versión que había al empezar, como fusionar_delta
+    n = len(estado.catalogo.delta)
+    catalogo = estado.catalogo.fusionado(n)
+    motor = MotorBusqueda(catalogo.base["Description_Procesada"].tolist())
+    similitud = estado.modelo_similitud.fusionado(n)
+    indice = {**estado.indice_df, **estado.indice_delta}
+    confirmaciones = {**estado.confirmaciones, **estado.confirmaciones_delta}
+
+    # Llega otra corrección entre fusionado(n) y con_base
+    actual = estado.con_correcciones([("Codo PVC 25", "codo pvc 25mm", "A4")])
+    nuevo = actual.con_base(catalogo, motor, similitud, indice, actual.catalogo.delta[n:], confirmaciones)
+
+    assert len(nuevo.catalogo.base) == 3
+    assert [fila["CodArticle"] for fila in nuevo.catalogo.delta] == ["A4"]
+    assert nuevo.motor_busqueda.buscar("codo pvc 25mm") == ["codo pvc 25mm"]
+    assert nuevo.motor_busqueda.buscar("grifo laton") == ["grifo laton"]
+    posicion = nuevo.motor_busqueda.posicion("codo pvc 25mm")
+    assert posicion == 3
+    assert nuevo.catalogo.fila(posicion)["CodArticle"] == "A4"
+    assert nuevo.registro_df("A4")["posicion"] == 3
+    assert nuevo.modelo_similitud.similitud_lote(["codo pvc 25mm"], [posicion])[0] > 0.99
+    assert nuevo.confirmacion("codo pvc 25mm") == "A4"
+    assert nuevo.confirmacion("grifo laton") == "A3"
+    assert nuevo.confirmaciones_delta == {"codo pvc 25mm": "A4"}
@@ -0,0 +1,180 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from graph_cliente import ClienteGraph
+
+
+@pytest.fixture
+def servidor():
+    """
+    Servidor HTTP local. Cada test le asigna `servidor.responder(manejador)`, una función que recibe
+    el manejador de la petición y devuelve (estado, cuerpo JSON, cabeceras).
+    """
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _atender(self):
+            longitud = int(self.headers.get("Content-Length") or 0)
+            self.cuerpo = json.loads(self.rfile.read(longitud)) if longitud else None
+            estado, datos, cabeceras = http.responder(self)
+            contenido = json.dumps(datos).encode("utf-8")
+            self.send_response(estado)
+            for clave, valor in {"Content-Type": "application/json", **cabeceras}.items():
+                self.send_header(clave, valor)
+            self.send_header("Content-Length", str(len(contenido)))
+            self.end_headers()
+            self.wfile.write(contenido)
+
+        do_GET = do_POST = do_PATCH = _atender
+
+        def log_message(self, formato, *args):
+            pass
+
+    http = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+    http.daemon_threads = True
+    http.url = f"http://127.0.0.1:{http.server_address[1]}/v1.0"
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    yield http
+    http.shutdown()
+
+
+def crear_cliente(url, **kwargs):
+    return ClienteGraph(None, None, None, [], base_url=url, token_fijo="prueba", **kwargs)
+
+
+def test_timeout_de_lectura_se_reintenta(servidor):
+    llamadas = []
+
+    def responder(manejador):
+        llamadas.append(time.monotonic())
+        if len(llamadas) == 1:
+            time.sleep(0.5)
+        return 200, {"value": []}, {}
+
+    servidor.responder = responder
+    cliente = crear_cliente(servidor.url, timeout=(1.0, 0.2), espera_maxima=0.01)
+    assert cliente.get("users/u/messages").status_code == 200
+    assert len(llamadas) == 2
+    assert cliente.timeouts == 1
+    assert cliente.limitaciones == 0
+
+
+def test_timeout_agotados_los_reintentos_lanza_excepcion(servidor):
+    def responder(manejador):
+        time.sleep(0.3)
+        return 200, {}, {}
+
+    servidor.responder = responder
+    cliente = crear_cliente(servidor.url, timeout=(1.0, 0.1), max_reintentos=1, espera_maxima=0.01)
+    with pytest.raises(requests.Timeout):
+        cliente.get("users/u/messages")
+    assert cliente.errores == 1
+
+
+def peticiones_lectura(numero):
+    return [
+        {"id": str(i), "method": "PATCH", "url": f"/users/u/messages/m{i}", "body": {"isRead": True},
+         "headers": {"Content-Type": "application/json"}}
+        for i in range(numero)
+    ]
+
+
+def test_lote_agrupa_de_20_en_20_y_asocia_cada_respuesta_a_su_id(servidor):
+    lotes = []
+
+    def responder(manejador):
+        assert manejador.path.endswith("/$batch")
+        subpeticiones = manejador.cuerpo["requests"]
+        lotes.append([p["id"] for p in subpeticiones])
+        # Graph no garantiza el orden de las subrespuestas
+        respuestas = [
+            {"id": p["id"], "status": 200, "headers": {}, "body": {"url": p["url"]}}
+            for p in reversed(subpeticiones)
+        ]
+        return 200, {"responses": respuestas}, {}
+
+    servidor.responder = responder
+    cliente = crear_cliente(servidor.url)
+    resultados = cliente.lote(peticiones_lectura(45))
+
+    assert [len(lote) for lote in lotes] == [20, 20, 5]
+    assert sum(lotes, []) == [str(i) for i in range(45)]
+    assert set(resultados) == {str(i) for i in range(45)}
+    for i in range(45):
+        assert resultados[str(i)]["status"] == 200
+        assert resultados[str(i)]["body"] == {"url": f"/users/u/messages/m{i}"}
+    assert cliente.peticiones == 3
+    assert cliente.errores == 0
+
+
+def test_lote_reintenta_solo_las_subpeticiones_limitadas_tras_retry_after(servidor):
+    lotes = []
+    limitadas = set()
+
+    def responder(manejador):
+        subpeticiones = manejador.cuerpo["requests"]
+        lotes.append(([p["id"] for p in subpeticiones], time.monotonic()))
+        respuestas = []
+        for p in subpeticiones:
+            # Cada una de estas se limita solo la primera vez que llega
+            if p["id"] in ("3", "21") and p["id"] not in limitadas:
+                limitadas.add(p["id"])
+                respuestas.append({"id": p["id"], "status": 429, "headers": {"Retry-After": "0.3"},
+                                   "body": {"error": {"code": "TooManyRequests"}}})
+            else:
+                respuestas.append({"id": p["id"], "status": 200, "headers": {}, "body": None})
+        return 200, {"responses": respuestas}, {}
+
+    servidor.responder = responder
+    cliente = crear_cliente(servidor.url, espera_maxima=5)
+    resultados = cliente.lote(peticiones_lectura(25))
+
+    assert [ids for ids, _ in lotes] == [[str(i) for i in range(20)], [str(i) for i in range(20, 25)], ["3", "21"]]
+    assert lotes[2][1] - lotes[1][1] >= 0.3
+    assert all(resultado["status"] == 200 for resultado in resultados.values())
+    assert len(resultados) == 25
+    assert cliente.limitaciones == 1
+    assert cliente.errores == 0
+
+
+def test_lote_agotados_los_reintentos_cuenta_las_limitadas_como_errores(servidor):
+    def responder(manejador):
+        respuestas = [
+            {"id": p["id"], "status": 429 if p["id"] == "0" else 200, "headers": {"Retry-After": "0"}, "body": None}
+            for p in manejador.cuerpo["requests"]
+        ]
+        return 200, {"responses": respuestas}, {}
+
+    servidor.responder = responder
+    cliente = crear_cliente(servidor.url, max_reintentos=2)
+    resultados = cliente.lote(peticiones_lectura(3))
+
+    assert resultados["0"]["status"] == 429
+    assert resultados["1"]["status"] == resultados["2"]["status"] == 200
+    assert cliente.peticiones == 3
+    assert cliente.errores == 1
+
+
+def test_lote_limita_el_tiempo_total_de_reintentos_con_un_plazo_compartido(servidor):
+    llamadas = []
+
+    def responder(manejador):
+        llamadas.append(time.monotonic())
+        return 503, {"error": {"code": "ServiceUnavailable"}}, {"Retry-After": "0.2"}
+
+    servidor.responder = responder
+    # Sin plazo común serían (5 + 1) reintentos de lote × (5 + 1) peticiones de 0,2s cada uno
+    cliente = crear_cliente(servidor.url, max_reintentos=5, espera_maxima=5, tiempo_maximo_lote=0.5)
+    inicio = time.monotonic()
+    resultados = cliente.lote(peticiones_lectura(2))
+    duracion = time.monotonic() - inicio
+
+    assert duracion < 1.0
+    assert len(llamadas) <= 3
+    assert resultados["0"]["status"] == resultados["1"]["status"] == 503
+    assert cliente.errores >= 2
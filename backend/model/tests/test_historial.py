@@ -0,0 +1,82 @@
+import pytest
+
+import historial
+from historial import HistorialPredicciones
+
+
+def prediccion(i, correo_id, orden, codigo):
+    return {"descripcion": f"PRODUCTO {i}", "correo_id": correo_id, "IDWorkOrder": orden, "codigo_prediccion": codigo}
+
+
+@pytest.fixture
+def registro(tmp_path):
+    registro = HistorialPredicciones(str(tmp_path / "historial.sqlite3"), max_memoria=2)
+    registro.extend([
+        prediccion(0, "c1", 10, "A1"),
+        prediccion(1, "c1", 10, "A2"),
+        prediccion(2, "c2", 11, "A1"),
+    ])
+    registro.extend([prediccion(3, "c3", 12, "A1"), prediccion(4, "c3", 12, "A3")])
+    yield registro
+    registro.cerrar()
+
+
+def descripciones(pagina):
+    return [fila["descripcion"] for fila in pagina["data"]]
+
+
+def test_consultar_pagina_de_la_mas_reciente_a_la_mas_antigua(registro):
+    primera = registro.consultar(offset=0, limit=2)
+    assert descripciones(primera) == ["PRODUCTO 4", "PRODUCTO 3"]
+    assert (primera["total"], primera["offset"], primera["limit"]) == (5, 0, 2)
+    assert descripciones(registro.consultar(offset=2, limit=2)) == ["PRODUCTO 2", "PRODUCTO 1"]
+    assert descripciones(registro.consultar(offset=4, limit=2)) == ["PRODUCTO 0"]
+    assert registro.consultar(offset=10, limit=2) == {"data": [], "total": 5, "offset": 10, "limit": 2}
+    # En memoria solo quedan las últimas max_memoria
+    assert [p["descripcion"] for p in registro.ultimas()] == ["PRODUCTO 3", "PRODUCTO 4"]
+
+
+def test_consultar_filtra_por_valor_exacto(registro):
+    por_codigo = registro.consultar(codigo_prediccion="A1", limit=1)
+    assert por_codigo["total"] == 3
+    assert descripciones(por_codigo) == ["PRODUCTO 3"]
+    # La orden se guarda como texto: el filtro vale igual con número o con texto
+    assert descripciones(registro.consultar(IDWorkOrder=10)) == ["PRODUCTO 1", "PRODUCTO 0"]
+    assert descripciones(registro.consultar(IDWorkOrder="10", codigo_prediccion="A2")) == ["PRODUCTO 1"]
+    # Un filtro vacío no filtra
+    assert registro.consultar(correo_id="", codigo_prediccion=None)["total"] == 5
+    assert registro.consultar(correo_id="c9")["total"] == 0
+
+
+def test_consultar_rechaza_filtros_y_paginas_no_validos(registro):
+    with pytest.raises(ValueError):
+        registro.consultar(descripcion="PRODUCTO 1")
+    with pytest.raises(ValueError):
+        registro.consultar(offset=-1)
+
+
+def test_extend_elimina_las_predicciones_que_superan_el_maximo_de_filas(tmp_path):
+    registro = HistorialPredicciones(str(tmp_path / "historial.sqlite3"), max_filas=3)
+    registro.extend([prediccion(i, "c1", 10, "A1") for i in range(2)])
+    registro.extend([prediccion(i, "c1", 10, "A1") for i in range(2, 5)])
+    assert len(registro) == 3
+    assert descripciones(registro.consultar()) == ["PRODUCTO 4", "PRODUCTO 3", "PRODUCTO 2"]
+    registro.cerrar()
+
+
+def test_extend_elimina_las_predicciones_fuera_de_la_retencion(tmp_path, monkeypatch):
+    registro = HistorialPredicciones(str(tmp_path / "historial.sqlite3"), retencion=3600, max_filas=0)
+    monkeypatch.setattr(historial.time, "time", lambda: 1_000_000.0)
+    registro.extend([prediccion(0, "c1", 10, "A1"), prediccion(1, "c1", 10, "A1")])
+    monkeypatch.setattr(historial.time, "time", lambda: 1_000_000.0 + 1800)
+    registro.extend([prediccion(2, "c2", 11, "A2")])
+    assert len(registro) == 3
+
+    monkeypatch.setattr(historial.time, "time", lambda: 1_000_000.0 + 3601)
+    registro.extend([prediccion(3, "c3", 12, "A3")])
+    assert descripciones(registro.consultar()) == ["PRODUCTO 3", "PRODUCTO 2"]
+
+    monkeypatch.setattr(historial.time, "time", lambda: 1_000_000.0 + 3600 + 1801)
+    assert registro.purgar() == 1
+    assert descripciones(registro.consultar()) == ["PRODUCTO 3"]
+    registro.cerrar()
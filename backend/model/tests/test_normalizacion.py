@@ -0,0 +1,77 @@
+import random
+import re
+import unicodedata
+
+import pytest
+
+from normalizacion import SINONIMOS, STOP_WORDS, procesar_texto
+
+
+def procesar_texto_referencia(texto: str) -> str:
+    """Implementación original de procesar_texto, sin precompilar ni caché."""
+    texto = texto.lower()
+    texto = str(texto)
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("utf-8")
+    texto = re.sub(r"[^\w\s]", "", texto, flags=re.UNICODE)
+    texto = re.sub(r"\b(\w+)(es|s)\b", r"\1", texto)
+    palabras = texto.split()
+    palabras = [palabra for palabra in palabras if palabra not in STOP_WORDS]
+    texto_procesado = " ".join(palabras)
+    for palabra, reemplazo in SINONIMOS.items():
+        texto_procesado = re.sub(rf"\b{palabra}\b", reemplazo, texto_procesado, flags=re.IGNORECASE)
+    return texto_procesado
+
+
+CASOS_LIMITE = [
+    "",
+    "   ",
+    "TUBO PVC 20MM",
+    "Tubo de polietileno por metros",
+    "pp",
+    "PP polipropileno",
+    "polipropilenos y pps",
+    "Pegamento PVC 125 mililitros",
+    "cola de contacto",
+    "Codo galvanizado 1/2\"",
+    "válvula de bola latón ½",
+    "Manguito reducción 32x25 mm.",
+    "grifos, codos; tes!",
+    "ÀÉÎÕÜ ñandú café",
+    "tubos tubes tubo",
+    "por por por",
+    "milímetros milímetro centímetros metros",
+    "enlace hembra 3/4 - macho",
+    "filtro\tmalla\n120 mesh",
+    "ｆｕｌｌｗｉｄｔｈ ２０ｍｍ",
+    "ß æ ø ﬁ",
+    "123es 45s ses s es",
+]
+
+PALABRAS = sorted(SINONIMOS) + sorted(STOP_WORDS)[:60] + [
+    "tubo", "codo", "pvc", "te", "brida", "válvula", "latón", "20mm", "1/2", "½", "3/4\"", "mm.",
+    "GALVANIZADO", "Polietileno", "grifos", "tes", "ñ", "¿qué?", "x", "-", "(pe)", "100%", "ç",
+]
+
+
+@pytest.mark.parametrize("texto", CASOS_LIMITE)
+def test_paridad_casos_limite(texto):
+    assert procesar_texto(texto) == procesar_texto_referencia(texto)
+
+
+def test_paridad_textos_aleatorios():
+    rng = random.Random(1234)
+    separadores = [" ", "  ", ", ", "-", "/", "\t"]
+    for _ in range(5000):
+        palabras = [rng.choice(PALABRAS) for _ in range(rng.randint(1, 8))]
+        if rng.random() < 0.5:
+            palabras = [palabra.upper() if rng.random() < 0.3 else palabra for palabra in palabras]
+        texto = "".join(palabra + rng.choice(separadores) for palabra in palabras).strip()
+        assert procesar_texto(texto) == procesar_texto_referencia(texto), texto
+
+
+def test_paridad_caracteres_aleatorios():
+    rng = random.Random(5678)
+    alfabeto = "abcdeilmnopstuvxyzÁÉÍÓÚáéíóúñÑüç0123456789 .,;:-_/\\\"'()%½ºª¿?¡!"
+    for _ in range(5000):
+        texto = "".join(rng.choice(alfabeto) for _ in range(rng.randint(0, 40)))
+        assert procesar_texto(texto) == procesar_texto_referencia(texto), texto
@@ -0,0 +1,76 @@
+import importlib
+import sys
+
+import pandas as pd
+import pytest
+
+from buscador import MotorBusqueda
+from catalogo import CatalogoIncremental, CatalogoPaginado, indexar_por_codigo
+from estado import EstadoModelo
+from normalizacion import procesar_texto
+from similitud import ModeloSimilitud
+
+
+@pytest.fixture(scope="module")
+def modelo(tmp_path_factory):
+    # Las rutas de datos se fijan al importar el módulo: se importa apuntando a un directorio temporal
+    with pytest.MonkeyPatch.context() as parche:
+        parche.setenv("DIRECTORIO_DATOS", str(tmp_path_factory.mktemp("datos")))
+        parche.setenv("ROL_PROCESO", "completo")
+        sys.modules.pop("modelo_prediccion", None)
+        yield importlib.import_module("modelo_prediccion")
+    sys.modules.pop("modelo_prediccion", None)
+
+
+@pytest.fixture
+def estado(modelo, monkeypatch):
+    df = pd.DataFrame({
+        "Description": ["TUBO PE 16MM", "TUBO PVC 20MM", "CODO PVC 20MM", "VALVULA BOLA 1/2", "GRIFO LATON 1/2"],
+        "CodArticle": ["A1", "A2", "A3", "A4", "A5"],
+        "IDArticle": [101, 102, 103, 104, 105],
+    })
+    df["Description_Procesada"] = df["Description"].map(procesar_texto)
+    df_lookup = df[["CodArticle", "Description", "IDArticle"]].assign(Image=None)
+    descripciones = df["Description_Procesada"].tolist()
+    estado = EstadoModelo(
+        catalogo=CatalogoIncremental(df),
+        motor_busqueda=MotorBusqueda(descripciones, max_candidatos=2),
+        modelo_similitud=ModeloSimilitud(descripciones),
+        indice_df=indexar_por_codigo(df, ["Description", "Description_Procesada"], con_posicion=True),
+        indice_lookup=indexar_por_codigo(df_lookup, ["Description", "Image", "IDArticle"]),
+        df_lookup=df_lookup,
+        catalogo_paginado=CatalogoPaginado(df_lookup, "prueba"),
+        confirmaciones={procesar_texto("codo de 20"): "A3"},
+    )
+    # Un artículo que solo está en el segmento delta, sin confirmar
+    estado = estado.con_filas([{
+        "Description": "MANGUITO PE 16MM", "CodArticle": "A6",
+        "Description_Procesada": procesar_texto("MANGUITO PE 16MM"),
+    }])
+    monkeypatch.setattr(modelo, "estado_modelo", estado)
+    return estado
+
+
+def producto(descripcion, i):
+    audio = {"IDWorkOrder": "1/2", "IDEmployee": "3", "audio_ref": f"ref{i}"}
+    return {"descripcion": descripcion, "cantidad": i + 1, "correo_id": f"c{i}", "audio": audio}
+
+
+def test_predecir_lote_coincide_con_procesar_producto(modelo, estado):
+    productos = [
+        producto(descripcion, i) for i, descripcion in enumerate([
+            "tubo pe 16",         # coincidencia en la base
+            "codo de 20",         # descripción confirmada por el usuario
+            "manguito pe 16mm",   # coincidencia en el segmento delta
+            "valvula bola",
+            "xyz qwerty",         # sin coincidencia
+        ])
+    ]
+    lote = modelo.predecir_lote(productos)
+
+    assert lote == [modelo.procesar_producto(p) for p in productos]
+    assert [r["codigo_prediccion"] for r in lote] == ["A1", "A3", "A6", "A4", "Sin predicción"]
+    assert lote[1]["exactitud"] == 100
+    assert lote[2]["exactitud"] > 90
+    assert lote[4]["exactitud"] == 0
+    assert modelo.predecir_lote([]) == []
@@ -0,0 +1,66 @@
+import logging
+import queue
+
+from registro import ColaRegistro, FiltroMuestreo
+
+
+class Contado:
+    """Argumento que cuenta cuántas veces se convierte en texto."""
+
+    def __init__(self):
+        self.veces = 0
+
+    def __str__(self):
+        self.veces += 1
+        return "contado"
+
+
+def crear_logger(nombre, cola):
+    logger = logging.getLogger(nombre)
+    logger.handlers = [ColaRegistro(cola)]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def test_el_mensaje_se_compone_antes_de_encolar():
+    cola = queue.Queue()
+    logger = crear_logger("pruebas.registro.componer", cola)
+    productos = ["tubo"]
+    logger.info("Productos: %s", productos)
+    # El que registra sigue usando la lista después de registrar
+    productos.append("codo")
+
+    registro = cola.get_nowait()
+    assert registro.getMessage() == "Productos: ['tubo']"
+    assert registro.args is None
+
+
+def test_los_registros_de_niveles_desactivados_no_se_componen():
+    cola = queue.Queue()
+    logger = crear_logger("pruebas.registro.nivel", cola)
+    argumento = Contado()
+    logger.debug("Valor: %s", argumento)
+    assert argumento.veces == 0
+    assert cola.empty()
+
+    logger.info("Valor: %s", argumento)
+    assert argumento.veces == 1
+    assert cola.get_nowait().getMessage() == "Valor: contado"
+
+
+def test_el_muestreo_no_descarta_avisos_ni_errores():
+    cola = queue.Queue()
+    logger = crear_logger("pruebas.registro.muestreo", cola)
+    logger.filters = [FiltroMuestreo(max_por_segundo=2)]
+    for i in range(5):
+        logger.info("Producto %s", i)
+    for i in range(5):
+        logger.warning("Sin coincidencia para %s", i)
+    for i in range(5):
+        logger.error("Fallo en %s", i)
+
+    mensajes = [cola.get_nowait().getMessage() for _ in range(cola.qsize())]
+    assert mensajes == ["Producto 0", "Producto 1"] + [f"Sin coincidencia para {i}" for i in range(5)] + [
+        f"Fallo en {i}" for i in range(5)
+    ]
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+import snapshot
+from snapshot import SnapshotCatalogo, escribir_snapshot, leer_snapshot
+
+
+def test_escribir_y_leer_conserva_el_contenido_sin_copiar_los_arrays(tmp_path):
+    ruta = str(tmp_path / "catalogo.snapshot")
+    matriz = sp.random(50, 200, density=0.05, format="csr", dtype=np.float32, random_state=0)
+    contenido = {
+        "posiciones": np.arange(1000, dtype=np.int64),
+        "matriz": matriz,
+        "df": pd.DataFrame({"CodArticle": ["A1", "A2"], "Description": ["TUBO", "CODO"]}),
+        "version": "v1",
+    }
+    escribir_snapshot(ruta, contenido)
+    leido = leer_snapshot(ruta)
+
+    assert leido["version"] == "v1"
+    np.testing.assert_array_equal(leido["posiciones"], contenido["posiciones"])
+    assert (leido["matriz"] != matriz).nnz == 0
+    pd.testing.assert_frame_equal(leido["df"], contenido["df"])
+    # Los arrays son vistas de solo lectura sobre el archivo mapeado, alineadas para numpy
+    assert not leido["posiciones"].flags.writeable
+    assert not leido["matriz"].data.flags.writeable
+    assert leido["posiciones"].ctypes.data % snapshot.ALINEACION == 0
+    assert not os.path.exists(f"{ruta}.tmp")
+
+
+def crear_snapshot(tmp_path):
+    fuente = tmp_path / "catalogo.csv"
+    fuente.write_text("CodArticle,Description\nA1,TUBO\n", encoding="utf-8")
+    construcciones = []
+
+    def construir():
+        construcciones.append(fuente.read_text(encoding="utf-8"))
+        return {"filas": np.arange(len(construcciones), dtype=np.int64)}
+
+    return SnapshotCatalogo(str(tmp_path / "catalogo.snapshot"), [str(fuente)]), fuente, construir, construcciones
+
+
+def test_se_reconstruye_solo_si_cambia_una_fuente(tmp_path):
+    catalogo, fuente, construir, construcciones = crear_snapshot(tmp_path)
+    primero = catalogo.cargar_o_construir(construir)
+    assert len(construcciones) == 1
+
+    # Mismo contenido con otra fecha: se carga sin reconstruir y se guarda la fecha nueva
+    os.utime(fuente, ns=(0, 1_000_000_000))
+    segundo = catalogo.cargar_o_construir(construir)
+    assert len(construcciones) == 1
+    assert segundo["huella"] == primero["huella"]
+    assert catalogo._leer_meta()["fuentes"] == catalogo._estado_fuentes()
+
+    fuente.write_text("CodArticle,Description\nA1,TUBO\nA2,CODO\n", encoding="utf-8")
+    tercero = catalogo.cargar_o_construir(construir)
+    assert len(construcciones) == 2
+    assert "A2,CODO" in construcciones[-1]
+    assert tercero["huella"] != primero["huella"]
+    assert list(tercero["filas"]) == [0, 1]
+
+
+def test_cambiar_la_version_del_snapshot_obliga_a_reconstruirlo(tmp_path, monkeypatch):
+    catalogo, _, construir, construcciones = crear_snapshot(tmp_path)
+    primero = catalogo.cargar_o_construir(construir)
+    catalogo.cargar_o_construir(construir)
+    assert len(construcciones) == 1
+
+    monkeypatch.setattr(snapshot, "VERSION_SNAPSHOT", snapshot.VERSION_SNAPSHOT + 1)
+    segundo = catalogo.cargar_o_construir(construir)
+    assert len(construcciones) == 2
+    assert segundo["huella"] != primero["huella"]
+    assert catalogo._leer_meta()["version"] == snapshot.VERSION_SNAPSHOT
@@ -0,0 +1,73 @@
+import json
+import os
+import time
+
+import pytest
+
+from spool import SpoolAudio
+
+
+def lineas_indice(spool):
+    with open(spool.ruta_indice, "r", encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f]
+
+
+def test_guardar_anexa_una_linea_por_adjunto(tmp_path):
+    spool = SpoolAudio(str(tmp_path))
+    referencia = spool.guardar("c1", "a1", b"audio", "1-2_3.mp4")
+    assert spool.guardar("c2", "a2", b"audio", "1-2_3.mp4") == referencia
+    # Volver a guardar el mismo adjunto no añade nada
+    spool.guardar("c1", "a1", b"audio", "1-2_3.mp4")
+
+    assert [entrada["adjuntos"] for entrada in lineas_indice(spool)] == [["c1/a1"], ["c2/a2"]]
+    recargado = SpoolAudio(str(tmp_path))
+    assert recargado.buscar("c1", "a1") == recargado.buscar("c2", "a2") == referencia
+    assert recargado.objetos[referencia]["adjuntos"] == ["c1/a1", "c2/a2"]
+
+
+def test_lector_ve_lo_guardado_por_otro_proceso_y_tras_compactar(tmp_path):
+    escritor = SpoolAudio(str(tmp_path), retencion=3600)
+    lector = SpoolAudio(str(tmp_path), solo_lectura=True)
+    viejo = escritor.guardar("c1", "a1", b"viejo", "1-2_3.mp4")
+    nuevo = escritor.guardar("c2", "a2", b"nuevo", "4-5_6.mp4")
+    assert lector.obtener(nuevo)[1] == "4-5_6.mp4"
+
+    escritor.objetos[viejo]["guardado"] = time.time() - 7200
+    assert escritor.purgar() == 1
+    assert len(lineas_indice(escritor)) == 1
+    nuevo2 = escritor.guardar("c3", "a3", b"otro", "7-8_9.mp4")
+    # El índice se ha reescrito: el lector lo vuelve a leer entero
+    assert lector.obtener(nuevo2) is not None
+    assert lector.obtener(viejo) is None
+    assert set(lector.objetos) == {nuevo, nuevo2}
+
+
+def test_solo_lectura_no_escribe(tmp_path):
+    lector = SpoolAudio(str(tmp_path), solo_lectura=True)
+    with pytest.raises(RuntimeError):
+        lector.guardar("c1", "a1", b"audio", "1-2_3.mp4")
+    with pytest.raises(RuntimeError):
+        lector.purgar()
+    assert not os.path.exists(lector.ruta_indice)
+
+
+def test_linea_incompleta_se_ignora_hasta_completarse(tmp_path):
+    escritor = SpoolAudio(str(tmp_path))
+    referencia = escritor.guardar("c1", "a1", b"audio", "1-2_3.mp4")
+    with open(escritor.ruta_indice, "a", encoding="utf-8") as f:
+        f.write('{"ref": "')
+    recargado = SpoolAudio(str(tmp_path), solo_lectura=True)
+    assert list(recargado.objetos) == [referencia]
+
+
+def test_migra_el_indice_json_anterior(tmp_path):
+    escritor = SpoolAudio(str(tmp_path))
+    referencia = escritor.guardar("c1", "a1", b"audio", "1-2_3.mp4")
+    os.remove(escritor.ruta_indice)
+    with open(os.path.join(str(tmp_path), "indice.json"), "w", encoding="utf-8") as f:
+        json.dump({referencia: {"nombre": "1-2_3.mp4", "tamano": 5, "guardado": time.time(), "adjuntos": ["c1/a1"]}}, f)
+
+    migrado = SpoolAudio(str(tmp_path))
+    assert migrado.buscar("c1", "a1") == referencia
+    assert not os.path.exists(os.path.join(str(tmp_path), "indice.json"))
+    assert SpoolAudio(str(tmp_path)).buscar("c1", "a1") == referencia
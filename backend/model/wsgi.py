@@ -0,0 +1,15 @@
+"""
+Punto de entrada de los workers de API (despliegue multiproceso con gunicorn).
+
+Cada worker carga el snapshot del catálogo mapeado en memoria (los arrays se comparten entre
+procesos a través de la caché de páginas del sistema) y no sondea el buzón: las predicciones y las
+correcciones las publica el proceso de ingesta (`ROL_PROCESO=ingesta python modelo_prediccion.py`).
+"""
+import os
+
+os.environ.setdefault("ROL_PROCESO", "api")
+
+import modelo_prediccion
+
+modelo_prediccion.inicializar_modelo()
+app = modelo_prediccion.app
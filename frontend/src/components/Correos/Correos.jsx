@@ -18,6 +18,14 @@ function limpiarBase64(imgStr) {
   return cleaned;
 }
 
+// Las predicciones nuevas traen la URL de /api/imagen; las antiguas, la imagen en base64.
+function srcImagen(imgStr) {
+  if (imgStr.startsWith("/api/imagen/")) {
+    return `http://10.83.0.17:5000${imgStr}`;
+  }
+  return `data:image/jpeg;base64,${limpiarBase64(imgStr)}`;
+}
+
 const Correos = ({ setProductosSeleccionados, idBoton }) => {
   const [productos, setProductos] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -310,7 +318,7 @@ const Correos = ({ setProductosSeleccionados, idBoton }) => {
                   <td style={{ verticalAlign: "middle", textAlign: "center" }}>
                     {producto.imagen ? (
                       <img
-                        src={`data:image/jpeg;base64,${limpiarBase64(producto.imagen)}`}
+                        src={srcImagen(producto.imagen)}
                         className="img-thumbnail"
                         style={{ width: "70px", height: "70px", objectFit: "contain" }}
                         alt={`Imagen para ${producto.codigo_prediccion}`}
@@ -42,6 +42,39 @@ const formatDate = (dateString) => {
   return new Date(dateString).toLocaleDateString();
 };
 
+// Descarga un archivo del backend y lo devuelve en base64 (sin el prefijo data:)
+const descargarBase64 = async (url) => {
+  const response = await fetch(`http://10.83.0.17:5000${url}`);
+  if (!response.ok) throw new Error(`Error al descargar ${url}: ${response.status}`);
+  const blob = await response.blob();
+  return new Promise((resolve, reject) => {
+    const reader = new FileReader();
+    reader.onloadend = () => resolve(String(reader.result).split(",")[1] || "");
+    reader.onerror = reject;
+    reader.readAsDataURL(blob);
+  });
+};
+
+// Descarga el audio del spool del backend y lo devuelve en base64 (lo que espera FileMP3)
+const obtenerAudioBase64 = async (audioUrl) => {
+  if (!audioUrl) return "";
+  return descargarBase64(audioUrl);
+};
+
+// El ERP espera la imagen en base64 (FileIMG). Las predicciones nuevas traen la URL de
+// /api/imagen y se descarga; las antiguas ya traen el base64 y se envía tal cual.
+const obtenerImagenBase64 = async (imagen) => {
+  if (!imagen) return "Desconocido";
+  if (!imagen.startsWith("/api/imagen/")) return imagen;
+  try {
+    return await descargarBase64(imagen);
+  } catch (error) {
+    // Sin imagen el pedido se envía igualmente, como cuando el artículo no la tiene
+    console.warn("No se pudo obtener la imagen:", error);
+    return "Desconocido";
+  }
+};
+
 // Hook para manejar llamadas a la API
 const useApiCall = () => {
   const [loading, setLoading] = useState(false);
@@ -189,7 +222,8 @@ const DashBoard = ({ email, password, onButtonClick, setIsLoggedIn }) => {
           exactitud: prediccion.exactitud,
           id_article: prediccion.id_article || prediccion.codigo_prediccion,
           correo_id: prediccion.correo_id,
-          audio_base64: prediccion.audio_base64,
+          audio_ref: prediccion.audio_ref,
+          audio_url: prediccion.audio_url,
           file_name: prediccion.file_name,
           IDEmployee: prediccion.IDEmployee,
           IDWorkOrder: prediccion.IDWorkOrder,
@@ -205,20 +239,21 @@ const DashBoard = ({ email, password, onButtonClick, setIsLoggedIn }) => {
         // de no existir, se puede usar la key del grupo.
         const IDMessage = firstPrediction.correo_id || correo_id || "Desconocido";
   
-        const entityData = {
-          CodCompany: "1",
-          IDWorkOrder: firstPrediction.IDWorkOrder || "0222",
-          IDEmployee: firstPrediction.IDEmployee || "1074241204161431",
-          IDMessage, // Aseguramos que se envíe el valor correcto
-          TextTranscription: JSON.stringify(predictions),
-          FileMP3: firstPrediction.audio_base64,
-          FileIMG: firstPrediction.imagen || "Desconocido",
-          FileName: firstPrediction.file_name || "unknown_audio.mp4",
-        };
-        
-        console.log("Entidad a enviar:", entityData);
-  
         try {
+          // El audio se descarga una sola vez por correo, solo al enviarlo al ERP
+          const entityData = {
+            CodCompany: "1",
+            IDWorkOrder: firstPrediction.IDWorkOrder || "0222",
+            IDEmployee: firstPrediction.IDEmployee || "1074241204161431",
+            IDMessage, // Aseguramos que se envíe el valor correcto
+            TextTranscription: JSON.stringify(predictions),
+            FileMP3: await obtenerAudioBase64(firstPrediction.audio_url),
+            FileIMG: await obtenerImagenBase64(firstPrediction.imagen),
+            FileName: firstPrediction.file_name || "unknown_audio.mp4",
+          };
+
+          console.log("Entidad a enviar:", entityData);
+
           const entityResponse = await apiCallPredicciones(generateEntity, entityData);
           if (entityResponse) {
             console.log("Entidad generada exitosamente para IDMessage:", IDMessage);